@@ -1,11 +1,19 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.cache import cache_stats
+from app.core.principal import Principal
+from app.core.security import hash_password_async, password_hasher
 from app.db.session import engine
+from app.db.slow_queries import slow_query_log
+from app.utils.pagination import PaginatedResponse, paginate_page, set_next_cursor
 from sqlalchemy import text, inspect
 
 router = APIRouter()
@@ -13,7 +21,7 @@ router = APIRouter()
 
 @router.get("/", response_model=Dict[str, Any])
 def admin_overview(
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Admin dashboard overview endpoint.
@@ -29,127 +37,299 @@ def admin_overview(
             "comments": "/admin/comments",
             "ratings": "/admin/ratings",
             "db_schema": "/admin/db-schema",
+            "slow_queries": "/admin/slow-queries",
+            "cache_stats": "/admin/cache-stats",
+            "purge_jobs": "/admin/purge-jobs",
         }
     }
 
 
-@router.get("/users", response_model=List[schemas.User])
+@router.get("/users", response_model=Union[List[schemas.User], PaginatedResponse[schemas.User]])
 def admin_users(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get all users.
     Only accessible to admin users.
     """
-    users = crud.user.get_multi(db, skip=skip, limit=limit)
+    users = crud.user.get_multi(db, skip=skip, limit=limit, cursor=cursor)
+    next_cursor = crud.user.next_cursor(users, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.User)
+        return paginate_page(
+            users, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return users
 
 
-@router.get("/courses", response_model=List[schemas.CourseWithLessons])
+@router.get(
+    "/courses", response_model=Union[List[schemas.CourseWithLessons], PaginatedResponse[schemas.CourseWithLessons]]
+)
 def admin_courses(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    include: str = "lessons",
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get all courses with lessons.
+    ``include`` takes lessons, lessons.comments and lessons.ratings;
+    each costs one query for the whole page.
     Only accessible to admin users.
     """
-    courses = crud.course.get_multi(db, skip=skip, limit=limit)
-    result = []
-    for course in courses:
-        lessons = crud.lesson.get_multi_by_course(
-            db=db, course_id=course.id, skip=0, limit=100
+    courses = crud.course.get_multi(
+        db, skip=skip, limit=limit, cursor=cursor, include=crud.course.parse_include(include)
+    )
+    next_cursor = crud.course.next_cursor(courses, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.Course)
+        return paginate_page(
+            courses, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
         )
-        course_with_lessons = schemas.CourseWithLessons(
-            **course.__dict__,
-            lessons=lessons
-        )
-        result.append(course_with_lessons)
-    return result
+    return courses
 
 
-@router.get("/lessons", response_model=List[schemas.LessonWithDetails])
+@router.get(
+    "/lessons", response_model=Union[List[schemas.LessonWithDetails], PaginatedResponse[schemas.LessonWithDetails]]
+)
 def admin_lessons(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    include: str = "comments,ratings",
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
-    Get all lessons with comments.
+    Get all lessons with comments and ratings.
+    ``include`` takes comments and ratings; each costs one query for the whole page.
     Only accessible to admin users.
     """
-    lessons = crud.lesson.get_multi(db, skip=skip, limit=limit)
-    result = []
-    for lesson in lessons:
-        comments = crud.comment.get_multi_by_lesson(
-            db=db, lesson_id=lesson.id, skip=0, limit=100
+    lessons = crud.lesson.get_multi(
+        db, skip=skip, limit=limit, cursor=cursor, include=crud.lesson.parse_include(include)
+    )
+    next_cursor = crud.lesson.next_cursor(lessons, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.Lesson)
+        return paginate_page(
+            lessons, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
         )
-        ratings = crud.rating.get_multi_by_lesson(
-            db=db, lesson_id=lesson.id, skip=0, limit=100
-        )
-        lesson_with_data = schemas.LessonWithDetails(
-            **lesson.__dict__,
-            comments=comments,
-            ratings=ratings
-        )
-        result.append(lesson_with_data)
-    return result
+    return lessons
 
 
-@router.get("/enrollments", response_model=List[schemas.Enrollment])
+@router.get(
+    "/enrollments", response_model=Union[List[schemas.Enrollment], PaginatedResponse[schemas.Enrollment]]
+)
 def admin_enrollments(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get all enrollments.
     Only accessible to admin users.
     """
-    enrollments = crud.enrollment.get_multi(db, skip=skip, limit=limit)
+    enrollments = crud.enrollment.get_multi(db, skip=skip, limit=limit, cursor=cursor)
+    next_cursor = crud.enrollment.next_cursor(enrollments, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.Enrollment)
+        return paginate_page(
+            enrollments, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return enrollments
 
 
-@router.get("/comments", response_model=List[schemas.Comment])
+@router.get(
+    "/comments", response_model=Union[List[schemas.Comment], PaginatedResponse[schemas.Comment]]
+)
 def admin_comments(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get all comments.
     Only accessible to admin users.
     """
-    comments = crud.comment.get_multi(db, skip=skip, limit=limit)
+    comments = crud.comment.get_multi(db, skip=skip, limit=limit, cursor=cursor)
+    next_cursor = crud.comment.next_cursor(comments, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.Comment)
+        return paginate_page(
+            comments, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return comments
 
 
-@router.get("/ratings", response_model=List[schemas.Rating])
+@router.get(
+    "/ratings", response_model=Union[List[schemas.Rating], PaginatedResponse[schemas.Rating]]
+)
 def admin_ratings(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get all ratings.
     Only accessible to admin users.
     """
-    ratings = crud.rating.get_multi(db, skip=skip, limit=limit)
+    ratings = crud.rating.get_multi(db, skip=skip, limit=limit, cursor=cursor)
+    next_cursor = crud.rating.next_cursor(ratings, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.Rating)
+        return paginate_page(
+            ratings, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return ratings
 
 
+def _bulk_create(db: Session, crud_obj: Any, **kwargs: Any) -> List[Any]:
+    try:
+        return crud_obj.create_multi(db, **kwargs)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Bulk insert violates a database constraint")
+
+
+@router.post("/users/bulk", response_model=List[schemas.User])
+async def admin_bulk_create_users(
+    *,
+    db: Session = Depends(deps.get_db),
+    users_in: List[schemas.UserCreate],
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Create many users in one transaction.
+    Only accessible to admin users.
+    """
+    # Хэшируем пароли пачками по числу воркеров, чтобы не переполнить очередь bcrypt
+    hashes: List[str] = []
+    step = password_hasher.max_workers
+    for i in range(0, len(users_in), step):
+        hashes += await asyncio.gather(
+            *(hash_password_async(user_in.password) for user_in in users_in[i:i + step])
+        )
+    rows = [crud.user.user_values(user_in, h) for user_in, h in zip(users_in, hashes)]
+    return await run_in_threadpool(_bulk_create, db, crud.user, objs_in=rows)
+
+
+@router.post("/courses/bulk", response_model=List[schemas.Course])
+def admin_bulk_create_courses(
+    *,
+    db: Session = Depends(deps.get_db),
+    courses_in: List[schemas.CourseCreate],
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Create many courses, authored by the current admin, in one transaction.
+    Only accessible to admin users.
+    """
+    return _bulk_create(
+        db, crud.course, objs_in=courses_in, defaults={"author_id": current_user.id}
+    )
+
+
+@router.post("/lessons/bulk", response_model=List[schemas.Lesson])
+def admin_bulk_create_lessons(
+    *,
+    db: Session = Depends(deps.get_db),
+    lessons_in: List[schemas.LessonCreate],
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Create many lessons in one transaction.
+    Only accessible to admin users.
+    """
+    return _bulk_create(db, crud.lesson, objs_in=lessons_in)
+
+
+@router.post("/enrollments/bulk", response_model=List[schemas.Enrollment])
+def admin_bulk_create_enrollments(
+    *,
+    db: Session = Depends(deps.get_db),
+    enrollments_in: List[schemas.EnrollmentCreateForUser],
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Enroll many users in one transaction.
+    Only accessible to admin users.
+    """
+    return _bulk_create(db, crud.enrollment, objs_in=enrollments_in)
+
+
+@router.post("/courses/{course_id}/purge", response_model=schemas.PurgeJob, status_code=202)
+def admin_purge_course(
+    *,
+    db: Session = Depends(deps.get_db),
+    course_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Delete a course with all its lessons, comments, ratings and enrollments
+    in the background, in small batches. Poll /admin/purge-jobs/{id} for progress.
+    Only accessible to admin users.
+    """
+    if not crud.course.exists(db=db, id=course_id):
+        raise HTTPException(status_code=404, detail="Course not found")
+    job = crud.purge.start(course_id)
+    bind = db.get_bind()
+    background_tasks.add_task(crud.purge.run, job, lambda: Session(bind=bind))
+    return job
+
+
+@router.get("/purge-jobs/{job_id}", response_model=schemas.PurgeJob)
+def admin_purge_job(
+    job_id: int,
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Get the progress of a course purge.
+    Only accessible to admin users.
+    """
+    job = crud.purge.get(job_id)
+    if not job:
+        detail = "Purge job not found"
+        if not crud.purge.shared:
+            # Without the shared cache tier a job is only known to the worker that runs it
+            detail += " (it may be running in another worker; set SHARED_CACHE_PATH to share jobs)"
+        raise HTTPException(status_code=404, detail=detail)
+    return job
+
+
 @router.get("/db-schema", response_model=Dict[str, Any])
 def db_schema(
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get database schema information.
@@ -180,6 +360,7 @@ def db_schema(
                 "referred_table": fk["referred_table"],
                 "referred_columns": fk["referred_columns"],
                 "constrained_columns": fk["constrained_columns"],
+                "ondelete": fk.get("options", {}).get("ondelete"),
             })
         
         # Add table info to schema
@@ -190,3 +371,27 @@ def db_schema(
         }
     
     return {"tables": schema_info}
+
+
+@router.get("/slow-queries", response_model=List[Dict[str, Any]])
+def admin_slow_queries(
+    limit: int = 20,
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Get the statements with the most time spent in slow executions,
+    with their query plan and the routes that issued them.
+    Only accessible to admin users.
+    """
+    return slow_query_log.top(limit)
+
+
+@router.get("/cache-stats", response_model=Dict[str, Any])
+def admin_cache_stats(
+    current_user: Principal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Get hit/miss counters of the in-process caches.
+    Only accessible to admin users.
+    """
+    return cache_stats()
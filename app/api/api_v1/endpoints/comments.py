@@ -1,29 +1,45 @@
-from typing import Any, List
+from typing import Any, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.principal import Principal
+from app.db.session import AnySession
+from app.utils.pagination import PaginatedResponse, paginate_page, set_next_cursor
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.Comment])
-def read_comments(
-    db: Session = Depends(deps.get_db),
+@router.get("/", response_model=Union[List[schemas.Comment], PaginatedResponse[schemas.Comment]])
+async def read_comments(
+    response: Response,
+    db: AnySession = Depends(deps.get_async_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Retrieve comments.
     """
     if crud.user.is_admin(current_user):
-        comments = crud.comment.get_multi(db, skip=skip, limit=limit)
+        comments = await crud.comment.get_multi_async(db, skip=skip, limit=limit, cursor=cursor)
     else:
-        comments = crud.comment.get_multi_by_owner(
-            db=db, user_id=current_user.id, skip=skip, limit=limit
+        comments = await crud.comment.get_multi_by_owner_async(
+            db=db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor
+        )
+    next_cursor = crud.comment.next_cursor(comments, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        criteria = []
+        if not crud.user.is_admin(current_user):
+            criteria.append(models.Comment.user_id == current_user.id)
+        count = await crud.counts.count_async(db, models.Comment, *criteria)
+        return paginate_page(
+            comments, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
         )
     return comments
 
@@ -33,24 +49,24 @@ def create_comment(
     *,
     db: Session = Depends(deps.get_db),
     comment_in: schemas.CommentCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new comment.
     """
-    # Check if lesson exists
-    lesson = crud.lesson.get(db=db, id=comment_in.lesson_id)
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
-    # Check if user is enrolled in the course that contains this lesson
-    course = crud.course.get(db=db, id=lesson.course_id)
-    enrollment = crud.enrollment.get_by_user_and_course(
-        db=db, user_id=current_user.id, course_id=course.id
+    # Check if lesson exists and whether user is enrolled in its course
+    lesson_access = crud.access.check_lesson(
+        db, lesson_id=comment_in.lesson_id, user_id=current_user.id
     )
+    if not lesson_access:
+        raise HTTPException(status_code=404, detail="Lesson not found")
     
     # Only allow enrolled users, course author, or admin to comment
-    if not (enrollment or course.author_id == current_user.id or current_user.is_admin):
+    if not (
+        lesson_access.is_enrolled
+        or lesson_access.author_id == current_user.id
+        or current_user.is_admin
+    ):
         raise HTTPException(status_code=403, 
                            detail="You must be enrolled in this course to comment on lessons")
     
@@ -60,37 +76,51 @@ def create_comment(
     return comment
 
 
-@router.get("/by-lesson/{lesson_id}", response_model=List[schemas.Comment])
-def read_comments_by_lesson(
+@router.get(
+    "/by-lesson/{lesson_id}", response_model=Union[List[schemas.Comment], PaginatedResponse[schemas.Comment]]
+)
+async def read_comments_by_lesson(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: AnySession = Depends(deps.get_async_db),
     lesson_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get comments for a specific lesson.
     """
-    # Check if lesson exists
-    lesson = crud.lesson.get(db=db, id=lesson_id)
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
-    # Check if user is enrolled in the course that contains this lesson
-    course = crud.course.get(db=db, id=lesson.course_id)
-    enrollment = crud.enrollment.get_by_user_and_course(
-        db=db, user_id=current_user.id, course_id=course.id
+    # Check if lesson exists and whether user is enrolled in its course
+    lesson_access = await crud.access.check_lesson_async(
+        db, lesson_id=lesson_id, user_id=current_user.id
     )
+    if not lesson_access:
+        raise HTTPException(status_code=404, detail="Lesson not found")
     
     # Only allow enrolled users, course author, or admin to view comments
-    if not (enrollment or course.author_id == current_user.id or current_user.is_admin):
+    if not (
+        lesson_access.is_enrolled
+        or lesson_access.author_id == current_user.id
+        or current_user.is_admin
+    ):
         raise HTTPException(status_code=403, 
                            detail="You must be enrolled in this course to view comments")
     
-    comments = crud.comment.get_multi_by_lesson(
-        db=db, lesson_id=lesson_id, skip=skip, limit=limit
+    comments = await crud.comment.get_multi_by_lesson_async(
+        db=db, lesson_id=lesson_id, skip=skip, limit=limit, cursor=cursor
     )
+    next_cursor = crud.comment.next_cursor(comments, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = await crud.counts.count_async(
+            db, models.Comment, models.Comment.lesson_id == lesson_id
+        )
+        return paginate_page(
+            comments, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return comments
 
 
@@ -99,18 +129,16 @@ def delete_comment(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Delete a comment.
     """
-    comment = crud.comment.get(db=db, id=id)
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    
     # Only allow comment owner or admin to delete
-    if comment.user_id != current_user.id and not current_user.is_admin:
+    where = () if current_user.is_admin else (crud.comment.owned_by(current_user.id),)
+    comment = crud.comment.delete_by_id(db=db, id=id, where=where)
+    if not comment:
+        if not crud.comment.exists(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Comment not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    comment = crud.comment.remove(db=db, id=id)
     return comment
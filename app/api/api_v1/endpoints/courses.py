@@ -1,32 +1,52 @@
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.principal import Principal
+from app.db.session import AnySession
+from app.utils.pagination import PaginatedResponse, paginate_page, set_next_cursor
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.Course])
-def read_courses(
-    db: Session = Depends(deps.get_db),
+@router.get(
+    "/", response_model=Union[List[schemas.CourseWithLessons], PaginatedResponse[schemas.CourseWithLessons]]
+)
+async def read_courses(
+    response: Response,
+    db: AnySession = Depends(deps.get_async_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    envelope: bool = False,
     title: Optional[str] = None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    include: str = "",
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Retrieve courses with optional title filter.
+    ``include`` takes lessons, lessons.comments and lessons.ratings;
+    each costs one query for the whole page.
     """
+    paths = crud.course.parse_include(include)
     if title:
         # Filter courses by title
-        courses = db.query(models.Course).filter(
-            models.Course.title.ilike(f"%{title}%")
-        ).offset(skip).limit(limit).all()
+        courses = await crud.course.get_multi_by_title_async(
+            db, title=title, skip=skip, limit=limit, cursor=cursor, include=paths
+        )
     else:
-        courses = crud.course.get_multi(db, skip=skip, limit=limit)
+        courses = await crud.course.get_multi_async(db, skip=skip, limit=limit, cursor=cursor, include=paths)
+    next_cursor = crud.course.next_cursor(courses, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        criteria = [models.Course.title.ilike(f"%{title}%")] if title else []
+        count = await crud.counts.count_async(db, models.Course, *criteria)
+        return paginate_page(
+            courses, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return courses
 
 
@@ -35,7 +55,7 @@ def create_course(
     *,
     db: Session = Depends(deps.get_db),
     course_in: schemas.CourseCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new course.
@@ -45,16 +65,18 @@ def create_course(
 
 
 @router.get("/{id}", response_model=schemas.CourseWithLessons)
-def read_course(
+async def read_course(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AnySession = Depends(deps.get_async_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    include: str = "lessons",
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get course by ID.
+    ``include`` takes lessons, lessons.comments and lessons.ratings.
     """
-    course = crud.course.get_with_lessons(db=db, id=id)
+    course = await crud.course.get_async(db, id, include=crud.course.parse_include(include))
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     return course
@@ -66,17 +88,18 @@ def update_course(
     db: Session = Depends(deps.get_db),
     id: int,
     course_in: schemas.CourseUpdate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Update a course.
     """
-    course = crud.course.get(db=db, id=id)
+    where = () if current_user.is_admin else (crud.course.owned_by(current_user.id),)
+    course = crud.course.update_by_id(db=db, id=id, obj_in=course_in, where=where)
     if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-    if course.author_id != current_user.id and not current_user.is_admin:
+        # Nothing matched: tell a missing course from someone else's
+        if not crud.course.exists(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Course not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    course = crud.course.update(db=db, db_obj=course, obj_in=course_in)
     return course
 
 
@@ -85,33 +108,47 @@ def delete_course(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Delete a course.
     """
-    course = crud.course.get(db=db, id=id)
+    # Lessons, comments, ratings and enrollments go with it (ON DELETE CASCADE);
+    # very large courses are better purged in batches via /admin/courses/{id}/purge
+    where = () if current_user.is_admin else (crud.course.owned_by(current_user.id),)
+    course = crud.course.delete_by_id(db=db, id=id, where=where)
     if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-    if course.author_id != current_user.id and not current_user.is_admin:
+        if not crud.course.exists(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Course not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    course = crud.course.remove(db=db, id=id)
     return course
 
 
-@router.get("/by-author/me", response_model=List[schemas.Course])
-def read_courses_by_current_user(
-    db: Session = Depends(deps.get_db),
+@router.get(
+    "/by-author/me", response_model=Union[List[schemas.Course], PaginatedResponse[schemas.Course]]
+)
+async def read_courses_by_current_user(
+    response: Response,
+    db: AnySession = Depends(deps.get_async_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get courses created by current user.
     """
-    courses = crud.course.get_multi_by_author(
-        db=db, author_id=current_user.id, skip=skip, limit=limit
+    courses = await crud.course.get_multi_by_author_async(
+        db=db, author_id=current_user.id, skip=skip, limit=limit, cursor=cursor
     )
+    next_cursor = crud.course.next_cursor(courses, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = await crud.counts.count_async(db, models.Course, models.Course.author_id == current_user.id)
+        return paginate_page(
+            courses, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return courses
 
 
@@ -120,12 +157,12 @@ def enroll_in_course(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Enroll current user in course.
     """
-    course = crud.course.get(db=db, id=id)
+    course = crud.get_loader(db).load(models.Course, id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
         
@@ -1,46 +1,72 @@
-from typing import Any, List
+from typing import Any, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.principal import Principal
+from app.db.session import AnySession
+from app.utils.pagination import PaginatedResponse, paginate_page, set_next_cursor
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.Enrollment])
-def read_enrollments(
-    db: Session = Depends(deps.get_db),
+@router.get(
+    "/", response_model=Union[List[schemas.Enrollment], PaginatedResponse[schemas.Enrollment]]
+)
+async def read_enrollments(
+    response: Response,
+    db: AnySession = Depends(deps.get_async_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Retrieve enrollments for current user.
     """
     if crud.user.is_admin(current_user):
-        enrollments = crud.enrollment.get_multi(db, skip=skip, limit=limit)
+        enrollments = await crud.enrollment.get_multi_async(
+            db, skip=skip, limit=limit, cursor=cursor
+        )
     else:
-        enrollments = crud.enrollment.get_multi_by_user(
-            db=db, user_id=current_user.id, skip=skip, limit=limit
+        enrollments = await crud.enrollment.get_multi_by_user_async(
+            db=db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor
+        )
+    next_cursor = crud.enrollment.next_cursor(enrollments, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        criteria = []
+        if not crud.user.is_admin(current_user):
+            criteria.append(models.Enrollment.user_id == current_user.id)
+        count = await crud.counts.count_async(db, models.Enrollment, *criteria)
+        return paginate_page(
+            enrollments, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
         )
     return enrollments
 
 
-@router.get("/by-course/{course_id}", response_model=List[schemas.User])
+@router.get(
+    "/by-course/{course_id}", response_model=Union[List[schemas.User], PaginatedResponse[schemas.User]]
+)
 def get_enrolled_users(
     course_id: int,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get all users enrolled in a specific course.
     Only course author or admin can access this endpoint.
     """
-    course = crud.course.get(db=db, id=course_id)
+    loader = crud.get_loader(db)
+    course = loader.load(models.Course, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
@@ -50,11 +76,18 @@ def get_enrolled_users(
     
     # Get all enrollments for the course
     enrollments = crud.enrollment.get_multi_by_course(
-        db=db, course_id=course_id, skip=skip, limit=limit
+        db=db, course_id=course_id, skip=skip, limit=limit, cursor=cursor
     )
+    next_cursor = crud.enrollment.next_cursor(enrollments, limit)
+    set_next_cursor(response, next_cursor)
     
-    # Get users from enrollments
-    users = [db.query(models.User).get(enrollment.user_id) for enrollment in enrollments]
+    # Get users from enrollments, all in one query
+    users = loader.load_many(models.User, [enrollment.user_id for enrollment in enrollments])
+    if envelope:
+        count = crud.counts.count(db, models.Enrollment, models.Enrollment.course_id == course_id)
+        return paginate_page(
+            users, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return users
 
 
@@ -63,23 +96,17 @@ def create_enrollment(
     *,
     db: Session = Depends(deps.get_db),
     enrollment_in: schemas.EnrollmentCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new enrollment.
     """
     # Check if course exists
-    course = crud.course.get(db=db, id=enrollment_in.course_id)
+    course = crud.get_loader(db).load(models.Course, enrollment_in.course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    # Check if user is already enrolled
-    existing_enrollment = crud.enrollment.get_by_user_and_course(
-        db=db, user_id=current_user.id, course_id=enrollment_in.course_id
-    )
-    if existing_enrollment:
-        return existing_enrollment
-    
+    # Returns the existing enrollment if the user is already enrolled
     enrollment = crud.enrollment.create_with_owner(
         db=db, obj_in=enrollment_in, user_id=current_user.id
     )
@@ -91,18 +118,16 @@ def delete_enrollment(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Delete an enrollment.
     """
-    enrollment = crud.enrollment.get(db=db, id=id)
-    if not enrollment:
-        raise HTTPException(status_code=404, detail="Enrollment not found")
-    
     # Only allow enrollment owner or admin to delete
-    if enrollment.user_id != current_user.id and not current_user.is_admin:
+    where = () if current_user.is_admin else (crud.enrollment.owned_by(current_user.id),)
+    enrollment = crud.enrollment.delete_by_id(db=db, id=id, where=where)
+    if not enrollment:
+        if not crud.enrollment.exists(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Enrollment not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    enrollment = crud.enrollment.remove(db=db, id=id)
     return enrollment
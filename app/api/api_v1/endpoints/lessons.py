@@ -1,25 +1,44 @@
-from typing import Any, List
+from typing import Any, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.principal import Principal
+from app.db.session import AnySession
+from app.utils.pagination import PaginatedResponse, paginate_page, set_next_cursor
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.Lesson])
-def read_lessons(
-    db: Session = Depends(deps.get_db),
+@router.get(
+    "/", response_model=Union[List[schemas.LessonWithDetails], PaginatedResponse[schemas.LessonWithDetails]]
+)
+async def read_lessons(
+    response: Response,
+    db: AnySession = Depends(deps.get_async_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    include: str = "",
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Retrieve lessons.
+    ``include`` takes comments and ratings; each costs one query for the whole page.
     """
-    lessons = crud.lesson.get_multi(db, skip=skip, limit=limit)
+    lessons = await crud.lesson.get_multi_async(
+        db, skip=skip, limit=limit, cursor=cursor, include=crud.lesson.parse_include(include)
+    )
+    next_cursor = crud.lesson.next_cursor(lessons, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = await crud.counts.count_async(db, models.Lesson)
+        return paginate_page(
+            lessons, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return lessons
 
 
@@ -28,13 +47,13 @@ def create_lesson(
     *,
     db: Session = Depends(deps.get_db),
     lesson_in: schemas.LessonCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new lesson.
     """
     # Check if user is course author or admin
-    course = crud.course.get(db=db, id=lesson_in.course_id)
+    course = crud.get_loader(db).load(models.Course, lesson_in.course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     if course.author_id != current_user.id and not current_user.is_admin:
@@ -47,31 +66,39 @@ def create_lesson(
 
 
 @router.get("/{id}", response_model=schemas.LessonWithDetails)
-def read_lesson(
+async def read_lesson(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AnySession = Depends(deps.get_async_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    include: str = "comments,ratings",
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get lesson by ID.
+    ``include`` takes comments and ratings.
     """
-    lesson_with_details = crud.lesson.get_with_comments_and_ratings(db=db, id=id)
-    if not lesson_with_details:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
+    paths = crud.lesson.parse_include(include)
     # Check if user is enrolled in the course
-    course_id = lesson_with_details["lesson"].course_id
-    enrollment = crud.enrollment.get_by_user_and_course(
-        db=db, user_id=current_user.id, course_id=course_id
+    lesson_access = await crud.access.check_lesson_async(
+        db, lesson_id=id, user_id=current_user.id
     )
-    course = crud.course.get(db=db, id=course_id)
+    if not lesson_access:
+        raise HTTPException(status_code=404, detail="Lesson not found")
     
     # Allow access if user is course author, admin, or enrolled
-    if not (enrollment or course.author_id == current_user.id or current_user.is_admin):
+    if not (
+        lesson_access.is_enrolled
+        or lesson_access.author_id == current_user.id
+        or current_user.is_admin
+    ):
         raise HTTPException(status_code=403, detail="You must be enrolled in this course to view lessons")
     
-    return lesson_with_details
+    lesson_with_details = await crud.lesson.get_with_comments_and_ratings_async(db=db, id=id, include=paths)
+    if not lesson_with_details:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    lesson = schemas.LessonWithDetails.model_validate(lesson_with_details["lesson"])
+    lesson.average_rating = lesson_with_details["average_rating"]
+    return lesson
 
 
 @router.put("/{id}", response_model=schemas.Lesson)
@@ -80,20 +107,17 @@ def update_lesson(
     db: Session = Depends(deps.get_db),
     id: int,
     lesson_in: schemas.LessonUpdate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Update a lesson.
     """
-    lesson = crud.lesson.get(db=db, id=id)
+    where = () if current_user.is_admin else (crud.lesson.owned_by(current_user.id),)
+    lesson = crud.lesson.update_by_id(db=db, id=id, obj_in=lesson_in, where=where)
     if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
-    course = crud.course.get(db=db, id=lesson.course_id)
-    if course.author_id != current_user.id and not current_user.is_admin:
+        if not crud.lesson.exists(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Lesson not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    lesson = crud.lesson.update(db=db, db_obj=lesson, obj_in=lesson_in)
     return lesson
 
 
@@ -102,18 +126,16 @@ def delete_lesson(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Delete a lesson.
     """
-    lesson = crud.lesson.get(db=db, id=id)
+    # Comments and ratings go with it (ON DELETE CASCADE)
+    where = () if current_user.is_admin else (crud.lesson.owned_by(current_user.id),)
+    lesson = crud.lesson.delete_by_id(db=db, id=id, where=where)
     if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
-    course = crud.course.get(db=db, id=lesson.course_id)
-    if course.author_id != current_user.id and not current_user.is_admin:
+        if not crud.lesson.exists(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Lesson not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    lesson = crud.lesson.remove(db=db, id=id)
     return lesson
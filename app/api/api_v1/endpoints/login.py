@@ -5,23 +5,25 @@ from fastapi import APIRouter, Body, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr, BaseModel
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app import crud, models, schemas
+from app import crud, schemas
 from app.api import deps
 from app.core import security
 from app.core.config import settings
+from app.core.principal import Principal
 
 router = APIRouter()
 
 
 @router.post("/login/access-token", response_model=schemas.Token)
-def login_access_token(
+async def login_access_token(
     db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.user.authenticate(
+    user = await crud.user.authenticate_async(
         db, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -44,14 +46,14 @@ class LoginForm(BaseModel):
 
 
 @router.post("/token", response_model=schemas.Token)
-def get_token(
+async def get_token(
     form_data: LoginForm,
     db: Session = Depends(deps.get_db)
 ) -> Any:
     """
     Получить токен без дополнительных полей
     """
-    user = crud.user.authenticate(
+    user = await crud.user.authenticate_async(
         db, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -70,7 +72,7 @@ def get_token(
 
 
 @router.post("/login/test-token", response_model=schemas.User)
-def test_token(current_user: models.User = Depends(deps.get_current_user)) -> Any:
+def test_token(current_user: Principal = Depends(deps.get_current_user)) -> Any:
     """
     Test access token
     """
@@ -78,7 +80,7 @@ def test_token(current_user: models.User = Depends(deps.get_current_user)) -> An
 
 
 @router.post("/register", response_model=schemas.User)
-def register_user(
+async def register_user(
     *,
     db: Session = Depends(deps.get_db),
     full_name: str = Body(...),
@@ -88,7 +90,7 @@ def register_user(
     """
     Register new user
     """
-    user = crud.user.get_by_email(db, email=email)
+    user = await run_in_threadpool(crud.user.get_by_email, db, email=email)
     if user:
         raise HTTPException(
             status_code=400,
@@ -100,6 +102,6 @@ def register_user(
         email=email,
         password=password,
     )
-    user = crud.user.create(db, obj_in=user_in)
+    user = await crud.user.create_async(db, obj_in=user_in)
     
     return user
@@ -1,10 +1,12 @@
-from typing import Any, List
+from typing import Any, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.principal import Principal
+from app.utils.pagination import PaginatedResponse, paginate_page, set_next_cursor
 
 router = APIRouter()
 
@@ -14,24 +16,20 @@ def create_rating(
     *,
     db: Session = Depends(deps.get_db),
     rating_in: schemas.RatingCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create or update a rating for a lesson.
     """
-    # Check if lesson exists
-    lesson = crud.lesson.get(db=db, id=rating_in.lesson_id)
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
-    # Check if user is enrolled in the course that contains this lesson
-    course = crud.course.get(db=db, id=lesson.course_id)
-    enrollment = crud.enrollment.get_by_user_and_course(
-        db=db, user_id=current_user.id, course_id=course.id
+    # Check if lesson exists and whether user is enrolled in its course
+    lesson_access = crud.access.check_lesson(
+        db, lesson_id=rating_in.lesson_id, user_id=current_user.id
     )
+    if not lesson_access:
+        raise HTTPException(status_code=404, detail="Lesson not found")
     
     # Only allow enrolled users to rate
-    if not enrollment and not current_user.is_admin:
+    if not lesson_access.is_enrolled and not current_user.is_admin:
         raise HTTPException(status_code=403, 
                            detail="You must be enrolled in this course to rate lessons")
     
@@ -41,39 +39,53 @@ def create_rating(
     return rating
 
 
-@router.get("/by-lesson/{lesson_id}", response_model=List[schemas.Rating])
+@router.get(
+    "/by-lesson/{lesson_id}", response_model=Union[List[schemas.Rating], PaginatedResponse[schemas.Rating]]
+)
 def read_ratings_by_lesson(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     lesson_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get ratings for a specific lesson.
     """
     # Check if lesson exists
-    lesson = crud.lesson.get(db=db, id=lesson_id)
+    lesson = crud.get_loader(db).load(models.Lesson, lesson_id)
     if not lesson:
         raise HTTPException(status_code=404, detail="Lesson not found")
     
-    ratings = db.query(models.Rating).filter(models.Rating.lesson_id == lesson_id).all()
+    ratings = crud.rating.get_multi_by_lesson(
+        db=db, lesson_id=lesson_id, skip=skip, limit=limit, cursor=cursor
+    )
+    next_cursor = crud.rating.next_cursor(ratings, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.Rating, models.Rating.lesson_id == lesson_id)
+        return paginate_page(
+            ratings, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return ratings
 
 
 @router.get("/average/lesson/{lesson_id}", response_model=float)
 def get_average_rating(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     lesson_id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get average rating for a lesson.
     """
     # Check if lesson exists
-    lesson = crud.lesson.get(db=db, id=lesson_id)
+    lesson = crud.get_loader(db).load(models.Lesson, lesson_id)
     if not lesson:
         raise HTTPException(status_code=404, detail="Lesson not found")
     
@@ -86,18 +98,16 @@ def delete_rating(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Delete a rating.
     """
-    rating = crud.rating.get(db=db, id=id)
-    if not rating:
-        raise HTTPException(status_code=404, detail="Rating not found")
-    
     # Only allow rating owner or admin to delete
-    if rating.user_id != current_user.id and not current_user.is_admin:
+    where = () if current_user.is_admin else (crud.rating.owned_by(current_user.id),)
+    rating = crud.rating.delete_by_id(db=db, id=id, where=where)
+    if not rating:
+        if not crud.rating.exists(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Rating not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    rating = crud.rating.remove(db=db, id=id)
     return rating
@@ -0,0 +1,34 @@
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+
+from app import crud, schemas
+from app.api import deps
+from app.core.principal import Principal
+from app.db.session import AnySession
+from app.utils.pagination import set_next_cursor
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[schemas.SearchHit])
+async def search(
+    response: Response,
+    q: str,
+    db: AnySession = Depends(deps.get_async_db),
+    kind: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Search course titles and descriptions and lesson titles and content,
+    best matches first. The next page is in the X-Next-Cursor header.
+    """
+    if kind is not None and kind not in crud.search.kinds:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(crud.search.kinds)}")
+    if not crud.search.available(db):
+        raise HTTPException(status_code=501, detail="Full-text search needs SQLite FTS5")
+    hits = await crud.search.search_async(db, q=q, kind=kind, limit=limit, cursor=cursor)
+    set_next_cursor(response, crud.search.next_cursor(hits, limit))
+    return hits
@@ -1,28 +1,39 @@
-from typing import Any, List
+from typing import Any, List, Optional, Union
 
-from fastapi import APIRouter, Body, Depends, HTTPException
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
 from pydantic import EmailStr
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
 from app.core.config import settings
+from app.core.principal import Principal
+from app.utils.pagination import PaginatedResponse, paginate_page, set_next_cursor
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.User])
+@router.get("/", response_model=Union[List[schemas.User], PaginatedResponse[schemas.User]])
 def read_users(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    envelope: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Retrieve users.
     """
-    users = crud.user.get_multi(db, skip=skip, limit=limit)
+    users = crud.user.get_multi(db, skip=skip, limit=limit, cursor=cursor)
+    next_cursor = crud.user.next_cursor(users, limit)
+    set_next_cursor(response, next_cursor)
+    if envelope:
+        count = crud.counts.count(db, models.User)
+        return paginate_page(
+            users, count, skip=skip, limit=limit, cursor=cursor, next_cursor=next_cursor
+        )
     return users
 
 
@@ -52,26 +63,25 @@ def update_user_me(
     full_name: str = Body(None),
     email: EmailStr = Body(None),
     password: str = Body(None),
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Update own user.
     """
-    current_user_data = jsonable_encoder(current_user)
-    user_in = schemas.UserUpdate(**current_user_data)
+    user_in = {}
     if full_name is not None:
-        user_in.full_name = full_name
+        user_in["full_name"] = full_name
     if email is not None:
-        user_in.email = email
+        user_in["email"] = email
     if password is not None:
-        user_in.password = password
-    user = crud.user.update(db, db_obj=current_user, obj_in=user_in)
+        user_in["password"] = password
+    user = crud.user.update_by_id(db, id=current_user.id, obj_in=user_in)
     return user
 
 
 @router.get("/me", response_model=schemas.User)
 def read_user_me(
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get current user.
@@ -82,14 +92,14 @@ def read_user_me(
 @router.get("/{user_id}", response_model=schemas.User)
 def read_user_by_id(
     user_id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
-    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    db: Session = Depends(deps.get_read_db),
 ) -> Any:
     """
     Get a specific user by id.
     """
     user = crud.user.get(db, id=user_id)
-    if user == current_user:
+    if user and user.id == current_user.id:
         return user
     if not crud.user.is_admin(current_user):
         raise HTTPException(
@@ -104,16 +114,15 @@ def update_user(
     db: Session = Depends(deps.get_db),
     user_id: int,
     user_in: schemas.UserUpdate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: Principal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Update a user.
     """
-    user = crud.user.get(db, id=user_id)
+    user = crud.user.update_by_id(db, id=user_id, obj_in=user_in)
     if not user:
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
-    user = crud.user.update(db, db_obj=user, obj_in=user_in)
     return user
@@ -1,4 +1,6 @@
-from typing import Generator, Optional
+import time
+from typing import AsyncGenerator, Generator, Optional
+from urllib.parse import quote
 
 from fastapi import Depends, HTTPException, status, Request, Cookie
 from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
@@ -9,10 +11,13 @@ from jose import jwt
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from app import crud, models, schemas
+from app import crud, schemas
 from app.core import security
+from app.core.cache import local_ttl
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.core.principal import Principal, principal_cache, token_digest
+from app.db import session as db_session
+from app.db.session import router
 
 # API Key in header (только Bearer Token без дополнительных полей)
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
@@ -47,20 +52,98 @@ reusable_oauth2 = OAuth2PasswordBearer(
 )
 
 
-def get_db() -> Generator:
+def client_key(request: Request) -> Optional[str]:
+    """Who a request comes from, for read-your-writes: its token, else its address"""
+    token = request.headers.get("Authorization") or request.cookies.get("access_token")
+    if token:
+        return token_digest(token.replace("Bearer ", ""))
+    return request.client.host if request.client else None
+
+
+# Primary (write) session; commits make this client's next reads skip stale replicas
+def get_db(request: Request) -> Generator:
+    db = router.write_session(client_key(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Session for GET endpoints: a replica that is fresh enough, else the primary
+def get_read_db(request: Request) -> Generator:
+    db = router.read_session(client_key(request))
     try:
-        db = SessionLocal()
         yield db
     finally:
         db.close()
 
 
+# Session for the heavy aggregations in /stats
+def get_analytics_db() -> Generator:
+    db = router.analytics_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db(request: Request) -> AsyncGenerator:
+    """
+    Session for the coroutine endpoints: an AsyncSession when DB_ASYNC is on,
+    otherwise a routed read session that the *_async CRUD methods drive from the threadpool.
+    """
+    if db_session.AsyncSessionLocal is not None:
+        async with db_session.AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = router.read_session(client_key(request))
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def get_principal(db: Session, token: str) -> Principal:
+    """
+    Resolve a bearer token to a Principal.
+    Tokens seen recently are served from the principal cache without
+    decoding the JWT or querying the users table.
+    """
+    digest = token_digest(token)
+    principal = principal_cache.get(digest)
+    if principal is not None:
+        return principal
+
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+        )
+        token_data = schemas.TokenPayload(**payload)
+    except (jwt.JWTError, ValidationError):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    user = crud.user.get(db, id=token_data.sub)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    principal = Principal.from_user(user)
+    # Never keep a principal around for longer than its token is valid
+    ttl = local_ttl(settings.PRINCIPAL_CACHE_TTL_SECONDS)
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        principal_cache.set(digest, principal, ttl=ttl, tags=(user.id,))
+    return principal
+
+
 # Get current user with standard OAuth2 (with extra fields in Swagger UI)
 def get_current_user(
     db: Session = Depends(get_db), 
     token: str = Depends(reusable_oauth2), 
     cookie_token: str = Depends(get_token_from_cookie)
-) -> models.User:
+) -> Principal:
     # Используем токен из cookie, если токен из OAuth2 не предоставлен
     # OAuth2 может быть None в случае API-запросов из браузера, где токен передается через cookie
     if not token and cookie_token:
@@ -72,20 +155,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = schemas.TokenPayload(**payload)
-    except (jwt.JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
-    user = crud.user.get(db, id=token_data.sub)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return get_principal(db, token)
 
 
 # Get current user with API key header (только Bearer token)
@@ -93,7 +163,7 @@ def get_current_user_api_key(
     db: Session = Depends(get_db), 
     header_token: str = Depends(get_token_from_header),
     cookie_token: str = Depends(get_token_from_cookie)
-) -> models.User:
+) -> Principal:
     # Используем токен из cookie, если токен из заголовка не предоставлен
     token = header_token if header_token else cookie_token
     if not token:
@@ -103,25 +173,12 @@ def get_current_user_api_key(
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = schemas.TokenPayload(**payload)
-    except (jwt.JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
-    user = crud.user.get(db, id=token_data.sub)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return get_principal(db, token)
 
 
 def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if not crud.user.is_active(current_user):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -129,16 +186,16 @@ def get_current_active_user(
 
 # Get current active user with API key header auth
 def get_current_active_user_api_key(
-    current_user: models.User = Depends(get_current_user_api_key),
-) -> models.User:
+    current_user: Principal = Depends(get_current_user_api_key),
+) -> Principal:
     if not crud.user.is_active(current_user):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
 def get_current_active_admin(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if not crud.user.is_admin(current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="The user doesn't have enough privileges"
@@ -148,10 +205,41 @@ def get_current_active_admin(
 
 # Get current active admin with API key auth
 def get_current_active_admin_api_key(
-    current_user: models.User = Depends(get_current_user_api_key),
-) -> models.User:
+    current_user: Principal = Depends(get_current_user_api_key),
+) -> Principal:
     if not crud.user.is_admin(current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+def _admin_login_redirect(error: Optional[str] = None) -> HTTPException:
+    url = f"{settings.API_V1_STR}/admin/login"
+    if error:
+        url += f"?error={quote(error)}"
+    return HTTPException(status_code=status.HTTP_303_SEE_OTHER, headers={"Location": url})
+
+
+# Admin session for the HTML admin pages (cookie auth, redirects instead of 401/403)
+def get_admin_session(
+    request: Request,
+    db: Session = Depends(get_db),
+    token: str = Depends(get_token_from_cookie),
+) -> Principal:
+    # Уже проверено в рамках этого запроса
+    admin = getattr(request.state, "admin", None)
+    if admin is not None:
+        return admin
+    if not token:
+        raise _admin_login_redirect()
+    try:
+        admin = get_principal(db, token)
+    except HTTPException:
+        raise _admin_login_redirect()
+    if not admin.is_active:
+        raise _admin_login_redirect()
+    if not admin.is_admin:
+        raise _admin_login_redirect("У вас нет прав администратора")
+    request.state.admin = admin
+    return admin
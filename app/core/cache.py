@@ -0,0 +1,534 @@
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+# Named caches, so their counters can be reported in one place
+caches: Dict[str, Any] = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe bounded LRU mapping whose entries expire after ``ttl`` seconds.
+
+    Entries may carry tags; ``invalidate_tag`` drops every entry with that tag,
+    which is how callers evict all entries derived from one database row.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float], name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        if name:
+            caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        *,
+        ttl: Optional[float] = None,
+        tags: Iterable[Hashable] = (),
+    ) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, expires_at, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def invalidate_tag(self, tag: Hashable) -> int:
+        """Drop every entry stored with ``tag``, returning how many were removed"""
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+            for key in list(keys):
+                self._pop(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _pop(self, key: Hashable) -> None:
+        # Caller must hold the lock
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# (seq, channel, kind, ident, origin) of an invalidation broadcast
+Message = Tuple[int, str, str, str, str]
+
+
+class SharedStore(ABC):
+    """
+    Cache tier shared by every worker process on the host, plus the
+    message log the workers broadcast invalidations through. Keys and
+    tags are strings; values are anything picklable.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """(value, tags, expires_at) or None"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, expires_at: Optional[float], tags: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate_tag(self, tag: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self, prefix: str) -> None:
+        ...
+
+    @abstractmethod
+    def publish(self, channel: str, kind: str, ident: str, origin: str) -> None:
+        ...
+
+    @abstractmethod
+    def messages_after(self, seq: int) -> Tuple[List[Message], bool]:
+        """Messages newer than ``seq``, and False if some were pruned before they were read"""
+
+    @abstractmethod
+    def last_seq(self) -> int:
+        ...
+
+
+class MemoryStore(SharedStore):
+    """
+    In-process stand-in for the shared tier. Several TieredCaches on one
+    MemoryStore behave like the same cache in several workers, which is
+    how the cross-worker paths are tested without a second process.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Tuple[Any, Tuple[str, ...], Optional[float]]] = {}
+        self._messages: List[Message] = []
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] <= time.time()):
+                return None
+            return pickle.loads(entry[0]), entry[1], entry[2]
+
+    def set(self, key: str, value: Any, expires_at: Optional[float], tags: Iterable[str]) -> None:
+        # Pickled like the file store, so nothing is shared by reference
+        with self._lock:
+            self._entries[key] = (pickle.dumps(value), tuple(tags), expires_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_tag(self, tag: str) -> None:
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if tag in entry[1]]:
+                del self._entries[key]
+
+    def clear(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def publish(self, channel: str, kind: str, ident: str, origin: str) -> None:
+        with self._lock:
+            self._messages.append((len(self._messages) + 1, channel, kind, ident, origin))
+
+    def messages_after(self, seq: int) -> Tuple[List[Message], bool]:
+        with self._lock:
+            return self._messages[seq:], True
+
+    def last_seq(self) -> int:
+        return len(self._messages)
+
+
+class SQLiteStore(SharedStore):
+    """
+    Shared tier in an SQLite file (WAL mode) that all workers on the host
+    open. Entries expire lazily; messages older than ``message_ttl``
+    seconds are pruned. Only point it at a file no other user can write:
+    values are pickled.
+    """
+
+    def __init__(self, path: str, message_ttl: float = 3600.0):
+        self.path = path
+        self.message_ttl = message_ttl
+        self._local = threading.local()
+        self._published = 0
+
+    def get(self, key: str) -> Any:
+        row = self._conn().execute(
+            "SELECT value, tags, expires_at FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[2] is not None and row[2] <= time.time()):
+            return None
+        return pickle.loads(row[0]), tuple(filter(None, row[1].split("\n"))), row[2]
+
+    def set(self, key: str, value: Any, expires_at: Optional[float], tags: Iterable[str]) -> None:
+        tags = tuple(tags)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entry (key, value, tags, expires_at) VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value), "\n".join(tags), expires_at),
+            )
+            conn.execute("DELETE FROM cache_tag WHERE key = ?", (key,))
+            conn.executemany("INSERT OR IGNORE INTO cache_tag (tag, key) VALUES (?, ?)", [(t, key) for t in tags])
+
+    def delete(self, key: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+            conn.execute("DELETE FROM cache_tag WHERE key = ?", (key,))
+
+    def invalidate_tag(self, tag: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_tag WHERE tag = ?)", (tag,))
+            conn.execute("DELETE FROM cache_tag WHERE tag = ?", (tag,))
+
+    def clear(self, prefix: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache_entry WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            conn.execute("DELETE FROM cache_tag WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def publish(self, channel: str, kind: str, ident: str, origin: str) -> None:
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT INTO cache_message (channel, kind, ident, origin, created_at) VALUES (?, ?, ?, ?, ?)",
+                (channel, kind, ident, origin, now),
+            )
+            self._published += 1
+            if self._published % 1000 == 0:
+                conn.execute("DELETE FROM cache_message WHERE created_at < ?", (now - self.message_ttl,))
+                conn.execute("DELETE FROM cache_entry WHERE expires_at <= ?", (now,))
+
+    def messages_after(self, seq: int) -> Tuple[List[Message], bool]:
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT seq, channel, kind, ident, origin FROM cache_message WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        # AUTOINCREMENT never reuses a seq, so a hole after ``seq`` means pruned messages
+        complete = not rows or rows[0][0] == seq + 1 or seq == 0
+        return rows, complete
+
+    def last_seq(self) -> int:
+        return self._conn().execute("SELECT coalesce(max(seq), 0) FROM cache_message").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections stay in the thread that opened them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entry (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, tags TEXT NOT NULL, expires_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS cache_tag (
+                    tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS ix_cache_tag_key ON cache_tag (key);
+                CREATE TABLE IF NOT EXISTS cache_message (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL, kind TEXT NOT NULL, ident TEXT NOT NULL,
+                    origin TEXT NOT NULL, created_at REAL NOT NULL
+                );
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+
+class TieredCache:
+    """
+    TTLCache in front of an optional SharedStore, with the TTLCache
+    interface. Reads try the local tier, then the shared one; writes go to
+    both. Every set, delete, tag invalidation and clear is broadcast, and
+    each cache applies the other workers' broadcasts to its local tier at
+    most ``sync_interval`` seconds after they happened, so a worker never
+    serves a local copy that another worker has invalidated for longer
+    than that.
+
+    With ``share_values`` False only the invalidations (deletes, tags,
+    clears) are shared, for values that cannot be pickled or are cheap to
+    recompute per worker.
+    ``listeners`` are called with (kind, ident) for every broadcast that
+    came from another worker. Without a store it is a plain TTLCache.
+    ``channel`` defaults to ``name``; unnamed shared caches need one.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float],
+        name: Optional[str] = None,
+        *,
+        store: Optional[SharedStore] = None,
+        share_values: bool = True,
+        sync_interval: Optional[float] = None,
+        channel: Optional[str] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.store = store
+        self.share_values = share_values
+        self.sync_interval = settings.SHARED_CACHE_SYNC_SECONDS if sync_interval is None else sync_interval
+        self.listeners: List[Callable[[str, str], None]] = []
+        self.shared_hits = 0
+        self.remote_invalidations = 0
+        # Bumped by every delete, tag invalidation and clear, here or in another worker
+        self._invalidations = 0
+        self._local = TTLCache(maxsize, ttl)
+        # Channel of this cache in the store: the same in every worker, unique within one
+        self._channel = channel or name
+        if store is not None and not self._channel:
+            raise ValueError("A shared TieredCache needs a name or a channel")
+        self._origin = uuid.uuid4().hex
+        self._seq = store.last_seq() if store is not None else 0
+        self._synced_at = time.monotonic()
+        self._sync_lock = threading.Lock()
+        if name:
+            caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self.sync()
+        skey = self._key(key)
+        value = self._local.get(skey, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.store is None or not self.share_values:
+            return default
+        entry = self.store.get(self._channel + ":" + skey)
+        if entry is None:
+            return default
+        value, tags, expires_at = entry
+        self.shared_hits += 1
+        ttl = None if expires_at is None else max(expires_at - time.time(), 0.0)
+        self._local.set(skey, value, ttl=ttl, tags=tags)
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        *,
+        ttl: Optional[float] = None,
+        tags: Iterable[Hashable] = (),
+    ) -> None:
+        self.sync()
+        skey = self._key(key)
+        tags = tuple(str(tag) for tag in tags)
+        self._local.set(skey, value, ttl=ttl, tags=tags)
+        if self.store is not None and self.share_values:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+            self.store.set(self._channel + ":" + skey, value, expires_at, tags)
+            # Other workers drop their local copy and read the new value from the store
+            self._publish("key", skey)
+
+    def token(self) -> int:
+        """Take before reading the value that is passed to add()"""
+        self.sync(force=True)
+        return self._invalidations
+
+    def add(self, key: Hashable, value: Any, *, token: int, ttl: Optional[float] = None) -> bool:
+        """
+        Store a value read from the database only if ``key`` is still absent
+        and nothing was invalidated since ``token``, so a read that raced a
+        write never overwrites the write's invalidation. Returns whether it
+        was stored.
+        """
+        self.sync(force=True)
+        skey = self._key(key)
+        if self._invalidations != token or self._local.get(skey, _MISSING) is not _MISSING:
+            return False
+        if self.store is not None and self.share_values and self.store.get(self._channel + ":" + skey):
+            return False
+        self.set(key, value, ttl=ttl)
+        return True
+
+    def delete(self, key: Hashable) -> None:
+        skey = self._key(key)
+        self._invalidations += 1
+        self._local.delete(skey)
+        if self.store is not None:
+            if self.share_values:
+                self.store.delete(self._channel + ":" + skey)
+            self._publish("key", skey if self.share_values else repr(key))
+
+    def invalidate_tag(self, tag: Hashable) -> int:
+        self._invalidations += 1
+        removed = self._local.invalidate_tag(str(tag))
+        if self.store is not None:
+            if self.share_values:
+                self.store.invalidate_tag(str(tag))
+            self._publish("tag", str(tag))
+        return removed
+
+    def clear(self) -> None:
+        self._invalidations += 1
+        self._local.clear()
+        if self.store is not None:
+            if self.share_values:
+                self.store.clear(self._channel + ":")
+            self._publish("clear", "")
+
+    def sync(self, force: bool = False) -> None:
+        """Apply the invalidations other workers broadcast since the last sync"""
+        if self.store is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_interval:
+            return
+        with self._sync_lock:
+            self._synced_at = now
+            messages, complete = self.store.messages_after(self._seq)
+            if not complete:
+                # Missed broadcasts: nothing local can be trusted
+                self._invalidations += 1
+                self._local.clear()
+            for seq, channel, kind, ident, origin in messages:
+                self._seq = seq
+                if channel != self._channel or origin == self._origin:
+                    continue
+                self.remote_invalidations += 1
+                self._invalidations += 1
+                if kind == "key":
+                    self._delete_remote(ident)
+                elif kind == "tag":
+                    self._local.invalidate_tag(ident)
+                else:
+                    self._local.clear()
+                for listener in self.listeners:
+                    listener(kind, ident)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._local.stats(),
+            "shared": self.store is not None,
+            "shared_hits": self.shared_hits,
+            "remote_invalidations": self.remote_invalidations,
+        }
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+    def _key(self, key: Hashable) -> Any:
+        # Shared keys cross process boundaries as their repr; ints, strings and tuples of them
+        return repr(key) if self.store is not None and self.share_values else key
+
+    def _delete_remote(self, ident: str) -> None:
+        if self.share_values:
+            self._local.delete(ident)
+            return
+        # Local keys are kept as they are, and only come over as their repr
+        for key in self._local.keys():
+            if repr(key) == ident:
+                self._local.delete(key)
+
+    def _publish(self, kind: str, ident: str) -> None:
+        self.store.publish(self._channel, kind, ident, self._origin)
+
+
+# Shared tier of every cache that opts in, one file per host; None keeps caches per process
+shared_store: Optional[SharedStore] = (
+    SQLiteStore(settings.SHARED_CACHE_PATH) if settings.SHARED_CACHE_PATH else None
+)
+
+
+def local_ttl(ttl: Optional[float]) -> Optional[float]:
+    """
+    ``ttl`` of a cache that writes in any worker must invalidate: capped at
+    LOCAL_CACHE_TTL_SECONDS when there is no shared tier to carry them
+    """
+    cap = settings.LOCAL_CACHE_TTL_SECONDS
+    if shared_store is not None or cap is None:
+        return ttl
+    return cap if ttl is None else min(ttl, cap)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters of every named cache"""
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -23,6 +23,120 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Online Course Platform"
     
     SQLALCHEMY_DATABASE_URI: str = "sqlite:///./app.db"
+    # Serve the hot read endpoints through an async engine (aiosqlite/asyncpg)
+    DB_ASYNC: bool = False
+    # Derived from SQLALCHEMY_DATABASE_URI when not set
+    SQLALCHEMY_ASYNC_DATABASE_URI: Optional[str] = None
+
+    # Read replicas for the GET endpoints; reads use the primary when empty
+    SQLALCHEMY_REPLICA_URIS: List[str] = []
+    # Engine for the /stats aggregations; falls back to the read replicas
+    SQLALCHEMY_ANALYTICS_URI: Optional[str] = None
+    # Replicas further behind the primary than this are skipped
+    REPLICA_MAX_LAG_SECONDS: float = 10.0
+    # After a write, a client reads from the primary (or a replica known to
+    # have the write) for this long
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    # SQLite file replicas are re-copied from the primary at this interval
+    SQLITE_REPLICA_REFRESH_SECONDS: float = 1.0
+
+    # Connection pool (ignored for in-memory SQLite)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+
+    # SQLite profile, applied as PRAGMAs on every new connection
+    SQLITE_PROFILE_ENABLED: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # Negative values are KiB: -65536 = 64 MiB of page cache per connection
+    SQLITE_CACHE_SIZE: int = -65536
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_FOREIGN_KEYS: bool = True
+
+    # SQLite file holding the cache tier shared by the workers of this host
+    # (None: every cache stays in its own process). Required when more than
+    # one worker serves the app (uvicorn --workers, gunicorn): without it a
+    # write in one worker does not invalidate the caches of the others
+    SHARED_CACHE_PATH: Optional[str] = None
+    # Without a shared tier, caches a write elsewhere must invalidate (principals,
+    # access index, query results, row counts) keep entries at most this long.
+    # None keeps the full TTLs: only for a single worker process
+    LOCAL_CACHE_TTL_SECONDS: Optional[float] = 5.0
+    # Invalidations from other workers reach the local tiers within this many seconds
+    SHARED_CACHE_SYNC_SECONDS: float = 0.5
+
+    # Token -> principal cache used by the auth dependencies
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+
+    # bcrypt runs on a dedicated executor: "process" or "thread"
+    PASSWORD_HASH_EXECUTOR: str = "process"
+    # Concurrent hashes; defaults to the number of CPUs
+    PASSWORD_HASH_MAX_WORKERS: Optional[int] = None
+    # Hashes allowed to wait for a worker before new ones are rejected with 503
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # Startup calibration picks the highest bcrypt cost whose hash time fits the budget
+    BCRYPT_LATENCY_BUDGET_MS: int = 250
+    # Floor of the policy: never hashed below, and only stored hashes below it get rehashed.
+    # Fixed rather than calibrated so every worker agrees; 12 was passlib's default
+    BCRYPT_MIN_ROUNDS: int = 12
+    BCRYPT_MAX_ROUNDS: int = 16
+    # Fixed bcrypt cost for new hashes (raised to BCRYPT_MIN_ROUNDS); skips calibration when set
+    BCRYPT_ROUNDS: Optional[int] = None
+
+    # In-memory lesson/course/enrollment index used for access checks
+    ACCESS_INDEX_MAX_SIZE: int = 100000
+    ACCESS_INDEX_TTL_SECONDS: int = 300
+
+    # Rows per INSERT/UPDATE statement in the CRUD bulk methods
+    BULK_BATCH_SIZE: int = 500
+
+    # Per-request SQL statistics: X-DB-Queries / Server-Timing headers and N+1 warnings
+    SQL_STATS_ENABLED: bool = True
+    # A SELECT shape repeated this many times in one request is reported as a likely N+1
+    N_PLUS_ONE_THRESHOLD: int = 5
+
+    # Statements slower than this go to the slow-query log (None disables it)
+    SLOW_QUERY_THRESHOLD_MS: Optional[float] = 200.0
+    SLOW_QUERY_LOG_PATH: str = "logs/slow_queries.log"
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = 5
+    # Record EXPLAIN QUERY PLAN of slow SELECT/UPDATE/DELETE statements
+    SLOW_QUERY_EXPLAIN: bool = True
+
+    # Background course purge: rows per DELETE, each batch is its own short transaction
+    PURGE_BATCH_SIZE: int = 1000
+    # Finished purge jobs are kept this long for progress polling
+    PURGE_JOB_TTL_SECONDS: int = 3600
+    # Counter/rollup rebuild (reconcile_counters.py --rebuild): parent rows per transaction
+    COUNTER_REBUILD_BATCH_SIZE: int = 1000
+    # platform_totals rows the totals are spread over, so concurrent writers rarely share a row lock
+    PLATFORM_TOTALS_SLOTS: int = 16
+    # Admin dashboard snapshot: background refresh interval (0: computed on every read)
+    DASHBOARD_REFRESH_SECONDS: int = 30
+    # Courses and users listed as recent on the dashboard
+    DASHBOARD_RECENT_LIMIT: int = 5
+
+    # Cached row counts behind paginated totals, dropped on every write to the table
+    ROW_COUNT_CACHE_MAX_SIZE: int = 10000
+    ROW_COUNT_CACHE_TTL_SECONDS: int = 300
+    # Unfiltered totals of tables at least this large are estimated, not counted
+    ROW_COUNT_APPROXIMATE_ABOVE: Optional[int] = 1000000
+
+    # Read-through cache of CRUD query results, invalidated by per-table write versions
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_MAX_SIZE: int = 10000
+    QUERY_CACHE_TTL_SECONDS: int = 300
+    # Empty results (404s) are kept shorter
+    QUERY_CACHE_NEGATIVE_TTL_SECONDS: int = 30
+
+    # Full-text search (GET /search): largest page, and words of context per snippet
+    SEARCH_MAX_LIMIT: int = 100
+    SEARCH_SNIPPET_TOKENS: int = 16
 
     model_config = SettingsConfigDict(case_sensitive=True)
 
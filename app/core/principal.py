@@ -0,0 +1,48 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.core.cache import TieredCache, local_ttl, shared_store
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Authenticated user as seen by the API layer.
+    Carries only what authorization and the "me" endpoints need,
+    so resolving it from a cached token never touches the users table.
+    """
+    id: int
+    email: Optional[str]
+    full_name: Optional[str]
+    is_active: bool
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            is_active=bool(user.is_active),
+            is_admin=bool(user.is_admin),
+        )
+
+
+# Token digest -> Principal, tagged with the user id for invalidation
+principal_cache = TieredCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=local_ttl(settings.PRINCIPAL_CACHE_TTL_SECONDS),
+    name="principal",
+    store=shared_store,
+)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Forget every cached token that resolves to ``user_id``"""
+    principal_cache.invalidate_tag(user_id)
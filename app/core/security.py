@@ -1,15 +1,42 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 ALGORITHM = "HS256"
 
+# bcrypt cost currently enforced by pwd_context (None until configured)
+bcrypt_rounds: Optional[int] = None
+
+# Instrumentation hooks, called as observer(event, payload)
+password_observers: List[Callable[[str, Dict[str, Any]], None]] = []
+
+
+def add_password_observer(observer: Callable[[str, Dict[str, Any]], None]) -> None:
+    password_observers.append(observer)
+
+
+def _emit(event: str, **payload: Any) -> None:
+    for observer in password_observers:
+        try:
+            observer(event, payload)
+        except Exception:
+            logger.exception("Password observer failed on %s", event)
+
 
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
     if expires_delta:
@@ -23,9 +50,172 @@ def create_access_token(subject: Union[str, Any], expires_delta: timedelta = Non
     return encoded_jwt
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def _verify(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def _hash(password: str, rounds: Optional[int] = None) -> str:
+    # Rounds are passed explicitly so executor processes follow the parent's policy
+    if rounds is None:
+        return pwd_context.hash(password)
+    return pwd_context.handler("bcrypt").using(rounds=rounds).hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    started = time.perf_counter()
+    ok = _verify(plain_password, hashed_password)
+    _emit("verify", elapsed_ms=(time.perf_counter() - started) * 1000, ok=ok)
+    return ok
+
+
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _hash(password, bcrypt_rounds)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if the stored hash was made with a cost below the policy floor"""
+    return pwd_context.needs_update(hashed_password)
+
+
+def calibrate_bcrypt_rounds(
+    budget_ms: float, min_rounds: int, max_rounds: int
+) -> int:
+    """
+    Highest bcrypt cost in [min_rounds, max_rounds] whose hash time on this
+    host fits in budget_ms. Each extra round doubles the work, so the cost is
+    extrapolated from one cheap measurement and then confirmed once.
+    """
+    handler = pwd_context.handler("bcrypt")
+
+    def measure(rounds: int) -> float:
+        started = time.perf_counter()
+        handler.using(rounds=rounds).hash("calibration")
+        return (time.perf_counter() - started) * 1000
+
+    base_ms = max(measure(min_rounds), 0.001)
+    rounds = min_rounds + int(math.floor(math.log2(max(budget_ms / base_ms, 1))))
+    rounds = max(min_rounds, min(rounds, max_rounds))
+    while rounds > min_rounds and measure(rounds) > budget_ms:
+        rounds -= 1
+    return rounds
+
+
+def configure_password_policy(rounds: Optional[int] = None, min_rounds: Optional[int] = None) -> int:
+    """
+    Set the bcrypt cost for new hashes, never below ``min_rounds``
+    (BCRYPT_MIN_ROUNDS). Only stored hashes below that floor are flagged by
+    password_needs_rehash and upgraded on the next successful login, so
+    workers calibrated to different costs do not rehash each other's hashes.
+    Without an explicit cost, BCRYPT_ROUNDS is used, else the host is calibrated.
+    """
+    global bcrypt_rounds
+    started = time.perf_counter()
+    calibrated = False
+    if min_rounds is None:
+        min_rounds = settings.BCRYPT_MIN_ROUNDS
+    if rounds is None:
+        rounds = settings.BCRYPT_ROUNDS
+    if rounds is None:
+        rounds = calibrate_bcrypt_rounds(
+            settings.BCRYPT_LATENCY_BUDGET_MS,
+            min_rounds,
+            max(min_rounds, settings.BCRYPT_MAX_ROUNDS),
+        )
+        calibrated = True
+    rounds = max(rounds, min_rounds)
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=min_rounds)
+    bcrypt_rounds = rounds
+    _emit(
+        "calibrated",
+        rounds=rounds,
+        min_rounds=min_rounds,
+        calibrated=calibrated,
+        budget_ms=settings.BCRYPT_LATENCY_BUDGET_MS,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+    return rounds
+
+
+def _log_password_event(event: str, payload: Dict[str, Any]) -> None:
+    if event == "calibrated":
+        logger.info("bcrypt cost set to %s rounds", payload["rounds"])
+    else:
+        logger.debug("password %s took %.1f ms", event, payload["elapsed_ms"])
+
+
+add_password_observer(_log_password_event)
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing queue is full; the API answers 503"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated executor so hashing never blocks the event loop
+    or the request threadpool.
+    At most ``max_workers`` hashes run at once and at most ``max_queue`` more
+    may wait; anything beyond that fails fast with PasswordHashingBusy.
+    """
+
+    def __init__(self, kind: str = "process", max_workers: Optional[int] = None, max_queue: int = 64):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown password hash executor: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="bcrypt"
+                    )
+            return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise PasswordHashingBusy()
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_MAX_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    # Timed here rather than in the worker, and includes time spent queued
+    started = time.perf_counter()
+    ok = await password_hasher.run(_verify, plain_password, hashed_password)
+    _emit("verify", elapsed_ms=(time.perf_counter() - started) * 1000, ok=ok)
+    return ok
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(_hash, password, bcrypt_rounds)
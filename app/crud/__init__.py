@@ -4,3 +4,12 @@ from .lesson import lesson
 from .comment import comment
 from .rating import rating
 from .enrollment import enrollment
+from .access import access
+from .counts import counts
+from .query_cache import query_cache
+from .purge import purge
+from .loader import DataLoader, get_loader
+from .counters import counters
+from .activity import activity
+from .dashboard import dashboard
+from .search import search
@@ -0,0 +1,149 @@
+from typing import Any, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.cache import TieredCache, local_ttl, shared_store
+from app.core.config import settings
+from app.db.session import AnySession, run_session
+from app.models.course import Course
+from app.models.enrollment import Enrollment
+from app.models.lesson import Lesson
+
+
+class LessonAccess(NamedTuple):
+    course_id: int
+    author_id: Optional[int]
+    is_enrolled: bool
+
+
+class AccessIndex:
+    """
+    In-memory index used to authorize lesson, comment and rating requests:
+    lesson -> course, course -> author and user -> enrolled course ids.
+    Warm checks are dictionary lookups; a cold entry costs one query.
+    CRUDEnrollment drops a user's enrollment set on every change to it,
+    and course/lesson entries are dropped when those rows are removed.
+    With a shared cache tier the index is shared by the workers of the host.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float]):
+        self._lesson_course = TieredCache(maxsize, ttl, name="access_lessons", store=shared_store)
+        self._course_author = TieredCache(maxsize, ttl, name="access_courses", store=shared_store)
+        self._enrolled = TieredCache(maxsize, ttl, name="access_enrollments", store=shared_store)
+
+    def check_lesson(
+        self, db: Session, *, lesson_id: int, user_id: int
+    ) -> Optional[LessonAccess]:
+        """Access facts for ``user_id`` on a lesson, or None if the lesson does not exist"""
+        known = self._cached_lesson(lesson_id)
+        enrolled = self._enrolled.get(user_id)
+        if known is None:
+            row = db.execute(self._lesson_stmt(lesson_id, user_id)).first()
+            if row is None:
+                return None
+            known = self._store_lesson(lesson_id, row)
+            if enrolled is None:
+                return LessonAccess(*known, row[2] is not None)
+        if enrolled is None:
+            enrolled = self.enrolled_course_ids(db, user_id=user_id)
+        return LessonAccess(*known, known[0] in enrolled)
+
+    async def check_lesson_async(
+        self, db: AnySession, *, lesson_id: int, user_id: int
+    ) -> Optional[LessonAccess]:
+        known = self._cached_lesson(lesson_id)
+        enrolled = self._enrolled.get(user_id)
+        if known is None:
+            result = await run_session(db, "execute", self._lesson_stmt(lesson_id, user_id))
+            row = result.first()
+            if row is None:
+                return None
+            known = self._store_lesson(lesson_id, row)
+            if enrolled is None:
+                return LessonAccess(*known, row[2] is not None)
+        if enrolled is None:
+            token = self._enrolled.token()
+            result = await run_session(db, "scalars", self._enrolled_stmt(user_id))
+            enrolled = set(result)
+            self._enrolled.add(user_id, enrolled, token=token)
+        return LessonAccess(*known, known[0] in enrolled)
+
+    def enrolled_course_ids(self, db: Session, *, user_id: int) -> Set[int]:
+        enrolled = self._enrolled.get(user_id)
+        if enrolled is None:
+            token = self._enrolled.token()
+            enrolled = set(db.scalars(self._enrolled_stmt(user_id)))
+            self._enrolled.add(user_id, enrolled, token=token)
+        return enrolled
+
+    def is_enrolled(self, db: Session, *, user_id: int, course_id: int) -> bool:
+        return course_id in self.enrolled_course_ids(db, user_id=user_id)
+
+    def _cached_lesson(self, lesson_id: int) -> Optional[Tuple[int, int]]:
+        course_id = self._lesson_course.get(lesson_id)
+        if course_id is None:
+            return None
+        author_id = self._course_author.get(course_id)
+        if author_id is None:
+            return None
+        return course_id, author_id
+
+    def _store_lesson(self, lesson_id: int, row: Any) -> Tuple[int, int]:
+        course_id, author_id = row[0], row[1]
+        self._lesson_course.set(lesson_id, course_id)
+        self._course_author.set(course_id, author_id)
+        return course_id, author_id
+
+    def _lesson_stmt(self, lesson_id: int, user_id: int) -> Select:
+        # Lesson, course and this user's enrollment in a single round trip
+        return (
+            select(Lesson.course_id, Course.author_id, Enrollment.id)
+            .join(Course, Course.id == Lesson.course_id)
+            .outerjoin(
+                Enrollment,
+                and_(
+                    Enrollment.course_id == Lesson.course_id,
+                    Enrollment.user_id == user_id,
+                ),
+            )
+            .where(Lesson.id == lesson_id)
+            .limit(1)
+        )
+
+    def _enrolled_stmt(self, user_id: int) -> Select:
+        return select(Enrollment.course_id).where(Enrollment.user_id == user_id)
+
+    # Maintenance hooks called by the CRUD write paths
+
+    def add_lesson(self, lesson_id: int, course_id: int) -> None:
+        self._lesson_course.set(lesson_id, course_id)
+
+    def remove_lesson(self, lesson_id: int) -> None:
+        self._lesson_course.delete(lesson_id)
+
+    def add_course(self, course_id: int, author_id: int) -> None:
+        self._course_author.set(course_id, author_id)
+
+    def remove_course(self, course_id: int) -> None:
+        # Lessons of the course become cold and miss on their next lookup
+        self._course_author.delete(course_id)
+
+    def add_enrollment(self, user_id: int, course_id: int) -> None:
+        # Dropped rather than patched: a cold load racing this write can not
+        # store its stale set afterwards (TieredCache.add), in any worker
+        self._enrolled.delete(user_id)
+
+    def remove_enrollment(self, user_id: int, course_id: int) -> None:
+        self._enrolled.delete(user_id)
+
+    def clear(self) -> None:
+        self._lesson_course.clear()
+        self._course_author.clear()
+        self._enrolled.clear()
+
+
+access = AccessIndex(
+    maxsize=settings.ACCESS_INDEX_MAX_SIZE, ttl=local_ttl(settings.ACCESS_INDEX_TTL_SECONDS)
+)
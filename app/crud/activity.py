@@ -0,0 +1,47 @@
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.crud.counters import TOTALS_ID
+from app.models.activity import PlatformTotals, UserActivity
+from app.models.user import User
+
+
+class ActivityRollups:
+    """
+    Reads of the rollups app.crud.counters maintains: a sum over the few
+    platform_totals slot rows, one index walk for the most active users.
+    Neither depends on how many rows the counted tables hold.
+    """
+
+    def totals(self, db: Session) -> Dict[str, Any]:
+        names = (
+            "user_count", "course_count", "lesson_count",
+            "enrollment_count", "comment_count", "rating_count", "rating_sum",
+        )
+        # A primary key range over the slots rather than a table scan
+        row = db.execute(
+            select(*(func.coalesce(func.sum(getattr(PlatformTotals, name)), 0) for name in names))
+            .where(PlatformTotals.id >= TOTALS_ID)
+        ).one()
+        counts = dict(zip(names, row))
+        counts["average_rating"] = (
+            counts["rating_sum"] / counts["rating_count"] if counts["rating_count"] else 0.0
+        )
+        return counts
+
+    def most_active_users(self, db: Session, *, limit: int = 5) -> List[Tuple[User, UserActivity]]:
+        """Users with the most enrollments, comments and ratings, read off ix_user_activity_score_user_id"""
+        score = UserActivity.enrollment_count + UserActivity.comment_count + UserActivity.rating_count
+        stmt = (
+            select(User, UserActivity)
+            .join(User, User.id == UserActivity.user_id)
+            .where(score > 0)
+            .order_by(score.desc(), UserActivity.user_id.desc())
+            .limit(limit)
+        )
+        return [tuple(row) for row in db.execute(stmt).all()]
+
+
+activity = ActivityRollups()
@@ -1,17 +1,38 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from datetime import datetime
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import String, delete, insert, literal, select, tuple_, update
+from sqlalchemy.orm import Session, joinedload, raiseload, selectinload
+from sqlalchemy.sql import ColumnElement, Select
 
+from app.core.config import settings
+from app.crud.counters import counters
+from app.crud.query_cache import QueryCache
 from app.db.base_class import Base
+from app.db.session import AnySession, dialect_insert, run_session
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+class InvalidInclude(ValueError):
+    """An ``include=`` path that the resource does not offer"""
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # Sort key of every list query; keyset cursors carry its values for the last row
+    cursor_columns: Tuple[str, ...] = ("id",)
+    # Relationship paths that can be loaded along with the rows, e.g. "lessons.comments"
+    includable: Tuple[str, ...] = ()
+    # Column holding the id of the user a row belongs to, see owned_by()
+    owner_column: Optional[str] = None
+    # Result cache for the reads below, for tables that are read far more than written
+    query_cache: Optional[QueryCache] = None
+
     def __init__(self, model: Type[ModelType]):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
@@ -21,13 +42,21 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
-    def get(self, db: Session, id: Any) -> Optional[ModelType]:
-        return db.query(self.model).filter(self.model.id == id).first()
+    def get(self, db: Session, id: Any, include: Sequence[str] = ()) -> Optional[ModelType]:
+        stmt = select(self.model).where(self.model.id == id).options(*self.load_options(include))
+        return db.scalars(self._cacheable(stmt, include)).first()
 
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include: Sequence[str] = (),
     ) -> List[ModelType]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+        stmt = self._cacheable(select(self.model).options(*self.load_options(include)), include)
+        return self._all(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
@@ -35,6 +64,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        self._on_create(db_obj)
         return db_obj
 
     def update(
@@ -44,21 +74,406 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db_obj: ModelType,
         obj_in: Union[UpdateSchemaType, Dict[str, Any]]
     ) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        self._apply_update(db_obj, obj_in)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        self._on_update(db_obj)
         return db_obj
 
     def remove(self, db: Session, *, id: int) -> ModelType:
-        obj = db.query(self.model).get(id)
+        obj = db.get(self.model, id)
         db.delete(obj)
         db.commit()
+        self._on_remove(obj)
+        return obj
+
+    # Single statement variants: no load before the write, no refresh after it
+
+    def update_by_id(
+        self,
+        db: Session,
+        *,
+        id: Any,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]],
+        where: Sequence[ColumnElement] = (),
+    ) -> Optional[ModelType]:
+        """
+        UPDATE ... WHERE id = :id AND <where> RETURNING *.
+        Returns the row detached from ``db``, or None when no row matched,
+        i.e. the row does not exist or ``where`` (e.g. owned_by()) rejected it.
+        """
+        values = self._column_values(self._update_values(self._update_data(obj_in)))
+        # Counters need the values being overwritten
+        previous = None
+        if counters.affects(self.model, values):
+            previous = self._current_rows(db, self.model.id == id, *where)
+        if values:
+            stmt = update(self.model).values(**values)
+        else:
+            stmt = select(self.model)
+        stmt = stmt.where(self.model.id == id, *where)
+        if values:
+            stmt = stmt.returning(self.model)
+        obj = db.scalars(stmt, execution_options={"populate_existing": True}).first()
+        if obj is not None:
+            # Keep the RETURNING values instead of having commit expire them
+            db.expunge(obj)
+            if previous is not None:
+                counters.rows_replaced(db, self.model, previous, [obj])
+        db.commit()
+        if obj is not None:
+            self._on_update(obj)
         return obj
+
+    def delete_by_id(
+        self, db: Session, *, id: Any, where: Sequence[ColumnElement] = ()
+    ) -> Optional[ModelType]:
+        """
+        DELETE ... WHERE id = :id AND <where> RETURNING *, or None if no row
+        matched. ORM cascades do not run: only use it for rows whose children
+        are removed by the database (or that have none).
+        """
+        # Counted children go with the row; they have to be counted while they exist
+        cascaded = counters.cascade_deltas(db, {self.model: [id]}) if counters.cascades(self.model) else {}
+        obj = db.scalars(
+            delete(self.model).where(self.model.id == id, *where).returning(self.model)
+        ).first()
+        if obj is not None:
+            db.expunge(obj)
+            counters.rows_deleted(db, self.model, [obj])
+            counters.apply(db, cascaded)
+        db.commit()
+        if obj is not None:
+            self._on_remove(obj)
+        return obj
+
+    def owned_by(self, user_id: int) -> ColumnElement:
+        """Predicate matching the rows of ``user_id``, for the ``where`` of the above"""
+        if self.owner_column is None:
+            raise NotImplementedError(f"{self.model.__name__} has no owner column")
+        return getattr(self.model, self.owner_column) == user_id
+
+    def exists(self, db: Session, id: Any) -> bool:
+        return db.scalar(select(self.model.id).where(self.model.id == id)) is not None
+
+    # Bulk variants: one transaction, one statement per batch of rows
+
+    def create_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: Sequence[Union[CreateSchemaType, Dict[str, Any]]],
+        defaults: Optional[Dict[str, Any]] = None,
+        batch_size: Optional[int] = None,
+    ) -> List[ModelType]:
+        """
+        INSERT all rows with executemany ... RETURNING, ``batch_size`` rows per
+        statement, and commit once. ``defaults`` are column values shared by
+        every row (e.g. the author). Dicts are taken as ready column values.
+        """
+        rows = [{**(defaults or {}), **self._create_values(obj_in)} for obj_in in objs_in]
+        created: List[ModelType] = []
+        for batch in self._batches(rows, batch_size):
+            created += db.scalars(insert(self.model).returning(self.model), batch).all()
+        counters.rows_inserted(db, self.model, created)
+        db.commit()
+        for obj in created:
+            self._on_create(obj)
+        return created
+
+    def update_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: Sequence[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+    ) -> List[ModelType]:
+        """
+        UPDATE rows by primary key; each dict holds ``id`` and the columns to set.
+        Runs as executemany per batch and returns the updated rows.
+        """
+        rows = [self._update_values(dict(obj_in)) for obj_in in objs_in]
+        updated: List[ModelType] = []
+        for batch in self._batches(rows, batch_size):
+            ids = [row["id"] for row in batch]
+            previous = None
+            if any(counters.affects(self.model, row) for row in batch):
+                previous = self._current_rows(db, self.model.id.in_(ids))
+            db.execute(update(self.model), batch)
+            batch_updated = db.scalars(
+                select(self.model)
+                .where(self.model.id.in_(ids))
+                .execution_options(populate_existing=True)
+            ).all()
+            if previous is not None:
+                counters.rows_replaced(db, self.model, previous, batch_updated)
+            updated += batch_updated
+        db.commit()
+        for obj in updated:
+            self._on_update(obj)
+        return updated
+
+    def upsert_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: Sequence[Union[CreateSchemaType, Dict[str, Any]]],
+        index_elements: Sequence[str] = ("id",),
+        update_fields: Optional[Sequence[str]] = None,
+        defaults: Optional[Dict[str, Any]] = None,
+        batch_size: Optional[int] = None,
+    ) -> List[ModelType]:
+        """
+        INSERT ... ON CONFLICT (index_elements) DO UPDATE ... RETURNING.
+        ``index_elements`` must be covered by a unique constraint; on conflict
+        ``update_fields`` (default: every other column given) are overwritten.
+        A multi-row VALUES needs the same columns in every row, so rows are
+        grouped by the columns they set.
+        """
+        rows = [{**(defaults or {}), **self._create_values(obj_in)} for obj_in in objs_in]
+        dialect_insert = self._dialect_insert(db)
+        upserted: List[ModelType] = []
+        for batch in self._batches(rows, batch_size, same_columns=True):
+            stmt = dialect_insert(self.model).values(batch)
+            fields = update_fields or [c for c in batch[0] if c not in index_elements]
+            if fields:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(index_elements),
+                    set_={name: stmt.excluded[name] for name in fields},
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=list(index_elements))
+            # RETURNING does not say which rows were updated in place, so look first
+            previous = []
+            if fields and counters.counted(self.model):
+                columns = tuple_(*(getattr(self.model, name) for name in index_elements))
+                # Rows without every key column cannot conflict with anything
+                keys = [
+                    tuple(row[name] for name in index_elements)
+                    for row in batch if all(row.get(name) is not None for name in index_elements)
+                ]
+                if keys:
+                    previous = self._current_rows(db, columns.in_(keys))
+            batch_upserted = db.scalars(
+                stmt.returning(self.model), execution_options={"populate_existing": True}
+            ).all()
+            # DO NOTHING returns the inserted rows only
+            counters.rows_replaced(db, self.model, previous, batch_upserted)
+            upserted += batch_upserted
+        db.commit()
+        for obj in upserted:
+            self._on_update(obj)
+            self._on_create(obj)
+        return upserted
+
+    def _current_rows(self, db: Session, *criteria: ColumnElement) -> List[Any]:
+        # Plain rows, so the values survive the write that follows
+        return db.execute(select(*self.model.__table__.columns).where(*criteria)).all()
+
+    def _create_values(self, obj_in: Union[CreateSchemaType, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return dict(obj_in)
+        return jsonable_encoder(obj_in)
+
+    def _update_values(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        return values
+
+    def _batches(
+        self,
+        rows: List[Dict[str, Any]],
+        batch_size: Optional[int],
+        same_columns: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        size = batch_size or settings.BULK_BATCH_SIZE
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        if same_columns:
+            for row in rows:
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+        else:
+            groups[()] = rows
+        return [
+            group[i:i + size] for group in groups.values() for i in range(0, len(group), size)
+        ]
+
+    def _dialect_insert(self, db: AnySession) -> Any:
+        return dialect_insert(db.get_bind().dialect.name)
+
+    # Async variants. They take an AsyncSession, or a regular Session which is
+    # then driven from the threadpool (see app.db.session.run_session).
+
+    async def get_async(
+        self, db: AnySession, id: Any, include: Sequence[str] = ()
+    ) -> Optional[ModelType]:
+        stmt = select(self.model).where(self.model.id == id).options(*self.load_options(include))
+        return await self._first_async(db, self._cacheable(stmt, include))
+
+    async def get_multi_async(
+        self,
+        db: AnySession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include: Sequence[str] = (),
+    ) -> List[ModelType]:
+        stmt = self._cacheable(select(self.model).options(*self.load_options(include)), include)
+        return await self._all_async(
+            db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor)
+        )
+
+    # Loading policy
+
+    def parse_include(self, include: Optional[str]) -> List[str]:
+        """Paths of a comma separated ``include=`` value, checked against includable"""
+        paths = [path.strip() for path in (include or "").split(",") if path.strip()]
+        for path in paths:
+            if path not in self.includable:
+                raise InvalidInclude(path)
+        return paths
+
+    def load_options(self, include: Sequence[str] = ()) -> List[Any]:
+        """
+        Loader options for ``include``: selectinload for collections (one
+        query per relationship, no row multiplication) and joinedload for
+        many-to-one. Relationships that are not included raise on access
+        instead of lazy loading one query per row.
+        """
+        options: List[Any] = []
+        for path in include:
+            model, loader = self.model, None
+            for name in path.split("."):
+                attr = getattr(model, name)
+                strategy = selectinload if attr.property.uselist else joinedload
+                loader = strategy(attr) if loader is None else getattr(loader, strategy.__name__)(attr)
+                model = attr.property.mapper.class_
+            options.append(loader.raiseload("*"))
+        options.append(raiseload("*"))
+        return options
+
+    async def create_async(self, db: AnySession, *, obj_in: CreateSchemaType) -> ModelType:
+        db_obj = self.model(**jsonable_encoder(obj_in))
+        db.add(db_obj)
+        await run_session(db, "commit")
+        await run_session(db, "refresh", db_obj)
+        self._on_create(db_obj)
+        return db_obj
+
+    async def update_async(
+        self,
+        db: AnySession,
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> ModelType:
+        self._apply_update(db_obj, obj_in)
+        db.add(db_obj)
+        await run_session(db, "commit")
+        await run_session(db, "refresh", db_obj)
+        self._on_update(db_obj)
+        return db_obj
+
+    async def remove_async(self, db: AnySession, *, id: int) -> Optional[ModelType]:
+        obj = await run_session(db, "get", self.model, id)
+        if obj is None:
+            return None
+        await run_session(db, "delete", obj)
+        await run_session(db, "commit")
+        self._on_remove(obj)
+        return obj
+
+    # Keyset pagination
+
+    def next_cursor(self, items: Sequence[ModelType], limit: int) -> Optional[str]:
+        """Cursor for the page after ``items``, or None if this was the last page"""
+        if not items or len(items) < limit:
+            return None
+        last = items[-1]
+        return encode_cursor([getattr(last, name) for name in self.cursor_columns])
+
+    def _page(
+        self, db: AnySession, stmt: Select, *, skip: int, limit: int, cursor: Optional[str]
+    ) -> Select:
+        """
+        Order ``stmt`` by cursor_columns and cut one page out of it.
+        With a cursor the page starts right after the row it was made from,
+        so an index on the sort key serves any page at the cost of the first;
+        without one, ``skip`` is applied as a plain OFFSET.
+        """
+        columns = [getattr(self.model, name) for name in self.cursor_columns]
+        stmt = stmt.order_by(*columns).limit(limit)
+        if not cursor:
+            return stmt.offset(skip)
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            raise InvalidCursor(cursor)
+        values = [self._cursor_param(db, value) for value in values]
+        if len(columns) == 1:
+            return stmt.where(columns[0] > values[0])
+        return stmt.where(tuple_(*columns) > tuple_(*values))
+
+    def _cursor_param(self, db: AnySession, value: Any) -> Any:
+        # SQLite keeps DateTime as text and CURRENT_TIMESTAMP has no fraction,
+        # so compare against the same text form instead of the bound "...:00.000000"
+        if isinstance(value, datetime) and db.get_bind().dialect.name == "sqlite":
+            return literal(value.isoformat(sep=" "), String)
+        return value
+
+    def _all(self, db: Session, stmt: Select) -> List[ModelType]:
+        return list(db.execute(self._cacheable(stmt)).unique().scalars().all())
+
+    async def _all_async(self, db: AnySession, stmt: Select) -> List[ModelType]:
+        result = await run_session(db, "execute", self._cacheable(stmt))
+        return list(result.unique().scalars().all())
+
+    async def _first_async(self, db: AnySession, stmt: Select) -> Optional[ModelType]:
+        result = await run_session(db, "execute", self._cacheable(stmt))
+        return result.unique().scalars().first()
+
+    def _cacheable(self, stmt: Select, include: Sequence[str] = ()) -> Select:
+        """
+        Serve ``stmt`` through query_cache, if this CRUD object has one.
+        Tables the statement names are tracked by the cache; those that
+        ``include`` loads with separate queries are added here.
+        """
+        if self.query_cache is None or "query_cache" in stmt.get_execution_options():
+            return stmt
+        return stmt.execution_options(
+            query_cache=self.query_cache, query_cache_tables=self._include_tables(include)
+        )
+
+    def _include_tables(self, include: Sequence[str]) -> Tuple[str, ...]:
+        tables = set()
+        for path in include:
+            model = self.model
+            for name in path.split("."):
+                model = getattr(model, name).property.mapper.class_
+                tables.add(model.__tablename__)
+        return tuple(sorted(tables))
+
+    def _apply_update(
+        self, db_obj: ModelType, obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> None:
+        for field, value in self._column_values(self._update_data(obj_in)).items():
+            setattr(db_obj, field, value)
+
+    def _update_data(self, obj_in: Union[UpdateSchemaType, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return dict(obj_in)
+        return obj_in.dict(exclude_unset=True)
+
+    def _column_values(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Only the given fields that are columns of the table; the row itself is never serialized
+        columns = self.model.__table__.columns
+        return {field: value for field, value in data.items() if field in columns}
+
+    # Hooks for subclasses that keep in-memory state in step with the table
+
+    def _on_create(self, db_obj: ModelType) -> None:
+        pass
+
+    def _on_update(self, db_obj: ModelType) -> None:
+        pass
+
+    def _on_remove(self, obj: ModelType) -> None:
+        pass
@@ -1,13 +1,18 @@
-from typing import List
+from typing import List, Optional
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
+from app.db.session import AnySession
 from app.models.comment import Comment
 from app.schemas.comment import CommentCreate, CommentUpdate
 
 
 class CRUDComment(CRUDBase[Comment, CommentCreate, CommentUpdate]):
+    cursor_columns = ("created_at", "id")
+    owner_column = "user_id"
+
     def create_with_owner(
         self, db: Session, *, obj_in: CommentCreate, user_id: int
     ) -> Comment:
@@ -19,26 +24,28 @@ class CRUDComment(CRUDBase[Comment, CommentCreate, CommentUpdate]):
         return db_obj
 
     def get_multi_by_owner(
-        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[Comment]:
+        stmt = select(Comment).where(Comment.user_id == user_id)
+        return self._all(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    async def get_multi_by_owner_async(
+        self, db: AnySession, *, user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
     ) -> List[Comment]:
-        return (
-            db.query(self.model)
-            .filter(Comment.user_id == user_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-        
+        stmt = select(Comment).where(Comment.user_id == user_id)
+        return await self._all_async(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
     def get_multi_by_lesson(
-        self, db: Session, *, lesson_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, lesson_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[Comment]:
+        stmt = select(Comment).where(Comment.lesson_id == lesson_id)
+        return self._all(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    async def get_multi_by_lesson_async(
+        self, db: AnySession, *, lesson_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
     ) -> List[Comment]:
-        return (
-            db.query(self.model)
-            .filter(Comment.lesson_id == lesson_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        stmt = select(Comment).where(Comment.lesson_id == lesson_id)
+        return await self._all_async(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
 
 
 comment = CRUDComment(Comment)
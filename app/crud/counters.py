@@ -0,0 +1,467 @@
+import random
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Type
+
+from sqlalchemy import bindparam, event, func, inspect, literal, or_, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement, Select
+
+from app.core.config import settings
+from app.crud.counts import cascade_tables
+from app.db.base_class import Base
+from app.db.session import dialect_insert
+from app.models.activity import PlatformTotals, UserActivity
+from app.models.comment import Comment
+from app.models.course import Course
+from app.models.enrollment import Enrollment
+from app.models.lesson import Lesson
+from app.models.rating import Rating
+from app.models.user import User
+
+# Key the platform totals are counted, checked and repaired under; writes
+# spread over the platform_totals rows 1..totals_slots, reads add them up
+TOTALS_ID = 1
+
+
+class Counter(NamedTuple):
+    """A count (and optionally a sum) of ``child`` rows kept on a row of ``parent``"""
+    child: Type[Base]
+    parent: Type[Base]
+    # Child column holding the parent key; None counts the whole table into the totals row
+    foreign_key: Optional[str]
+    count_column: str
+    sum_column: Optional[str] = None
+    # Child column added up into sum_column
+    summed: Optional[str] = None
+    # Parent column the foreign key refers to
+    key: str = "id"
+    # Table whose ids key the parent rows, when those rows are created on first use
+    keys_from: Optional[Type[Base]] = None
+
+    @property
+    def creates_rows(self) -> bool:
+        # Rollup rows (user_activity, platform_totals) appear with the first counted row
+        return self.foreign_key is None or self.keys_from is not None
+
+    @property
+    def name(self) -> str:
+        return f"{self.parent.__tablename__}.{self.count_column}"
+
+
+class Drift(NamedTuple):
+    counter: str
+    parent_id: int
+    stored: Tuple[int, ...]
+    actual: Tuple[int, ...]
+
+
+# counter -> parent key -> [count delta, sum delta]
+Deltas = Dict[Counter, Dict[Hashable, List[int]]]
+
+_UNKNOWN = object()
+
+
+class CounterColumns:
+    """
+    Keeps counter columns and rollup tables in step with the tables they
+    count, in the same transaction as the write: Course.enrollment_count,
+    Lesson.comment_count/rating_count/rating_sum, user_activity and
+    platform_totals.
+
+    Every write becomes a delta per parent row: session inserts, updates
+    and deletes in after_flush; the statement-level CRUD paths (bulk
+    insert, upsert, UPDATE/DELETE ... RETURNING) report the rows they
+    wrote, with the previous values where they overwrite any. Rows the
+    database removes by ON DELETE CASCADE are counted before the parent
+    is deleted. reconcile() and rebuild() repair whatever else changed
+    the tables.
+
+    Every counted write changes the platform totals, so they are split
+    over ``totals_slots`` rows: a session adds to one slot picked at
+    random, and concurrent writers mostly lock different rows. Repairs
+    put the whole count back on TOTALS_ID and zero the other slots.
+    """
+
+    def __init__(self, counters: Sequence[Counter], *, totals_slots: int = 1):
+        self.counters = list(counters)
+        self.totals_slots = totals_slots
+        self._by_child: Dict[Type[Base], List[Counter]] = {}
+        self._by_parent: Dict[Type[Base], List[Counter]] = {}
+        for counter in self.counters:
+            self._by_child.setdefault(counter.child, []).append(counter)
+            self._by_parent.setdefault(counter.parent, []).append(counter)
+        self._cascades: Dict[Type[Base], bool] = {}
+
+    def counted(self, model: Type[Base]) -> bool:
+        return model in self._by_child
+
+    def cascades(self, model: Type[Base]) -> bool:
+        """Whether deleting a ``model`` row makes the database delete counted rows"""
+        if model not in self._cascades:
+            tables = cascade_tables(model.__tablename__)
+            self._cascades[model] = any(c.child.__tablename__ in tables for c in self.counters)
+        return self._cascades[model]
+
+    # Reported by the CRUD paths
+
+    def rows_inserted(self, db: Session, model: Type[Base], rows: Iterable[Any]) -> None:
+        self.apply(db, self._deltas(model, rows, 1))
+
+    def rows_deleted(self, db: Session, model: Type[Base], rows: Iterable[Any]) -> None:
+        self.apply(db, self._deltas(model, rows, -1))
+
+    def rows_replaced(
+        self, db: Session, model: Type[Base], before: Iterable[Any], after: Iterable[Any]
+    ) -> None:
+        """Rows of an update or upsert: ``before`` as they were (if they existed), ``after`` as written"""
+        deltas = self._deltas(model, before, -1)
+        for counter, by_parent in self._deltas(model, after, 1).items():
+            for key, (count, total) in by_parent.items():
+                self._add(deltas, counter, key, count, total)
+        self.apply(db, deltas)
+
+    def affects(self, model: Type[Base], values: Iterable[str]) -> bool:
+        """Whether writing the columns ``values`` to ``model`` rows can change a counter"""
+        names = set(values)
+        return any(
+            counter.foreign_key in names or counter.summed in names
+            for counter in self._by_child.get(model, ())
+        )
+
+    def cascade_deltas(
+        self,
+        db: Session,
+        roots: Dict[Type[Base], Sequence[Any]],
+        exclude: Optional[Dict[str, Set[Any]]] = None,
+    ) -> Deltas:
+        """
+        Deltas for the counted rows ON DELETE CASCADE removes along with the
+        ``roots`` rows (model -> ids). Run it before the delete and apply()
+        the result once the delete went through. Rows in ``exclude``
+        (table -> ids) are deleted by the session itself and left out.
+        """
+        doomed = self._doomed(roots)
+        dying = set(doomed) | {model.__tablename__ for model in roots}
+        deltas: Deltas = {}
+        for counter in self.counters:
+            child = counter.child.__table__
+            if child.name not in doomed or self._dies_with(counter, dying):
+                continue
+            criteria = [doomed[child.name]]
+            if exclude and exclude.get(child.name):
+                criteria.append(child.c.id.notin_(sorted(exclude[child.name])))
+            columns = [func.count()]
+            if counter.summed:
+                columns.append(func.coalesce(func.sum(child.c[counter.summed]), 0))
+            if counter.foreign_key is None:
+                rows = [(TOTALS_ID, *db.execute(select(*columns).where(*criteria)).one())]
+            else:
+                fk = child.c[counter.foreign_key]
+                rows = db.execute(select(fk, *columns).where(*criteria).group_by(fk)).all()
+            for key, count, *total in rows:
+                self._add(deltas, counter, key, -count, -(total[0] if total else 0))
+        return deltas
+
+    def apply(self, db: Session, deltas: Deltas) -> None:
+        connection = db.connection()
+        for counter, by_parent in deltas.items():
+            params = [
+                {"parent_key": self._slot(db) if counter.foreign_key is None else key,
+                 "count_delta": count, "sum_delta": total}
+                for key, (count, total) in sorted(by_parent.items())
+                if count or total
+            ]
+            if not params:
+                continue
+            if not counter.sum_column:
+                for p in params:
+                    del p["sum_delta"]
+            # One executemany per counter, however many parents the write touched
+            connection.execute(self._increment_stmt(connection, counter), params)
+
+    # Repair
+
+    def recount(self, db: Session, counters: Sequence[Counter], keys: Iterable[Hashable]) -> None:
+        """Recompute ``counters`` (all of one parent) for the parent rows ``keys`` from the child tables"""
+        keys = sorted(keys)
+        if not keys:
+            return
+        parent = counters[0].parent.__table__
+        key_column = parent.c[counters[0].key]
+        connection = db.connection()
+        if any(counter.creates_rows for counter in counters):
+            insert = dialect_insert(connection.dialect.name)
+            connection.execute(
+                insert(parent).values({key_column.name: bindparam("parent_key")})
+                .on_conflict_do_nothing(index_elements=[key_column.name]),
+                [{"parent_key": key} for key in keys],
+            )
+        values: Dict[str, Any] = {}
+        for counter in counters:
+            values.update(self._actual(counter, key_column))
+        connection.execute(update(parent).where(key_column.in_(keys)).values(values))
+        if counters[0].foreign_key is None:
+            # The other totals slots are folded into TOTALS_ID
+            connection.execute(
+                update(parent).where(key_column != TOTALS_ID).values({column: 0 for column in values})
+            )
+
+    def reconcile(self, db: Session, *, fix: bool = True) -> List[Drift]:
+        """Parent rows whose counters disagree with the child tables; repaired and committed if ``fix``"""
+        drift: List[Drift] = []
+        for counter in self.counters:
+            columns = [counter.count_column] + ([counter.sum_column] if counter.sum_column else [])
+            parent = self._stored(counter, columns)
+            keys = self._keys(counter).subquery("keys")
+            actual = self._actual(counter, keys.c.key)
+            rows = db.execute(
+                select(
+                    keys.c.key,
+                    *(func.coalesce(parent.c[column], 0) for column in columns),
+                    *(actual[column] for column in columns),
+                )
+                .select_from(keys.outerjoin(parent, parent.c[counter.key] == keys.c.key))
+                .order_by(keys.c.key)
+            ).all()
+            n = len(columns)
+            found = [
+                Drift(counter.name, row[0], tuple(row[1:1 + n]), tuple(row[1 + n:]))
+                for row in rows
+                if tuple(row[1:1 + n]) != tuple(row[1 + n:])
+            ]
+            if fix and found:
+                self.recount(db, [counter], [d.parent_id for d in found])
+            drift += found
+        if fix:
+            db.commit()
+        return drift
+
+    def rebuild(self, db: Session, *, batch_size: int) -> int:
+        """
+        Recount every counter from scratch, ``batch_size`` parent rows per
+        transaction so no lock is held for long. Returns the rows rebuilt.
+        """
+        rebuilt = 0
+        for counters in self._by_parent.values():
+            key = self._keys(counters[0]).subquery("keys").c.key
+            last = None
+            while True:
+                stmt = select(key).order_by(key).limit(batch_size)
+                if last is not None:
+                    stmt = stmt.where(key > last)
+                keys = db.scalars(stmt).all()
+                if keys:
+                    self.recount(db, counters, keys)
+                    db.commit()
+                    rebuilt += len(keys)
+                    last = keys[-1]
+                if len(keys) < batch_size:
+                    break
+        return rebuilt
+
+    # Internals
+
+    def _keys(self, counter: Counter) -> Select:
+        # Every key a parent row may exist for
+        if counter.foreign_key is None:
+            return select(literal(TOTALS_ID).label("key"))
+        if counter.keys_from is not None:
+            return select(counter.keys_from.__table__.c.id.label("key"))
+        return select(counter.parent.__table__.c[counter.key].label("key"))
+
+    def _stored(self, counter: Counter, columns: Sequence[str]) -> Any:
+        # Parent rows as stored; the totals slots add up to a single TOTALS_ID row
+        parent = counter.parent.__table__
+        if counter.foreign_key is not None:
+            return parent
+        return select(
+            literal(TOTALS_ID).label(counter.key),
+            *(func.sum(parent.c[column]).label(column) for column in columns),
+        ).subquery("totals")
+
+    def _slot(self, db: Session) -> int:
+        # One slot per session, so a transaction never waits on two totals rows
+        if "totals_slot" not in db.info:
+            db.info["totals_slot"] = random.randint(1, self.totals_slots)
+        return db.info["totals_slot"]
+
+    def _actual(self, counter: Counter, key: ColumnElement) -> Dict[str, Any]:
+        child = counter.child.__table__
+        criteria = [] if counter.foreign_key is None else [child.c[counter.foreign_key] == key]
+        values = {
+            counter.count_column: select(func.count()).select_from(child).where(*criteria).scalar_subquery()
+        }
+        if counter.sum_column:
+            values[counter.sum_column] = (
+                select(func.coalesce(func.sum(child.c[counter.summed]), 0))
+                .where(*criteria)
+                .scalar_subquery()
+            )
+        return values
+
+    def _increment_stmt(self, connection: Any, counter: Counter) -> Any:
+        parent = counter.parent.__table__
+        columns = [counter.count_column] + ([counter.sum_column] if counter.sum_column else [])
+        deltas = {counter.count_column: "count_delta", counter.sum_column: "sum_delta"}
+        if counter.creates_rows:
+            insert = dialect_insert(connection.dialect.name)
+            stmt = insert(parent).values(
+                {counter.key: bindparam("parent_key"), **{c: bindparam(deltas[c]) for c in columns}}
+            )
+            return stmt.on_conflict_do_update(
+                index_elements=[counter.key],
+                set_={c: parent.c[c] + stmt.excluded[c] for c in columns},
+            )
+        return (
+            update(parent)
+            .where(parent.c[counter.key] == bindparam("parent_key"))
+            .values({c: parent.c[c] + bindparam(deltas[c]) for c in columns})
+        )
+
+    def _doomed(self, roots: Dict[Type[Base], Sequence[Any]]) -> Dict[str, ColumnElement]:
+        # table -> criterion matching its rows that cascade away with the roots
+        doomed: Dict[str, ColumnElement] = {}
+        pending = [(model.__table__, model.__table__.c.id.in_(list(ids))) for model, ids in roots.items()]
+        while pending:
+            parent, criterion = pending.pop()
+            for table in Base.metadata.sorted_tables:
+                for fk in table.foreign_keys:
+                    if fk.column.table is not parent or (fk.ondelete or "").upper() != "CASCADE":
+                        continue
+                    matched = fk.parent.in_(select(fk.column).where(criterion))
+                    doomed[table.name] = or_(doomed[table.name], matched) if table.name in doomed else matched
+                    pending.append((table, matched))
+        return doomed
+
+    def _dies_with(self, counter: Counter, dying: Set[str]) -> bool:
+        # The parent row is deleted as well, so there is nothing to decrement
+        if counter.foreign_key is None:
+            return False
+        column = counter.child.__table__.c[counter.foreign_key]
+        return any(
+            fk.column.table.name in dying and (fk.ondelete or "").upper() == "CASCADE"
+            for fk in column.foreign_keys
+        )
+
+    def _tracked(self, model: Type[Base]) -> Set[str]:
+        # Columns whose values decide which counters a row adds to, and by how much
+        return {
+            name for counter in self._by_child.get(model, ())
+            for name in (counter.foreign_key, counter.summed) if name
+        }
+
+    def _parent_key(self, counter: Counter, row: Any) -> Any:
+        return TOTALS_ID if counter.foreign_key is None else getattr(row, counter.foreign_key)
+
+    def _deltas(self, model: Type[Base], rows: Iterable[Any], sign: int) -> Deltas:
+        deltas: Deltas = {}
+        for row in rows:
+            for counter in self._by_child.get(model, ()):
+                summed = getattr(row, counter.summed) if counter.summed else 0
+                self._add(deltas, counter, self._parent_key(counter, row), sign, sign * (summed or 0))
+        return deltas
+
+    @staticmethod
+    def _add(deltas: Deltas, counter: Counter, key: Any, count: int, total: int) -> None:
+        if key is None:
+            return
+        delta = deltas.setdefault(counter, {}).setdefault(key, [0, 0])
+        delta[0] += count
+        delta[1] += total
+
+    def _before_flush(self, session: Session, flush_context: Any, instances: Any) -> None:
+        # Values overwritten without being loaded first, read while the row still has them
+        previous: Dict[Tuple[Type[Base], Any], Dict[str, Any]] = {}
+        for obj in session.dirty:
+            table = type(obj).__table__
+            unknown = [
+                name for name in self._tracked(type(obj))
+                if _previous(inspect(obj).attrs[name].history) is _UNKNOWN
+            ]
+            if unknown:
+                row = session.connection().execute(
+                    select(*(table.c[name] for name in unknown)).where(table.c.id == obj.id)
+                ).first()
+                if row is not None:
+                    previous[(type(obj), obj.id)] = dict(zip(unknown, row))
+        session.info["counter_previous"] = previous
+
+        roots: Dict[Type[Base], List[Any]] = {}
+        deleted: Dict[str, Set[Any]] = {}
+        for obj in session.deleted:
+            model = type(obj)
+            # Load what _after_flush needs from rows about to be deleted
+            for counter in self._by_child.get(model, ()):
+                for name in (counter.foreign_key, counter.summed):
+                    if name:
+                        getattr(obj, name)
+            if self.cascades(model):
+                roots.setdefault(model, []).append(obj.id)
+            deleted.setdefault(model.__tablename__, set()).add(obj.id)
+        if roots:
+            # Children the session deletes itself are counted in _after_flush
+            self.apply(session, self.cascade_deltas(session, roots, exclude=deleted))
+
+    def _after_flush(self, session: Session, flush_context: Any) -> None:
+        deltas: Deltas = {}
+        previous = session.info.pop("counter_previous", {})
+        for obj in session.new:
+            for counter in self._by_child.get(type(obj), ()):
+                summed = getattr(obj, counter.summed) if counter.summed else 0
+                self._add(deltas, counter, self._parent_key(counter, obj), 1, summed or 0)
+        for obj in session.deleted:
+            # The row is gone by now, so only read what is already loaded (see _before_flush)
+            loaded = inspect(obj).dict
+            for counter in self._by_child.get(type(obj), ()):
+                key = TOTALS_ID if counter.foreign_key is None else loaded.get(counter.foreign_key)
+                summed = loaded.get(counter.summed, 0) if counter.summed else 0
+                self._add(deltas, counter, key, -1, -(summed or 0))
+        for obj in session.dirty:
+            for counter in self._by_child.get(type(obj), ()):
+                names = [name for name in (counter.foreign_key, counter.summed) if name]
+                attrs = inspect(obj).attrs
+                histories = {name: attrs[name].history for name in names}
+                if not any(h.has_changes() for h in histories.values()):
+                    continue
+                loaded = previous.get((type(obj), obj.id), {})
+                before = {name: _previous(h, loaded.get(name, _UNKNOWN)) for name, h in histories.items()}
+                if any(value is _UNKNOWN for value in before.values()):
+                    continue
+                after = {name: getattr(obj, name) for name in names}
+                fk = counter.foreign_key
+                old_key = before[fk] if fk else TOTALS_ID
+                new_key = after[fk] if fk else TOTALS_ID
+                old_sum = before[counter.summed] if counter.summed else 0
+                new_sum = after[counter.summed] if counter.summed else 0
+                self._add(deltas, counter, old_key, -1, -(old_sum or 0))
+                self._add(deltas, counter, new_key, 1, new_sum or 0)
+        if deltas:
+            self.apply(session, deltas)
+
+
+def _previous(history: Any, default: Any = _UNKNOWN) -> Any:
+    # Value before the pending change: replaced, else unchanged, else never loaded
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return default
+
+
+counters = CounterColumns([
+    Counter(Enrollment, Course, "course_id", "enrollment_count"),
+    Counter(Comment, Lesson, "lesson_id", "comment_count"),
+    Counter(Rating, Lesson, "lesson_id", "rating_count", "rating_sum", "stars"),
+    # Per user activity, rows keyed by user id
+    Counter(Enrollment, UserActivity, "user_id", "enrollment_count", key="user_id", keys_from=User),
+    Counter(Comment, UserActivity, "user_id", "comment_count", key="user_id", keys_from=User),
+    Counter(Rating, UserActivity, "user_id", "rating_count", key="user_id", keys_from=User),
+    # Platform totals
+    Counter(User, PlatformTotals, None, "user_count"),
+    Counter(Course, PlatformTotals, None, "course_count"),
+    Counter(Lesson, PlatformTotals, None, "lesson_count"),
+    Counter(Enrollment, PlatformTotals, None, "enrollment_count"),
+    Counter(Comment, PlatformTotals, None, "comment_count"),
+    Counter(Rating, PlatformTotals, None, "rating_count", "rating_sum", "stars"),
+], totals_slots=settings.PLATFORM_TOTALS_SLOTS)
+event.listen(Session, "before_flush", counters._before_flush)
+event.listen(Session, "after_flush", counters._after_flush)
@@ -0,0 +1,158 @@
+from typing import Any, Hashable, NamedTuple, Optional, Sequence, Set, Tuple, Type
+
+from sqlalchemy import and_, event, func, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import TieredCache, local_ttl, shared_store
+from app.core.config import settings
+from app.db.base_class import Base
+from app.db.session import AnySession
+
+
+def cascade_tables(table: str) -> Set[str]:
+    """Tables whose rows the database deletes along with rows of ``table`` (ON DELETE CASCADE)"""
+    found: Set[str] = set()
+    pending = [table]
+    while pending:
+        parent = pending.pop()
+        for child in Base.metadata.sorted_tables:
+            if child.name in found:
+                continue
+            if any(
+                fk.column.table.name == parent and (fk.ondelete or "").upper() == "CASCADE"
+                for fk in child.foreign_keys
+            ):
+                found.add(child.name)
+                pending.append(child.name)
+    return found
+
+
+class RowCount(NamedTuple):
+    total: int
+    approximate: bool
+
+
+class RowCounts:
+    """
+    Cached row counts behind the ``total`` of paginated responses.
+    Entries are tagged with their table and dropped whenever a session
+    flushes a change to it, and again when that session commits.
+    Unfiltered counts of tables whose MAX(id) is at least
+    ``approximate_above`` are estimated from sqlite_stat1 (or MAX(id)
+    itself) instead of running COUNT(*).
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float], approximate_above: Optional[int]):
+        self._cache = TieredCache(maxsize, ttl, name="row_counts", store=shared_store)
+        self.approximate_above = approximate_above
+
+    def count(self, db: Session, model: Type[Base], *criteria: Any) -> RowCount:
+        key = self._key(model, criteria)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        result = None
+        if not criteria and self.approximate_above is not None:
+            max_id = db.scalar(self._max_id_stmt(model)) or 0
+            if max_id >= self.approximate_above:
+                result = RowCount(self._stat_rows(db, model) or max_id, True)
+        if result is None:
+            result = RowCount(db.scalar(self._count_stmt(model, criteria)) or 0, False)
+        self._cache.set(key, result, tags=(model.__tablename__,))
+        return result
+
+    async def count_async(self, db: AnySession, model: Type[Base], *criteria: Any) -> RowCount:
+        cached = self._cache.get(self._key(model, criteria))
+        if cached is not None:
+            return cached
+        # The whole lookup takes one hop: onto the AsyncSession's sync side or the threadpool
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(self.count, model, *criteria)
+        return await run_in_threadpool(self.count, db, model, *criteria)
+
+    def invalidate(self, table: str) -> None:
+        self._cache.invalidate_tag(table)
+
+    def invalidate_deleted(self, table: str) -> None:
+        """Invalidate ``table`` and every table its deletes cascade to"""
+        self.invalidate(table)
+        for name in cascade_tables(table):
+            self.invalidate(name)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def _key(self, model: Type[Base], criteria: Sequence[Any]) -> Tuple[Hashable, ...]:
+        if not criteria:
+            return (model.__tablename__,)
+        compiled = and_(*criteria).compile()
+        return (model.__tablename__, str(compiled), tuple(sorted(compiled.params.items())))
+
+    def _count_stmt(self, model: Type[Base], criteria: Sequence[Any]) -> Select:
+        return select(func.count()).select_from(model).where(*criteria)
+
+    def _max_id_stmt(self, model: Type[Base]) -> Select:
+        return select(func.max(model.id))
+
+    def _stat_rows(self, db: Session, model: Type[Base]) -> Optional[int]:
+        # Row count recorded by the last ANALYZE, if there was one
+        if db.get_bind().dialect.name != "sqlite":
+            return None
+        try:
+            stat = db.execute(
+                text("SELECT stat FROM sqlite_stat1 WHERE tbl = :tbl LIMIT 1"),
+                {"tbl": model.__tablename__},
+            ).scalar()
+        except OperationalError:
+            return None
+        return int(stat.split()[0]) if stat else None
+
+    def _on_execute(self, orm_execute_state: Any) -> None:
+        # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, "table", None)
+            if table is None:
+                return
+            tables = {table.name}
+            if orm_execute_state.is_delete:
+                tables.update(cascade_tables(table.name))
+            self._written(orm_execute_state.session, tables)
+
+    def _after_flush(self, session: Session, flush_context: Any) -> None:
+        tables: Set[str] = set()
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            table = getattr(obj, "__tablename__", None)
+            if table:
+                tables.add(table)
+        for obj in session.deleted:
+            tables.update(cascade_tables(obj.__tablename__))
+        self._written(session, tables)
+
+    def _written(self, session: Session, tables: Set[str]) -> None:
+        # Now, and again at commit: a count taken in between saw the old rows
+        for table in tables:
+            self.invalidate(table)
+        session.info.setdefault("counted_tables", set()).update(tables)
+
+    def _after_commit(self, session: Session) -> None:
+        for table in session.info.pop("counted_tables", set()):
+            self.invalidate(table)
+
+    def _after_transaction_end(self, session: Session, transaction: Any) -> None:
+        if transaction.parent is None:
+            session.info.pop("counted_tables", None)
+
+
+counts = RowCounts(
+    maxsize=settings.ROW_COUNT_CACHE_MAX_SIZE,
+    ttl=local_ttl(settings.ROW_COUNT_CACHE_TTL_SECONDS),
+    approximate_above=settings.ROW_COUNT_APPROXIMATE_ABOVE,
+)
+event.listen(Session, "after_flush", counts._after_flush)
+event.listen(Session, "do_orm_execute", counts._on_execute)
+event.listen(Session, "after_commit", counts._after_commit)
+event.listen(Session, "after_transaction_end", counts._after_transaction_end)
@@ -1,13 +1,21 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 
+from app.crud.access import access
 from app.crud.base import CRUDBase
+from app.crud.query_cache import query_cache
+from app.db.session import AnySession
 from app.models.course import Course
 from app.schemas.course import CourseCreate, CourseUpdate
 
 
 class CRUDCourse(CRUDBase[Course, CourseCreate, CourseUpdate]):
+    owner_column = "author_id"
+    includable = ("lessons", "lessons.comments", "lessons.ratings")
+    query_cache = query_cache
+
     def create_with_author(
         self, db: Session, *, obj_in: CourseCreate, author_id: int
     ) -> Course:
@@ -16,19 +24,34 @@ class CRUDCourse(CRUDBase[Course, CourseCreate, CourseUpdate]):
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        self._on_create(db_obj)
         return db_obj
 
     def get_multi_by_author(
-        self, db: Session, *, author_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, author_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
     ) -> List[Course]:
-        return (
-            db.query(self.model)
-            .filter(Course.author_id == author_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-        
+        stmt = select(Course).where(Course.author_id == author_id)
+        return self._all(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    async def get_multi_by_author_async(
+        self, db: AnySession, *, author_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[Course]:
+        stmt = select(Course).where(Course.author_id == author_id)
+        return await self._all_async(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    async def get_multi_by_title_async(
+        self,
+        db: AnySession,
+        *,
+        title: str,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include: Sequence[str] = (),
+    ) -> List[Course]:
+        stmt = select(Course).where(Course.title.ilike(f"%{title}%")).options(*self.load_options(include))
+        return await self._all_async(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
     def get_by_title(
         self, db: Session, *, title: str
     ) -> Optional[Course]:
@@ -37,12 +60,31 @@ class CRUDCourse(CRUDBase[Course, CourseCreate, CourseUpdate]):
     def get_with_lessons(
         self, db: Session, *, id: int
     ) -> Optional[Course]:
-        return (
-            db.query(self.model)
-            .filter(Course.id == id)
-            .options(joinedload(Course.lessons))
-            .first()
+        return self.get(db, id, include=("lessons",))
+
+    def get_popular(self, db: Session, *, limit: int = 5) -> List[Course]:
+        """Courses with the most enrollments, read off ix_course_enrollment_count_id"""
+        stmt = (
+            select(Course)
+            .where(Course.enrollment_count > 0)
+            .order_by(Course.enrollment_count.desc(), Course.id.desc())
+            .limit(limit)
         )
+        return self._all(db, stmt)
+
+    async def get_with_lessons_async(
+        self, db: AnySession, *, id: int
+    ) -> Optional[Course]:
+        return await self.get_async(db, id, include=("lessons",))
+
+    def _on_create(self, db_obj: Course) -> None:
+        access.add_course(db_obj.id, db_obj.author_id)
+
+    def _on_update(self, db_obj: Course) -> None:
+        access.add_course(db_obj.id, db_obj.author_id)
+
+    def _on_remove(self, obj: Course) -> None:
+        access.remove_course(obj.id)
 
 
 course = CRUDCourse(Course)
@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.cache import SharedStore, TieredCache, shared_store
+from app.core.config import settings
+from app.crud.activity import activity
+from app.models.course import Course
+from app.models.user import User
+
+
+class DashboardSnapshot(NamedTuple):
+    # time.time() when the snapshot was taken
+    taken_at: float
+    # crud.activity.totals() at that moment
+    totals: Dict[str, Any]
+    recent_courses: List[Dict[str, Any]]
+    recent_users: List[Dict[str, Any]]
+
+
+class DashboardSnapshots:
+    """
+    Admin dashboard figures, computed in one pass and served from memory.
+
+    A background task calls refresh() every ``refresh_seconds``; the admin
+    dashboard and /stats read current() and touch the database only when
+    there is no snapshot yet or the task has missed a few refreshes. With
+    ``refresh_seconds`` 0 there is no background task and every read
+    takes a fresh snapshot.
+
+    With a shared ``store`` the workers share one snapshot: a worker whose
+    refresh finds one taken by another worker in the last half period
+    keeps it instead of querying.
+    """
+
+    def __init__(self, refresh_seconds: float, recent_limit: int, store: Optional[SharedStore] = None):
+        self.refresh_seconds = refresh_seconds
+        self.recent_limit = recent_limit
+        self._snapshots = TieredCache(1, None, name="dashboard", store=store)
+        self._lock = threading.Lock()
+
+    @property
+    def max_age(self) -> float:
+        # A couple of failed or late refreshes are tolerated before reads go to the database
+        return 3 * self.refresh_seconds
+
+    def current(self) -> Optional[DashboardSnapshot]:
+        snapshot = self._snapshots.get("snapshot")
+        if snapshot is None or time.time() - snapshot.taken_at > self.max_age:
+            return None
+        return snapshot
+
+    def get(self, db: Session) -> DashboardSnapshot:
+        return self.current() or self.take(db)
+
+    def take(self, db: Session) -> DashboardSnapshot:
+        """Compute a snapshot from ``db`` and keep it"""
+        taken_at = time.time()
+        # Counters come off the platform_totals slots; the lists walk the primary keys
+        totals = activity.totals(db)
+        recent_courses = db.execute(
+            select(Course.id, Course.title, Course.author_id)
+            .order_by(Course.id.desc())
+            .limit(self.recent_limit)
+        ).mappings().all()
+        recent_users = db.execute(
+            select(User.id, User.full_name, User.email)
+            .order_by(User.id.desc())
+            .limit(self.recent_limit)
+        ).mappings().all()
+        snapshot = DashboardSnapshot(
+            taken_at, totals, [dict(r) for r in recent_courses], [dict(r) for r in recent_users]
+        )
+        with self._lock:
+            # A slower concurrent take must not replace a newer snapshot
+            kept = self._snapshots.get("snapshot")
+            if kept is None or kept.taken_at <= taken_at:
+                self._snapshots.set("snapshot", snapshot)
+        return snapshot
+
+    def refresh(self, session_factory: Callable[[], Session]) -> DashboardSnapshot:
+        """Take a snapshot in a session of its own; meant for the background task"""
+        snapshot = self._snapshots.get("snapshot")
+        if snapshot is not None and time.time() - snapshot.taken_at < self.refresh_seconds / 2:
+            return snapshot
+        db = session_factory()
+        try:
+            return self.take(db)
+        finally:
+            db.close()
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+
+
+dashboard = DashboardSnapshots(
+    refresh_seconds=settings.DASHBOARD_REFRESH_SECONDS,
+    recent_limit=settings.DASHBOARD_RECENT_LIMIT,
+    store=shared_store,
+)
@@ -1,32 +1,30 @@
 from typing import List, Optional
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.crud.access import access
 from app.crud.base import CRUDBase
+from app.db.session import AnySession
 from app.models.enrollment import Enrollment
 from app.schemas.enrollment import EnrollmentCreate, EnrollmentUpdate
 
 
 class CRUDEnrollment(CRUDBase[Enrollment, EnrollmentCreate, EnrollmentUpdate]):
+    cursor_columns = ("enrolled_at", "id")
+    owner_column = "user_id"
+
     def create_with_owner(
         self, db: Session, *, obj_in: EnrollmentCreate, user_id: int
     ) -> Enrollment:
-        # Check if user is already enrolled in this course
-        existing_enrollment = (
-            db.query(self.model)
-            .filter(Enrollment.user_id == user_id, Enrollment.course_id == obj_in.course_id)
-            .first()
+        # Один запрос: вставка или существующая запись, без гонки между проверкой и вставкой
+        (db_obj,) = self.upsert_multi(
+            db,
+            objs_in=[{**obj_in.dict(), "user_id": user_id}],
+            index_elements=("user_id", "course_id"),
+            # No-op update so RETURNING yields the existing row on conflict
+            update_fields=("course_id",),
         )
-        
-        if existing_enrollment:
-            return existing_enrollment
-        
-        # Create new enrollment
-        obj_in_data = obj_in.dict()
-        db_obj = Enrollment(**obj_in_data, user_id=user_id)
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
         return db_obj
 
     def get_by_user_and_course(
@@ -39,26 +37,34 @@ class CRUDEnrollment(CRUDBase[Enrollment, EnrollmentCreate, EnrollmentUpdate]):
         )
     
     def get_multi_by_user(
-        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
     ) -> List[Enrollment]:
-        return (
-            db.query(self.model)
-            .filter(Enrollment.user_id == user_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-    
+        stmt = select(Enrollment).where(Enrollment.user_id == user_id)
+        return self._all(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    async def get_multi_by_user_async(
+        self, db: AnySession, *, user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[Enrollment]:
+        stmt = select(Enrollment).where(Enrollment.user_id == user_id)
+        return await self._all_async(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
     def get_multi_by_course(
-        self, db: Session, *, course_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, course_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
     ) -> List[Enrollment]:
-        return (
-            db.query(self.model)
-            .filter(Enrollment.course_id == course_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        stmt = select(Enrollment).where(Enrollment.course_id == course_id)
+        return self._all(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    async def get_multi_by_course_async(
+        self, db: AnySession, *, course_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[Enrollment]:
+        stmt = select(Enrollment).where(Enrollment.course_id == course_id)
+        return await self._all_async(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    def _on_create(self, db_obj: Enrollment) -> None:
+        access.add_enrollment(db_obj.user_id, db_obj.course_id)
+
+    def _on_remove(self, obj: Enrollment) -> None:
+        access.remove_enrollment(obj.user_id, obj.course_id)
 
 
 enrollment = CRUDEnrollment(Enrollment)
@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy.sql import Select
+
+from app.db.base_class import Base
+from app.db.session import AnySession, run_session
+
+ModelT = TypeVar("ModelT", bound=Base)
+
+_MISSING = object()
+
+
+class DataLoader:
+    """
+    Batches and memoizes by-id lookups for one session (so one request).
+
+        users = loader.load_many(User, [e.user_id for e in enrollments])
+        course = await loader.load_async(Course, lesson.course_id)
+
+    load_many() fetches every id it has not seen in a single
+    ``WHERE id IN (...)`` query. The async loads coalesce: ids requested
+    within the same event loop tick are fetched together. Results, misses
+    included, are kept until the session's transaction ends.
+    """
+
+    def __init__(self, db: AnySession):
+        self.db = db
+        self._memo: Dict[Tuple[Type[Base], Hashable], Any] = {}
+        self._pending: Dict[Type[Base], Dict[Hashable, "asyncio.Future[Any]"]] = {}
+        self._scheduled = False
+
+    def load(self, model: Type[ModelT], id: Hashable) -> Optional[ModelT]:
+        return self.load_many(model, [id])[0]
+
+    def load_many(self, model: Type[ModelT], ids: Sequence[Hashable]) -> List[Optional[ModelT]]:
+        """Rows for ``ids`` in the same order, None where there is no such row"""
+        missing = self._missing(model, ids)
+        if missing:
+            self._store(model, missing, self.db.scalars(self._stmt(model, missing)).all())
+        return [self._memo[(model, id)] for id in ids]
+
+    async def load_async(self, model: Type[ModelT], id: Hashable) -> Optional[ModelT]:
+        cached = self._memo.get((model, id), _MISSING)
+        if cached is not _MISSING:
+            return cached
+        pending = self._pending.setdefault(model, {})
+        future = pending.get(id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = pending[id] = loop.create_future()
+            if not self._scheduled:
+                # Run after everything already scheduled for this tick has asked for its ids
+                self._scheduled = True
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return await future
+
+    async def load_many_async(
+        self, model: Type[ModelT], ids: Sequence[Hashable]
+    ) -> List[Optional[ModelT]]:
+        return list(await asyncio.gather(*(self.load_async(model, id) for id in ids)))
+
+    def prime(self, obj: Base) -> None:
+        """Remember a row the caller already has"""
+        self._memo[(type(obj), obj.id)] = obj
+
+    def clear(self) -> None:
+        self._memo.clear()
+
+    async def _dispatch(self) -> None:
+        batches, self._pending, self._scheduled = self._pending, {}, False
+        for model, futures in batches.items():
+            ids = list(futures)
+            try:
+                result = await run_session(self.db, "execute", self._stmt(model, ids))
+                self._store(model, ids, result.scalars().all())
+            except Exception as exc:
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for id, future in futures.items():
+                if not future.done():
+                    future.set_result(self._memo[(model, id)])
+
+    def _missing(self, model: Type[Base], ids: Sequence[Hashable]) -> List[Hashable]:
+        seen = set()
+        missing = []
+        for id in ids:
+            if (model, id) not in self._memo and id not in seen:
+                seen.add(id)
+                missing.append(id)
+        return missing
+
+    def _store(self, model: Type[Base], ids: Sequence[Hashable], rows: Sequence[Base]) -> None:
+        for id in ids:
+            self._memo[(model, id)] = None
+        for row in rows:
+            self._memo[(model, row.id)] = row
+
+    def _stmt(self, model: Type[Base], ids: Sequence[Hashable]) -> Select:
+        # Same loading policy as CRUDBase.get: relationships are never lazy loaded
+        return select(model).where(model.id.in_(ids)).options(raiseload("*"))
+
+
+def get_loader(db: AnySession) -> DataLoader:
+    """The DataLoader of ``db``, created on first use"""
+    loader = db.info.get("loader")
+    if loader is None:
+        loader = db.info["loader"] = DataLoader(db)
+    return loader
+
+
+def _forget(session: Session, transaction: Any) -> None:
+    # Committed or rolled back writes may have changed any memoized row
+    if transaction.parent is None and "loader" in session.info:
+        session.info["loader"].clear()
+
+
+event.listen(Session, "after_transaction_end", _forget)
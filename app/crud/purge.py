@@ -0,0 +1,144 @@
+import secrets
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from app.core.cache import SharedStore, TieredCache, shared_store
+from app.core.config import settings
+from app.crud.access import access
+from app.crud.counters import counters
+from app.db.base_class import Base
+from app.models.comment import Comment
+from app.models.course import Course
+from app.models.enrollment import Enrollment
+from app.models.lesson import Lesson
+from app.models.rating import Rating
+
+
+class PurgeJob:
+    """Progress of one course purge, as reported by the admin API"""
+
+    def __init__(self, id: int, course_id: int):
+        self.id = id
+        self.course_id = course_id
+        self.status = "pending"
+        # table -> {"deleted": n, "total": n}
+        self.tables: Dict[str, Dict[str, int]] = {}
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def total(self) -> int:
+        return sum(t["total"] for t in self.tables.values())
+
+    @property
+    def deleted(self) -> int:
+        return sum(t["deleted"] for t in self.tables.values())
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        return self.deleted / self.total if self.total else 0.0
+
+
+class CoursePurge:
+    """
+    Deletes a course subtree in bounded batches instead of one statement.
+    Comments, ratings, lessons and enrollments go ``batch_size`` rows per
+    DELETE, each batch committed on its own so the write lock is held
+    briefly and nothing is loaded into the session; the course row is
+    deleted last. Jobs run in the background and are polled by id.
+
+    Progress is saved to the jobs cache after every batch. With a shared
+    cache tier any worker can report it; without one only the worker
+    that started the job knows it (``shared`` is False).
+    """
+
+    def __init__(
+        self, batch_size: int, job_ttl: float, max_jobs: int = 1000, store: Optional[SharedStore] = None
+    ):
+        self.batch_size = batch_size
+        self.job_ttl = job_ttl
+        # Running jobs never expire; finished ones are kept for ``job_ttl``
+        self._jobs = TieredCache(max_jobs, None, name="purge_jobs", store=store)
+
+    @property
+    def shared(self) -> bool:
+        return self._jobs.store is not None
+
+    def start(self, course_id: int) -> PurgeJob:
+        # Random ids, so workers never hand out the same one (53 bits stay exact in JSON)
+        job = PurgeJob(secrets.randbits(53), course_id)
+        self._save(job)
+        return job
+
+    def get(self, job_id: int) -> Optional[PurgeJob]:
+        return self._jobs.get(job_id)
+
+    def run(self, job: PurgeJob, session_factory: Callable[[], Session]) -> None:
+        """Work through ``job``; meant for a background task or thread"""
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        db = session_factory()
+        try:
+            steps = self._steps(job.course_id)
+            for model, criteria in steps:
+                total = db.scalar(select(func.count()).select_from(model).where(criteria)) or 0
+                job.tables[model.__tablename__] = {"deleted": 0, "total": total}
+            db.rollback()
+            for model, criteria in steps:
+                progress = job.tables[model.__tablename__]
+                while True:
+                    deleted = self._delete_batch(db, model, criteria)
+                    db.commit()
+                    progress["deleted"] += deleted
+                    self._save(job)
+                    if deleted < self.batch_size:
+                        break
+            access.remove_course(job.course_id)
+            job.status = "done"
+        except Exception as exc:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(exc)
+        finally:
+            db.close()
+            job.finished_at = time.time()
+            self._save(job, ttl=self.job_ttl)
+
+    def _steps(self, course_id: int) -> List[Tuple[Type[Base], ColumnElement]]:
+        # Children before parents, so no batch has anything left to cascade to
+        lesson_ids = select(Lesson.id).where(Lesson.course_id == course_id).scalar_subquery()
+        return [
+            (Comment, Comment.lesson_id.in_(lesson_ids)),
+            (Rating, Rating.lesson_id.in_(lesson_ids)),
+            (Lesson, Lesson.course_id == course_id),
+            (Enrollment, Enrollment.course_id == course_id),
+            (Course, Course.id == course_id),
+        ]
+
+    def _delete_batch(self, db: Session, model: Type[Base], criteria: ColumnElement) -> int:
+        batch = select(model.id).where(criteria).limit(self.batch_size).scalar_subquery()
+        rows = db.execute(
+            delete(model)
+            .where(model.id.in_(batch))
+            .returning(*model.__table__.columns)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if counters.counted(model):
+            counters.rows_deleted(db, model, rows)
+        return len(rows)
+
+    def _save(self, job: PurgeJob, ttl: Optional[float] = None) -> None:
+        self._jobs.set(job.id, job, ttl=ttl)
+
+
+purge = CoursePurge(
+    batch_size=settings.PURGE_BATCH_SIZE, job_ttl=settings.PURGE_JOB_TTL_SECONDS, store=shared_store
+)
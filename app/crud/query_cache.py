@@ -0,0 +1,216 @@
+import re
+import threading
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import Table, TextClause, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, loading
+from sqlalchemy.sql import visitors
+
+from app.core.cache import SharedStore, TieredCache, caches, local_ttl, shared_store
+from app.core.config import settings
+from app.crud.counts import cascade_tables
+from app.db.session import REPLICA_INFO
+
+# First table named by a textual INSERT/UPDATE/DELETE
+_TEXT_DML = re.compile(r"^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM)\s+\"?(\w+)", re.I)
+
+
+class QueryCache:
+    """
+    Read-through cache of the SELECTs the CRUD objects mark as cacheable
+    (CRUDBase.query_cache), ORM rows included.
+
+    The key is the statement's shape (SQLAlchemy's cache key, so loader
+    options count) with its parameters and the current version of every
+    table the result was read from. Each table has a version counter that
+    every INSERT/UPDATE/DELETE bumps, once when it runs and again when its
+    transaction commits, so a write makes all entries over that table
+    unreachable; they age out of the LRU. Empty results (a 404 by id) are
+    kept for ``negative_ttl`` only. A session never reads or fills the
+    cache for tables it has uncommitted writes to, and replica and
+    analytics sessions bypass it: what they read may predate versions
+    the primary has already moved past.
+
+    Hits are merged into the session without a query, as copies of rows
+    detached from the session that loaded them. Results stay in the
+    worker that read them; with a shared ``store`` the table writes are
+    broadcast, so every worker's versions move on.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float],
+        negative_ttl: Optional[float],
+        enabled: bool = True,
+        store: Optional[SharedStore] = None,
+    ):
+        self.enabled = enabled
+        self.negative_ttl = negative_ttl
+        self._results = TieredCache(
+            maxsize, ttl, store=store, share_values=False, channel="query_results"
+        )
+        self._results.listeners.append(self._remote_write)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.negative_hits = 0
+        self.bypasses = 0
+        self.version_bumps = 0
+        caches["query_results"] = self
+
+    def tables_written(self, tables: Iterable[str]) -> None:
+        """Invalidate every entry read from ``tables``, in every worker"""
+        tables = list(tables)
+        self._bump(tables)
+        for table in tables:
+            self._results.invalidate_tag(table)
+
+    def _bump(self, tables: Iterable[str]) -> None:
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                self.version_bumps += 1
+
+    def _remote_write(self, kind: str, ident: str) -> None:
+        # Another worker wrote to the table ``ident`` (the entries themselves are already dropped)
+        if kind == "tag":
+            self._bump([ident])
+        elif kind == "clear":
+            with self._lock:
+                self._versions = {table: version + 1 for table, version in self._versions.items()}
+
+    def clear(self) -> None:
+        self._results.clear()
+        with self._lock:
+            self._versions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._results.stats(),
+            "negative_hits": self.negative_hits,
+            "bypasses": self.bypasses,
+            "version_bumps": self.version_bumps,
+        }
+
+    # Reads
+
+    def _on_execute(self, orm_execute_state: Any) -> Any:
+        options = orm_execute_state.execution_options
+        if (
+            options.get("query_cache") is not self
+            or not self.enabled
+            or not orm_execute_state.is_select
+            or orm_execute_state.is_relationship_load
+            or orm_execute_state.is_column_load
+        ):
+            return None
+        statement = orm_execute_state.statement
+        tables = _statement_tables(statement) | set(options.get("query_cache_tables", ()))
+        session = orm_execute_state.session
+        cache_key = statement._generate_cache_key()
+        if (
+            cache_key is None
+            or tables & session.info.get("written_tables", set())
+            or REPLICA_INFO in session.info
+        ):
+            # Uncacheable construct, the session would see its own uncommitted writes,
+            # or a lagging copy would be cached under the primary's current versions
+            self.bypasses += 1
+            return None
+        self._results.sync()
+        key = self._key(cache_key, orm_execute_state.parameters, tables)
+        frozen = self._results.get(key)
+        if frozen is not None:
+            if not frozen.data:
+                self.negative_hits += 1
+            return loading.merge_frozen_result(session, statement, frozen, load=False)()
+        frozen = orm_execute_state.invoke_statement().freeze()
+        self._results.set(
+            key, _detached(statement, frozen), ttl=None if frozen.data else self.negative_ttl, tags=tables
+        )
+        return frozen()
+
+    def _key(self, cache_key: Any, parameters: Any, tables: Set[str]) -> Tuple[Hashable, ...]:
+        with self._lock:
+            versions = tuple((table, self._versions.get(table, 0)) for table in sorted(tables))
+        bound = tuple(_hashable(p.effective_value) for p in cache_key.bindparams)
+        return cache_key.key, bound, _hashable(parameters or {}), versions
+
+    # Writes, seen on every engine so no write path can skip them
+
+    def _after_execute(
+        self, conn: Any, clauseelement: Any, multiparams: Any, params: Any, execution_options: Any, result: Any
+    ) -> None:
+        tables = _written_tables(clauseelement)
+        if not tables:
+            return
+        self.tables_written(tables)
+        pending = conn.info.get("session_written_tables")
+        if pending is not None:
+            pending.update(tables)
+
+    def _after_begin(self, session: Session, transaction: Any, connection: Any) -> None:
+        # Route the tables this session's statements write to the session
+        connection.info["session_written_tables"] = session.info.setdefault("written_tables", set())
+
+    def _after_commit(self, session: Session) -> None:
+        # Readers that started before the commit may have cached what they saw then
+        written = session.info.pop("written_tables", set())
+        self.tables_written(written)
+
+    def _after_transaction_end(self, session: Session, transaction: Any) -> None:
+        # Committed (and bumped above), rolled back or closed: nothing is pending any more
+        if transaction.parent is None:
+            session.info.pop("written_tables", None)
+
+
+def _statement_tables(statement: Any) -> Set[str]:
+    return {element.name for element in visitors.iterate(statement) if isinstance(element, Table)}
+
+
+def _written_tables(clauseelement: Any) -> FrozenSet[str]:
+    if isinstance(clauseelement, TextClause):
+        match = _TEXT_DML.match(clauseelement.text)
+        table = match.group(1) if match else None
+        is_delete = bool(match) and clauseelement.text.lstrip()[:6].upper() == "DELETE"
+    elif getattr(clauseelement, "is_dml", False):
+        table = clauseelement.table.name
+        is_delete = clauseelement.is_delete
+    else:
+        return frozenset()
+    if table is None:
+        return frozenset()
+    # Rows the database deletes by ON DELETE CASCADE change those tables too
+    return frozenset({table, *(cascade_tables(table) if is_delete else ())})
+
+
+def _detached(statement: Any, frozen: Any) -> Any:
+    # Copies of the rows owned by no session: the loading session may expire or change its own
+    scratch = Session()
+    try:
+        return loading.merge_frozen_result(scratch, statement, frozen, load=False)
+    finally:
+        scratch.close()
+
+
+def _hashable(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+query_cache = QueryCache(
+    maxsize=settings.QUERY_CACHE_MAX_SIZE,
+    ttl=local_ttl(settings.QUERY_CACHE_TTL_SECONDS),
+    negative_ttl=local_ttl(settings.QUERY_CACHE_NEGATIVE_TTL_SECONDS),
+    enabled=settings.QUERY_CACHE_ENABLED,
+    store=shared_store,
+)
+event.listen(Session, "do_orm_execute", query_cache._on_execute)
+event.listen(Session, "after_begin", query_cache._after_begin)
+event.listen(Session, "after_commit", query_cache._after_commit)
+event.listen(Session, "after_transaction_end", query_cache._after_transaction_end)
+event.listen(Engine, "after_execute", query_cache._after_execute)
@@ -1,39 +1,32 @@
-from typing import List, Optional
+from typing import Any, List, Optional
 
-from sqlalchemy import func
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
 
 from app.crud.base import CRUDBase
+from app.crud.query_cache import query_cache
+from app.db.session import AnySession, run_session
+from app.models.lesson import Lesson
 from app.models.rating import Rating
 from app.schemas.rating import RatingCreate, RatingUpdate
 
 
 class CRUDRating(CRUDBase[Rating, RatingCreate, RatingUpdate]):
+    owner_column = "user_id"
+    query_cache = query_cache
+
     def create_with_owner(
         self, db: Session, *, obj_in: RatingCreate, user_id: int
     ) -> Rating:
-        # Check if user already rated this lesson
-        existing_rating = (
-            db.query(self.model)
-            .filter(Rating.user_id == user_id, Rating.lesson_id == obj_in.lesson_id)
-            .first()
+        # Create the rating or overwrite the user's previous one in a single statement
+        (db_obj,) = self.upsert_multi(
+            db,
+            objs_in=[{**obj_in.dict(), "user_id": user_id}],
+            index_elements=("user_id", "lesson_id"),
+            update_fields=("stars",),
         )
-        
-        if existing_rating:
-            # Update existing rating
-            existing_rating.stars = obj_in.stars
-            db.add(existing_rating)
-            db.commit()
-            db.refresh(existing_rating)
-            return existing_rating
-        else:
-            # Create new rating
-            obj_in_data = obj_in.dict()
-            db_obj = Rating(**obj_in_data, user_id=user_id)
-            db.add(db_obj)
-            db.commit()
-            db.refresh(db_obj)
-            return db_obj
+        return db_obj
 
     def get_by_user_and_lesson(
         self, db: Session, *, user_id: int, lesson_id: int
@@ -44,11 +37,39 @@ class CRUDRating(CRUDBase[Rating, RatingCreate, RatingUpdate]):
             .first()
         )
     
+    def get_multi_by_lesson(
+        self, db: Session, *, lesson_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[Rating]:
+        stmt = select(Rating).where(Rating.lesson_id == lesson_id)
+        return self._all(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    async def get_multi_by_lesson_async(
+        self, db: AnySession, *, lesson_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[Rating]:
+        stmt = select(Rating).where(Rating.lesson_id == lesson_id)
+        return await self._all_async(db, self._page(db, stmt, skip=skip, limit=limit, cursor=cursor))
+
+    # Averages come from the lesson's counter columns, one primary key lookup
+
     def get_average_for_lesson(
         self, db: Session, *, lesson_id: int
     ) -> float:
-        result = db.query(func.avg(Rating.stars)).filter(Rating.lesson_id == lesson_id).scalar()
-        return float(result) if result else 0.0
+        row = db.execute(self._cacheable(self._average_stmt(lesson_id))).first()
+        return self._average(row)
+
+    async def get_average_for_lesson_async(
+        self, db: AnySession, *, lesson_id: int
+    ) -> float:
+        result = await run_session(db, "execute", self._cacheable(self._average_stmt(lesson_id)))
+        return self._average(result.first())
+
+    @staticmethod
+    def _average_stmt(lesson_id: int) -> Select:
+        return select(Lesson.rating_sum, Lesson.rating_count).where(Lesson.id == lesson_id)
+
+    @staticmethod
+    def _average(row: Any) -> float:
+        return row.rating_sum / row.rating_count if row is not None and row.rating_count else 0.0
 
 
 rating = CRUDRating(Rating)
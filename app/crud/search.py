@@ -0,0 +1,170 @@
+import html
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from app.core.config import settings
+from app.db.session import AnySession, run_session
+from app.models.search import SEARCH_TABLE, SEARCH_TABLE_DDL, SEARCH_TRIGGERS
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Snippet match markers; the text around them is escaped before they become <mark>
+_OPEN, _CLOSE = "\x02", "\x03"
+
+# table -> (rowid offset, body column, course id column), as in app.models.search
+_SOURCES = {
+    "course": (0, "description", "id"),
+    "lesson": (1, "content", "course_id"),
+}
+
+
+class FullTextSearch:
+    """
+    Ranked search over courses and lessons through the FTS5 index of
+    app.models.search.
+
+    Hits come in BM25 order (title matches weigh most) with the rowid as
+    tie-breaker, and a page continues after the (rank, rowid) of the last
+    hit of the previous one. Ranks move a little as the indexed rows
+    change, so a page taken after writes may repeat or skip a hit near
+    its edge. SQLite only.
+    """
+
+    kinds = ("course", "lesson")
+
+    def __init__(self, snippet_tokens: int, max_limit: int):
+        self.snippet_tokens = snippet_tokens
+        self.max_limit = max_limit
+
+    def available(self, db: AnySession) -> bool:
+        return db.get_bind().dialect.name == "sqlite"
+
+    def search(
+        self, db: Session, *, q: str, kind: Optional[str] = None, limit: int = 20, cursor: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        stmt = self._statement(q, kind=kind, limit=limit, cursor=cursor)
+        if stmt is None:
+            return []
+        return [self._hit(row) for row in db.execute(stmt).mappings()]
+
+    async def search_async(
+        self, db: AnySession, *, q: str, kind: Optional[str] = None, limit: int = 20, cursor: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        stmt = self._statement(q, kind=kind, limit=limit, cursor=cursor)
+        if stmt is None:
+            return []
+        result = await run_session(db, "execute", stmt)
+        return [self._hit(row) for row in result.mappings()]
+
+    def next_cursor(self, hits: Sequence[Dict[str, Any]], limit: int) -> Optional[str]:
+        """Cursor for the page after ``hits``, or None if this was the last page"""
+        if not hits or len(hits) < self._limit(limit):
+            return None
+        last = hits[-1]
+        return encode_cursor([last["rank"], last["rowid"]])
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Create the index and its triggers if missing and refill it from the
+        course and lesson tables, in one transaction. Returns the rows indexed.
+        """
+        exists = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": SEARCH_TABLE},
+        ).first()
+        # Triggers go missing when a batch migration rebuilds course or lesson
+        for statement in ([] if exists else SEARCH_TABLE_DDL) + SEARCH_TRIGGERS:
+            db.execute(text(statement))
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        indexed = 0
+        for table, (offset, body, course_id) in _SOURCES.items():
+            indexed += db.execute(
+                text(
+                    f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, kind, course_id) "
+                    f"SELECT 2 * id + {offset}, coalesce(title, ''), coalesce({body}, ''), "
+                    f"'{table}', {course_id} FROM {table}"
+                )
+            ).rowcount
+        # Merge the freshly written segments into one
+        db.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+        db.commit()
+        return indexed
+
+    def _statement(
+        self, q: str, *, kind: Optional[str], limit: int, cursor: Optional[str]
+    ) -> Optional[TextClause]:
+        match = match_query(q)
+        if match is None:
+            return None
+        params: Dict[str, Any] = {
+            "match": match,
+            "limit": self._limit(limit),
+            "tokens": self.snippet_tokens,
+        }
+        where = [f"{SEARCH_TABLE} MATCH :match"]
+        if kind is not None:
+            where.append("kind = :kind")
+            params["kind"] = kind
+        if cursor:
+            params["rank"], params["rowid"] = _decode(cursor)
+            where.append("(rank > :rank OR (rank = :rank AND rowid > :rowid))")
+        # rank is the bm25() configured on the table, so FTS5 computes it once per row
+        return text(
+            f"SELECT rowid, kind, course_id, title, rank, "
+            f"snippet({SEARCH_TABLE}, 1, char(2), char(3), '…', :tokens) AS snippet "
+            f"FROM {SEARCH_TABLE} WHERE {' AND '.join(where)} "
+            f"ORDER BY rank, rowid LIMIT :limit"
+        ).bindparams(**params)
+
+    def _limit(self, limit: int) -> int:
+        # SQLite reads a negative LIMIT as no limit at all
+        return max(1, min(limit, self.max_limit))
+
+    def _hit(self, row: Any) -> Dict[str, Any]:
+        snippet = row["snippet"]
+        if snippet:
+            snippet = html.escape(snippet).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+        return {
+            "kind": row["kind"],
+            "id": row["rowid"] // 2,
+            "course_id": row["course_id"],
+            "title": row["title"],
+            "snippet": snippet or None,
+            "rank": row["rank"],
+            "rowid": row["rowid"],
+        }
+
+
+def match_query(q: str) -> Optional[str]:
+    """
+    FTS5 query for free text: every word must match, a trailing * makes a
+    word a prefix. Words are quoted, so FTS5 operators and punctuation in
+    ``q`` are searched for rather than parsed. None when ``q`` has no words.
+    """
+    terms = []
+    for word in q.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms) or None
+
+
+def _decode(cursor: str) -> Sequence[Any]:
+    values = decode_cursor(cursor)
+    if (
+        len(values) != 2
+        or not isinstance(values[0], (int, float))
+        or not isinstance(values[1], int)
+        or isinstance(values[1], bool)
+    ):
+        raise InvalidCursor(cursor)
+    return values
+
+
+search = FullTextSearch(
+    snippet_tokens=settings.SEARCH_SNIPPET_TOKENS,
+    max_limit=settings.SEARCH_MAX_LIMIT,
+)
@@ -1,9 +1,18 @@
 from typing import Any, Dict, Optional, Union
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.core.security import get_password_hash, verify_password
+from app.core.principal import invalidate_principal
+from app.core.security import (
+    get_password_hash,
+    hash_password_async,
+    password_needs_rehash,
+    verify_password,
+    verify_password_async,
+)
 from app.crud.base import CRUDBase
+from app.db.session import AnySession, run_session
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
@@ -12,19 +21,47 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
     def get_by_email(self, db: Session, *, email: str) -> Optional[User]:
         return db.query(User).filter(User.email == email).first()
 
+    async def get_by_email_async(self, db: AnySession, *, email: str) -> Optional[User]:
+        return await self._first_async(db, select(User).where(User.email == email))
+
     def create(self, db: Session, *, obj_in: UserCreate) -> User:
-        db_obj = User(
-            email=obj_in.email,
-            hashed_password=get_password_hash(obj_in.password),
-            full_name=obj_in.full_name,
-            is_active=obj_in.is_active,
-            is_admin=obj_in.is_admin,
-        )
+        db_obj = self._new_user(obj_in, get_password_hash(obj_in.password))
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
         return db_obj
 
+    async def create_async(self, db: AnySession, *, obj_in: UserCreate) -> User:
+        """Like create, but hashes the password on the hashing executor"""
+        db_obj = self._new_user(obj_in, await hash_password_async(obj_in.password))
+        db.add(db_obj)
+        await run_session(db, "commit")
+        await run_session(db, "refresh", db_obj)
+        return db_obj
+
+    def _new_user(self, obj_in: UserCreate, hashed_password: str) -> User:
+        return User(**self.user_values(obj_in, hashed_password))
+
+    def user_values(self, obj_in: UserCreate, hashed_password: str) -> Dict[str, Any]:
+        """Column values for a new user, e.g. for create_multi with pre-hashed passwords"""
+        return {
+            "email": obj_in.email,
+            "hashed_password": hashed_password,
+            "full_name": obj_in.full_name,
+            "is_active": obj_in.is_active,
+            "is_admin": obj_in.is_admin,
+        }
+
+    def _create_values(self, obj_in: Union[UserCreate, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return dict(obj_in)
+        return self.user_values(obj_in, get_password_hash(obj_in.password))
+
+    def _update_values(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        if values.get("password"):
+            values["hashed_password"] = get_password_hash(values.pop("password"))
+        return values
+
     def update(
         self, db: Session, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
     ) -> User:
@@ -44,8 +81,37 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             return None
         if not verify_password(password, user.hashed_password):
             return None
+        if password_needs_rehash(user.hashed_password):
+            # Stored hash predates the current bcrypt cost; upgrade it transparently
+            user.hashed_password = get_password_hash(password)
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        return user
+
+    async def authenticate_async(
+        self, db: AnySession, *, email: str, password: str
+    ) -> Optional[User]:
+        """Like authenticate, but verifies the password on the hashing executor"""
+        user = await self.get_by_email_async(db, email=email)
+        if not user:
+            return None
+        if not await verify_password_async(password, user.hashed_password):
+            return None
+        if password_needs_rehash(user.hashed_password):
+            # Stored hash predates the current bcrypt cost; upgrade it transparently
+            user.hashed_password = await hash_password_async(password)
+            db.add(user)
+            await run_session(db, "commit")
+            await run_session(db, "refresh", user)
         return user
 
+    def _on_update(self, db_obj: User) -> None:
+        invalidate_principal(db_obj.id)
+
+    def _on_remove(self, obj: User) -> None:
+        invalidate_principal(obj.id)
+
     def is_active(self, user: User) -> bool:
         return user.is_active
 
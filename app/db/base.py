@@ -8,3 +8,5 @@ from app.models.lesson import Lesson  # noqa
 from app.models.comment import Comment  # noqa
 from app.models.rating import Rating  # noqa
 from app.models.enrollment import Enrollment  # noqa
+from app.models.activity import PlatformTotals, UserActivity  # noqa
+from app.models import search  # noqa: F401  FTS5 index and its triggers
@@ -41,21 +41,23 @@ def init_db(db: Session) -> None:
         course = crud.course.create_with_author(db=db, obj_in=course_in, author_id=user.id)
         
         # Create some lessons for the course
-        lesson1_in = schemas.LessonCreate(
-            title="Python Basics",
-            video_url="https://example.com/video1.mp4",
-            content="This lesson covers Python basics including variables, data types, and operators.",
-            course_id=course.id,
+        lesson1, lesson2 = crud.lesson.create_multi(
+            db,
+            objs_in=[
+                schemas.LessonCreate(
+                    title="Python Basics",
+                    video_url="https://example.com/video1.mp4",
+                    content="This lesson covers Python basics including variables, data types, and operators.",
+                    course_id=course.id,
+                ),
+                schemas.LessonCreate(
+                    title="Control Flow",
+                    video_url="https://example.com/video2.mp4",
+                    content="This lesson covers control flow statements like if-else, for loops, and while loops.",
+                    course_id=course.id,
+                ),
+            ],
         )
-        lesson1 = crud.lesson.create_with_course(db=db, obj_in=lesson1_in, course_id=course.id)
-        
-        lesson2_in = schemas.LessonCreate(
-            title="Control Flow",
-            video_url="https://example.com/video2.mp4",
-            content="This lesson covers control flow statements like if-else, for loops, and while loops.",
-            course_id=course.id,
-        )
-        lesson2 = crud.lesson.create_with_course(db=db, obj_in=lesson2_in, course_id=course.id)
         
         # Enroll test user in the course
         enrollment_in = schemas.EnrollmentCreate(course_id=course.id)
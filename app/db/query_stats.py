@@ -0,0 +1,175 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Placeholder lists of IN (...) and multi-row VALUES collapse to one shape
+_PARAM = r"(?:\?|%\(\w+\)s|%s|\$\d+|:\w+)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)(?:\s*,\s*\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\))*")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """``statement`` with whitespace normalized and placeholder lists collapsed"""
+    return _PARAM_LIST.sub("(?)", _SPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Statements issued within one scope (usually a request): count, time and shapes"""
+
+    def __init__(
+        self, n_plus_one_threshold: int = settings.N_PLUS_ONE_THRESHOLD, route: Optional[str] = None
+    ):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        # "METHOD /path" of the request, for logs
+        self.route = route
+        self.count = 0
+        self.duration = 0.0
+        self.statements: List[str] = []
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.statements.append(statement)
+            self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """Shapes issued more than once, most frequent first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > 1]
+
+    def suspected_n_plus_one(self) -> List[Tuple[str, int]]:
+        """SELECT shapes repeated at least ``n_plus_one_threshold`` times"""
+        return [
+            (shape, n) for shape, n in self.repeated()
+            if n >= self.n_plus_one_threshold and shape.upper().startswith("SELECT")
+        ]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+# Scopes that see statements from every thread, see assert_max_queries()
+_global: Set[QueryStats] = set()
+_global_lock = threading.Lock()
+
+
+@contextmanager
+def track_queries(stats: Optional[QueryStats] = None) -> Iterator[QueryStats]:
+    """Record the statements run in this context (and threadpool calls made from it)"""
+    stats = QueryStats() if stats is None else stats
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def assert_max_queries(n: int) -> Iterator[QueryStats]:
+    """
+    Fail if the block runs more than ``n`` statements.
+    Counts statements from every thread, so requests made through
+    TestClient inside the block are included.
+
+        with assert_max_queries(3):
+            client.get("/api/v1/courses/")
+    """
+    stats = QueryStats()
+    with _global_lock:
+        _global.add(stats)
+    try:
+        yield stats
+    finally:
+        with _global_lock:
+            _global.discard(stats)
+    if stats.count > n:
+        listing = "\n".join(f"  {s}" for s in stats.statements)
+        raise AssertionError(f"{stats.count} queries executed, at most {n} expected:\n{listing}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_stats_started"].pop()
+    targets = []
+    stats = _current.get()
+    if stats is not None:
+        targets.append(stats)
+    if _global:
+        with _global_lock:
+            targets.extend(s for s in _global if s is not stats)
+    if targets:
+        duration = time.perf_counter() - started
+        for target in targets:
+            target.record(statement, duration)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_stats_started"):
+        conn.info["query_stats_started"].pop()
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware tracking the statements of each HTTP request.
+    Adds ``X-DB-Queries`` and a ``Server-Timing`` db entry to the response;
+    SELECTs that look like an N+1 loop are counted in ``X-DB-N-Plus-One``
+    and logged as a warning.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(route=f"{scope['method']} {scope['path']}")
+
+        async def send_with_stats(message: Any) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"server-timing", stats.server_timing().encode()))
+                suspects = stats.suspected_n_plus_one()
+                if suspects:
+                    headers.append((b"x-db-n-plus-one", str(len(suspects)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with track_queries(stats):
+            await self.app(scope, receive, send_with_stats)
+        for shape, n in stats.suspected_n_plus_one():
+            endpoint = scope.get("endpoint")
+            logger.warning(
+                "Possible N+1 in %s (%s): %d x %s",
+                stats.route, getattr(endpoint, "__name__", "?"), n, shape,
+            )
+
+
+event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+event.listen(Engine, "handle_error", _handle_error)
@@ -1,12 +1,270 @@
-from sqlalchemy import create_engine
+import itertools
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Union
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.db.slow_queries import slow_query_log
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """PRAGMAs of the configured SQLite profile, in the order they are applied"""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "temp_store": settings.SQLITE_TEMP_STORE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "foreign_keys": "ON" if settings.SQLITE_FOREIGN_KEYS else "OFF",
+    }
+
+
+def apply_sqlite_profile(engine: Engine, pragmas: Optional[Dict[str, Any]] = None) -> None:
+    """Run the profile PRAGMAs on every new DBAPI connection of ``engine``"""
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _is_memory_sqlite(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(uri: str) -> Dict[str, Any]:
+    """create_engine() keyword arguments for ``uri``: pool sizing and driver args"""
+    options: Dict[str, Any] = {}
+    is_sqlite = make_url(uri).get_backend_name() == "sqlite"
+    if is_sqlite and "+aiosqlite" not in uri:
+        options["connect_args"] = {"check_same_thread": False}
+    # In-memory SQLite lives on a single connection, there is nothing to size
+    if not _is_memory_sqlite(uri):
+        if "+aiosqlite" in uri:
+            # aiosqlite defaults to NullPool and would re-run the PRAGMAs per checkout
+            options["poolclass"] = AsyncAdaptedQueuePool
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, connect_args={"check_same_thread": False})
+def build_engine(uri: str, *, sqlite_profile: Optional[bool] = None) -> Engine:
+    if sqlite_profile is None:
+        sqlite_profile = settings.SQLITE_PROFILE_ENABLED
+    engine = create_engine(uri, **engine_options(uri))
+    if sqlite_profile and engine.dialect.name == "sqlite":
+        apply_sqlite_profile(engine)
+    return engine
+
+
+engine = build_engine(settings.SQLALCHEMY_DATABASE_URI)
+if settings.SLOW_QUERY_THRESHOLD_MS is not None:
+    slow_query_log.attach(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Session.info key naming the replica (or analytics) engine a session reads from;
+# absent on primary sessions. Such reads may lag the primary.
+REPLICA_INFO = "replica"
+
+
+class Replica:
+    """
+    A read-only copy of the primary.
+    SQLite replicas are file copies refreshed by refresh_from(), and
+    ``synced_at`` is the time the copy is known to be current as of.
+    Other replicas stream from the primary and their position is not tracked.
+    """
+
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.Session = sessionmaker(
+            autocommit=False, autoflush=False, bind=engine, info={REPLICA_INFO: name}
+        )
+        self.is_copy = engine.dialect.name == "sqlite"
+        self.synced_at: Optional[float] = None
+
+    @property
+    def lag(self) -> float:
+        if self.synced_at is None:
+            # A copy that was never refreshed is of no use
+            return float("inf") if self.is_copy else 0.0
+        return time.time() - self.synced_at
+
+    def refresh_from(self, primary: Engine) -> None:
+        """Copy the primary into this replica with the SQLite online backup API"""
+        started = time.time()
+        source = primary.raw_connection()
+        target = self.engine.raw_connection()
+        try:
+            source.driver_connection.backup(target.driver_connection)
+        finally:
+            target.close()
+            source.close()
+        # Writes committed during the copy may or may not be in it
+        self.synced_at = started
+
+
+class SessionRouter:
+    """
+    Picks the engine for a session.
+    Writes go to the primary. Reads are spread round-robin over replicas
+    that are within ``max_lag`` seconds of the primary, except that a client
+    which has just written only reads from replicas known to contain that
+    write (or from any replica once ``read_your_writes`` seconds passed);
+    with no such replica the read falls back to the primary.
+    Aggregations use the analytics engine when one is configured.
+    """
+
+    def __init__(
+        self,
+        primary: sessionmaker,
+        replicas: Sequence[Replica] = (),
+        analytics: Optional[sessionmaker] = None,
+        *,
+        max_lag: float = 10.0,
+        read_your_writes: float = 5.0,
+    ):
+        self.primary = primary
+        self.replicas: List[Replica] = list(replicas)
+        self.analytics = analytics
+        self.max_lag = max_lag
+        self.read_your_writes = read_your_writes
+        # client -> time of its last commit on the primary
+        self._writes = TTLCache(100000, max(max_lag, read_your_writes))
+        self._next = itertools.count()
+
+    def write_session(self, client: Optional[Hashable] = None) -> Session:
+        db = self.primary()
+        if client is not None:
+            event.listen(db, "after_commit", lambda session: self.note_write(client))
+        return db
+
+    def read_session(self, client: Optional[Hashable] = None) -> Session:
+        replica = self.pick_replica(client)
+        if replica is None:
+            return self.primary()
+        return replica.Session()
+
+    def analytics_session(self) -> Session:
+        if self.analytics is not None:
+            return self.analytics()
+        return self.read_session()
+
+    def note_write(self, client: Hashable) -> None:
+        self._writes.set(client, time.time())
+
+    def pick_replica(self, client: Optional[Hashable] = None) -> Optional[Replica]:
+        candidates = [r for r in self.replicas if r.lag <= self.max_lag]
+        written_at = self._writes.get(client) if client is not None else None
+        if written_at is not None:
+            settled = time.time() - written_at >= self.read_your_writes
+            candidates = [
+                r for r in candidates
+                if (r.synced_at is None and settled)
+                or (r.synced_at is not None and r.synced_at >= written_at)
+            ]
+        if not candidates:
+            return None
+        return candidates[next(self._next) % len(candidates)]
+
+    @property
+    def sqlite_replicas(self) -> List[Replica]:
+        return [r for r in self.replicas if r.is_copy]
+
+    def refresh_replicas(self, primary: Engine) -> None:
+        for replica in self.sqlite_replicas:
+            replica.refresh_from(primary)
+
+
+router = SessionRouter(
+    SessionLocal,
+    replicas=[
+        Replica(f"replica{i}", build_engine(uri))
+        for i, uri in enumerate(settings.SQLALCHEMY_REPLICA_URIS)
+    ],
+    analytics=(
+        sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=build_engine(settings.SQLALCHEMY_ANALYTICS_URI),
+            info={REPLICA_INFO: "analytics"},
+        )
+        if settings.SQLALCHEMY_ANALYTICS_URI
+        else None
+    ),
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    read_your_writes=settings.READ_YOUR_WRITES_SECONDS,
+)
+
+# Either session type; the async CRUD methods accept both
+AnySession = Union[Session, AsyncSession]
+
+
+def async_database_uri(uri: str) -> str:
+    """Async driver URL for a sync SQLAlchemy URL"""
+    if uri.startswith("sqlite:"):
+        return uri.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if uri.startswith("postgresql:"):
+        return uri.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return uri
+
+
+# Async stack, only built when enabled
+async_engine = None
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+if settings.DB_ASYNC:
+    _async_uri = settings.SQLALCHEMY_ASYNC_DATABASE_URI or async_database_uri(
+        settings.SQLALCHEMY_DATABASE_URI
+    )
+    async_engine = create_async_engine(_async_uri, **engine_options(_async_uri))
+    if settings.SQLITE_PROFILE_ENABLED and async_engine.dialect.name == "sqlite":
+        apply_sqlite_profile(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+async def run_session(db: Union[Session, AsyncSession], method: str, *args: Any, **kwargs: Any) -> Any:
+    """
+    Call a session method from a coroutine.
+    AsyncSession methods are awaited natively; a sync Session is driven
+    from the threadpool, so the same async CRUD code serves both stacks.
+    """
+    if isinstance(db, AsyncSession):
+        return await getattr(db, method)(*args, **kwargs)
+    return await run_in_threadpool(getattr(db, method), *args, **kwargs)
+
+
+def dialect_insert(name: str) -> Any:
+    """insert() of dialect ``name``, the one with ON CONFLICT support"""
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported on {name}")
+    return insert
+
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,172 @@
+import json
+import logging
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.db.query_stats import current_stats, statement_shape
+
+logger = logging.getLogger(__name__)
+
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+def params_shape(parameters: Any) -> Any:
+    """Types of the bound parameters, never their values"""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """
+    Writes statements slower than ``threshold_ms`` as JSON lines to a
+    rotating file: SQL, parameter types, elapsed time, the request route
+    and, on SQLite, EXPLAIN QUERY PLAN. top() aggregates the files (so
+    every worker and the rotated backups count) by statement shape.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: Optional[float],
+        path: str,
+        max_bytes: int,
+        backup_count: int,
+        explain: bool = True,
+    ):
+        self.threshold_ms = threshold_ms
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.explain = explain
+        self._file_logger: Optional[logging.Logger] = None
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def detach(self, engine: Engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(engine, "handle_error", self._handle_error)
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Statement shapes by total time spent in slow executions, worst first"""
+        offenders: Dict[str, Dict[str, Any]] = {}
+        for entry in self.entries():
+            shape = entry["shape"]
+            item = offenders.setdefault(
+                shape, {"shape": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": []}
+            )
+            item["count"] += 1
+            item["total_ms"] += entry["elapsed_ms"]
+            item["max_ms"] = max(item["max_ms"], entry["elapsed_ms"])
+            if entry.get("route") and entry["route"] not in item["routes"]:
+                item["routes"].append(entry["route"])
+            # Keep the most recent example
+            item["sql"] = entry["sql"]
+            item["params"] = entry["params"]
+            item["plan"] = entry.get("plan")
+            item["full_scan"] = entry.get("full_scan", False)
+        ranked = sorted(offenders.values(), key=lambda item: item["total_ms"], reverse=True)
+        for item in ranked:
+            item["total_ms"] = round(item["total_ms"], 3)
+            item["avg_ms"] = round(item["total_ms"] / item["count"], 3)
+        return ranked[:limit]
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Every logged execution, oldest backup first"""
+        paths = [Path(f"{self.path}.{i}") for i in range(self.backup_count, 0, -1)] + [self.path]
+        if self._file_logger is not None:
+            for handler in self._file_logger.handlers:
+                handler.flush()
+        entries = []
+        for path in paths:
+            if not path.exists():
+                continue
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return entries
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+        if self.threshold_ms is None or elapsed_ms < self.threshold_ms:
+            return
+        stats = current_stats()
+        entry: Dict[str, Any] = {
+            "at": time.time(),
+            "elapsed_ms": round(elapsed_ms, 3),
+            "route": stats.route if stats is not None else None,
+            "shape": statement_shape(statement),
+            "sql": statement,
+            "params": params_shape(parameters[0] if executemany and parameters else parameters),
+            "executemany": executemany,
+        }
+        if self.explain and not executemany:
+            plan = self._explain(conn, statement, parameters)
+            if plan is not None:
+                entry["plan"] = plan
+                # SEARCH uses an index; SCAN reads the whole table (or index)
+                entry["full_scan"] = any(detail.startswith("SCAN") for detail in plan)
+        try:
+            self._logger().info(json.dumps(entry, default=str))
+        except OSError:
+            logger.exception("Could not write the slow query log")
+
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("slow_query_started"):
+            conn.info["slow_query_started"].pop()
+
+    def _explain(self, conn, statement: str, parameters: Any) -> Optional[List[str]]:
+        if conn.dialect.name != "sqlite" or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        # A separate DBAPI cursor, so neither the pending result nor these events are disturbed
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row[3] for row in cursor.fetchall()]
+        except Exception:
+            return None
+        finally:
+            cursor.close()
+
+    def _logger(self) -> logging.Logger:
+        # The file is only created once something is slow
+        if self._file_logger is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            file_logger = logging.getLogger(f"{__name__}.{self.path}")
+            file_logger.setLevel(logging.INFO)
+            file_logger.propagate = False
+            handler = RotatingFileHandler(
+                self.path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            file_logger.addHandler(handler)
+            self._file_logger = file_logger
+        return self._file_logger
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    path=settings.SLOW_QUERY_LOG_PATH,
+    max_bytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+    backup_count=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+)
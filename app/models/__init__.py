@@ -4,3 +4,4 @@ from .lesson import Lesson
 from .comment import Comment
 from .rating import Rating
 from .enrollment import Enrollment
+from .activity import PlatformTotals, UserActivity
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, text
+
+from app.db.base_class import Base
+
+
+# Rollups maintained by app.crud.counters; the /stats endpoints read nothing else
+
+class UserActivity(Base):
+    __tablename__ = "user_activity"
+
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    enrollment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Most active users: ORDER BY the score DESC, user_id DESC LIMIT n
+        Index(
+            "ix_user_activity_score_user_id",
+            text("(enrollment_count + comment_count + rating_count)"),
+            "user_id",
+        ),
+    )
+
+
+class PlatformTotals(Base):
+    """Row counts of the whole platform, split over slot rows 1..PLATFORM_TOTALS_SLOTS and added up on read"""
+    __tablename__ = "platform_totals"
+
+    id = Column(Integer, primary_key=True)
+    user_count = Column(Integer, nullable=False, default=0, server_default="0")
+    course_count = Column(Integer, nullable=False, default=0, server_default="0")
+    lesson_count = Column(Integer, nullable=False, default=0, server_default="0")
+    enrollment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Index, Integer, String, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,10 +7,15 @@ from app.db.base_class import Base
 
 class Comment(Base):
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("user.id"))
-    lesson_id = Column(Integer, ForeignKey("lesson.id"))
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"))
+    lesson_id = Column(Integer, ForeignKey("lesson.id", ondelete="CASCADE"))
     text = Column(String)
     created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ix_comment_lesson_id_created_at_id", "lesson_id", "created_at", "id"),
+        Index("ix_comment_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
     
     # Relationships
     user = relationship("User", back_populates="comments")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Index, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
@@ -8,9 +8,24 @@ class Course(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String)
-    author_id = Column(Integer, ForeignKey("user.id"))
+    # Courses outlive their author's account; only admins manage them then
+    author_id = Column(Integer, ForeignKey("user.id", ondelete="SET NULL"))
+    # Maintained by app.crud.counters, repaired by reconcile_counters.py
+    enrollment_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Leading foreign key + list sort key (see migrations/versions/0003)
+    __table_args__ = (
+        Index("ix_course_author_id_id", "author_id", "id"),
+        # Popular courses: ORDER BY enrollment_count DESC, id DESC LIMIT n
+        Index("ix_course_enrollment_count_id", "enrollment_count", "id"),
+    )
     
     # Relationships
     author = relationship("User", back_populates="courses")
-    lessons = relationship("Lesson", back_populates="course", cascade="all, delete-orphan")
-    enrolled_users = relationship("Enrollment", back_populates="course")
+    # Children are deleted by ON DELETE CASCADE, the ORM does not load them first
+    lessons = relationship(
+        "Lesson", back_populates="course", cascade="all, delete-orphan", passive_deletes=True
+    )
+    enrolled_users = relationship(
+        "Enrollment", back_populates="course", cascade="all, delete-orphan", passive_deletes=True
+    )
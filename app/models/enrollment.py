@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, Index, Integer, ForeignKey, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,10 +7,17 @@ from app.db.base_class import Base
 
 class Enrollment(Base):
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("user.id"))
-    course_id = Column(Integer, ForeignKey("course.id"))
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"))
+    course_id = Column(Integer, ForeignKey("course.id", ondelete="CASCADE"))
     enrolled_at = Column(DateTime, default=func.now())
     
+    # One enrollment per user and course
+    __table_args__ = (
+        UniqueConstraint("user_id", "course_id", name="uq_enrollment_user_course"),
+        Index("ix_enrollment_user_id_enrolled_at_id", "user_id", "enrolled_at", "id"),
+        Index("ix_enrollment_course_id_enrolled_at_id", "course_id", "enrolled_at", "id"),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="enrollments")
     course = relationship("Course", back_populates="enrolled_users")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Index, Integer, String, ForeignKey, Text, text
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
@@ -6,12 +6,26 @@ from app.db.base_class import Base
 
 class Lesson(Base):
     id = Column(Integer, primary_key=True, index=True)
-    course_id = Column(Integer, ForeignKey("course.id"))
+    course_id = Column(Integer, ForeignKey("course.id", ondelete="CASCADE"))
     title = Column(String, index=True)
     video_url = Column(String)
     content = Column(Text)
+    # Maintained by app.crud.counters, repaired by reconcile_counters.py
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_lesson_course_id_id", "course_id", "id"),
+        # Popular lessons: ORDER BY comment_count + rating_count DESC, id DESC LIMIT n
+        Index("ix_lesson_activity_id", text("(comment_count + rating_count)"), "id"),
+    )
     
     # Relationships
     course = relationship("Course", back_populates="lessons")
-    comments = relationship("Comment", back_populates="lesson", cascade="all, delete-orphan")
-    ratings = relationship("Rating", back_populates="lesson", cascade="all, delete-orphan")
+    comments = relationship(
+        "Comment", back_populates="lesson", cascade="all, delete-orphan", passive_deletes=True
+    )
+    ratings = relationship(
+        "Rating", back_populates="lesson", cascade="all, delete-orphan", passive_deletes=True
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Index, Integer, ForeignKey, CheckConstraint, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
@@ -6,13 +6,15 @@ from app.db.base_class import Base
 
 class Rating(Base):
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("user.id"))
-    lesson_id = Column(Integer, ForeignKey("lesson.id"))
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"))
+    lesson_id = Column(Integer, ForeignKey("lesson.id", ondelete="CASCADE"))
     stars = Column(Integer)
     
-    # Ensure stars are between 1 and 5
+    # Ensure stars are between 1 and 5, one rating per user and lesson
     __table_args__ = (
         CheckConstraint('stars >= 1 AND stars <= 5', name='check_stars_range'),
+        UniqueConstraint('user_id', 'lesson_id', name='uq_rating_user_lesson'),
+        Index('ix_rating_lesson_id_id', 'lesson_id', 'id'),
     )
     
     # Relationships
@@ -0,0 +1,74 @@
+from sqlalchemy import DDL, event
+
+from app.db.base_class import Base
+
+
+# FTS5 index over course title/description and lesson title/content,
+# maintained by the triggers below so every write path keeps it current
+# (bulk inserts, textual SQL and ON DELETE CASCADE included). A course is
+# rowid 2 * id, a lesson 2 * id + 1; migrations/versions/0006 creates the
+# same objects. SQLite only: the search endpoint needs FTS5.
+
+SEARCH_TABLE = "search_index"
+
+# Title matches weigh ten times a body match in the BM25 rank
+SEARCH_RANK = "bm25(10.0, 1.0)"
+
+SEARCH_TABLE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, body, kind UNINDEXED, course_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', '{SEARCH_RANK}')",
+]
+
+SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS course_search_insert AFTER INSERT ON course BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, kind, course_id)
+        VALUES (2 * new.id, coalesce(new.title, ''), coalesce(new.description, ''), 'course', new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS course_search_update AFTER UPDATE OF title, description ON course BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = 2 * old.id;
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, kind, course_id)
+        VALUES (2 * new.id, coalesce(new.title, ''), coalesce(new.description, ''), 'course', new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS course_search_delete AFTER DELETE ON course BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = 2 * old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lesson_search_insert AFTER INSERT ON lesson BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, kind, course_id)
+        VALUES (2 * new.id + 1, coalesce(new.title, ''), coalesce(new.content, ''), 'lesson', new.course_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lesson_search_update AFTER UPDATE OF title, content, course_id ON lesson BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = 2 * old.id + 1;
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, kind, course_id)
+        VALUES (2 * new.id + 1, coalesce(new.title, ''), coalesce(new.content, ''), 'lesson', new.course_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lesson_search_delete AFTER DELETE ON lesson BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = 2 * old.id + 1;
+    END
+    """,
+]
+
+SEARCH_DDL = SEARCH_TABLE_DDL + SEARCH_TRIGGERS
+
+SEARCH_DROP = f"DROP TABLE IF EXISTS {SEARCH_TABLE}"
+
+# create_all/drop_all (the tests) set the index up with the tables;
+# the triggers go away with the tables they are on
+for _statement in SEARCH_DDL:
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "before_drop", DDL(SEARCH_DROP).execute_if(dialect="sqlite"))
@@ -13,7 +13,14 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     
     # Relationships
-    courses = relationship("Course", back_populates="author")
-    enrollments = relationship("Enrollment", back_populates="user")
-    comments = relationship("Comment", back_populates="user")
-    ratings = relationship("Rating", back_populates="user")
+    # The database nulls Course.author_id and deletes the rest (ON DELETE), the ORM does not load them first
+    courses = relationship("Course", back_populates="author", passive_deletes=True)
+    enrollments = relationship(
+        "Enrollment", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
+    comments = relationship(
+        "Comment", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
+    ratings = relationship(
+        "Rating", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
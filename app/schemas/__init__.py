@@ -5,7 +5,7 @@ from .token import Token, TokenPayload
 from .user import User, UserCreate, UserUpdate, UserInDB
 from .comment import Comment, CommentCreate, CommentUpdate
 from .rating import Rating, RatingCreate, RatingUpdate
-from .enrollment import Enrollment, EnrollmentCreate, EnrollmentUpdate
+from .enrollment import Enrollment, EnrollmentCreate, EnrollmentCreateForUser, EnrollmentUpdate
 
 # Then import models that depend on others
 from .lesson import Lesson, LessonCreate, LessonUpdate
@@ -14,3 +14,5 @@ from .course import Course, CourseCreate, CourseUpdate
 # Finally import the compound models
 from .lesson import LessonWithDetails
 from .course import CourseWithLessons
+from .purge import PurgeJob
+from .search import SearchHit
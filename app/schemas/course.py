@@ -1,6 +1,9 @@
-from typing import List, Optional, Any
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
+
+from .lesson import LessonWithDetails
+from .loading import LoadedOnly
 
 
 # Shared properties
@@ -21,8 +24,10 @@ class CourseUpdate(CourseBase):
 
 class CourseInDBBase(CourseBase):
     id: int
-    author_id: int
+    # None once the author's account is deleted
+    author_id: Optional[int]
     title: str
+    enrollment_count: int = 0
 
     model_config = {"from_attributes": True}
 
@@ -32,6 +37,7 @@ class Course(CourseInDBBase):
     pass
 
 
-# Course with lessons
-class CourseWithLessons(Course):
-    lessons: List[Any] = Field(default_factory=list)
+# Course with lessons (None unless included), which may carry their comments and ratings
+class CourseWithLessons(LoadedOnly, Course):
+    lessons: Optional[List[LessonWithDetails]] = None
+
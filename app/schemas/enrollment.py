@@ -14,6 +14,11 @@ class EnrollmentCreate(EnrollmentBase):
     course_id: int
 
 
+# Properties to receive when an admin enrolls a given user
+class EnrollmentCreateForUser(EnrollmentCreate):
+    user_id: int
+
+
 # Properties to receive on enrollment update
 class EnrollmentUpdate(EnrollmentBase):
     pass
@@ -1,6 +1,10 @@
-from typing import List, Optional, Any
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
+
+from .comment import Comment
+from .loading import LoadedOnly
+from .rating import Rating
 
 
 # Shared properties
@@ -25,6 +29,8 @@ class LessonInDBBase(LessonBase):
     id: int
     course_id: int
     title: str
+    comment_count: int = 0
+    rating_count: int = 0
 
     model_config = {"from_attributes": True}
 
@@ -34,8 +40,9 @@ class Lesson(LessonInDBBase):
     pass
 
 
-# Lesson with comments and ratings
-class LessonWithDetails(Lesson):
-    comments: List[Any] = Field(default_factory=list) 
-    ratings: List[Any] = Field(default_factory=list)
+# Lesson with comments and ratings; each is None unless it was included
+class LessonWithDetails(LoadedOnly, Lesson):
+    comments: Optional[List[Comment]] = None
+    ratings: Optional[List[Rating]] = None
     average_rating: Optional[float] = None
+
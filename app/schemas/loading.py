@@ -0,0 +1,26 @@
+from typing import Any
+
+from pydantic import BaseModel, model_validator
+from sqlalchemy import inspect
+
+
+class LoadedOnly(BaseModel):
+    """
+    Reads only the attributes an ORM object has loaded, so relationships
+    left out of ``include=`` (raiseload) keep their default, None, instead
+    of raising or lazy loading.
+    """
+
+    @model_validator(mode="before")
+    @classmethod
+    def _loaded_attributes(cls, data: Any) -> Any:
+        if not hasattr(data, "_sa_instance_state"):
+            return data
+        state = inspect(data)
+        values = {}
+        for name in cls.model_fields:
+            if name in state.mapper.relationships and name in state.unloaded:
+                continue
+            if hasattr(data, name):
+                values[name] = getattr(data, name)
+        return values
@@ -0,0 +1,24 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+
+class PurgeTableProgress(BaseModel):
+    deleted: int
+    total: int
+
+
+# Progress of a background course purge
+class PurgeJob(BaseModel):
+    id: int
+    course_id: int
+    status: str
+    deleted: int
+    total: int
+    progress: float
+    tables: Dict[str, PurgeTableProgress]
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    model_config = {"from_attributes": True}
@@ -0,0 +1,15 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+# One course or lesson matched by GET /search
+class SearchHit(BaseModel):
+    kind: str
+    id: int
+    course_id: Optional[int] = None
+    title: str
+    # Escaped HTML: matched words in <mark>, cut text marked with …
+    snippet: Optional[str] = None
+    # BM25 rank, lower is better
+    rank: float
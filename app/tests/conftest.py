@@ -7,13 +7,18 @@ from typing import Dict, Generator
 # Добавляем корневую директорию проекта в sys.path для корректных импортов
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
+# Без фонового обновления снимка панели: он читал бы основную базу, а не тестовую
+os.environ["DASHBOARD_REFRESH_SECONDS"] = "0"
 
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app import crud
+from app.api import deps
+from app.core.principal import principal_cache
 from app.db.base import Base
-from app.db.session import get_db
+from app.db.session import apply_sqlite_profile, get_db
 from app.core.config import settings
 from app.core.security import create_access_token
 from app.models.user import User
@@ -26,6 +31,8 @@ SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
     SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+# ON DELETE CASCADE needs SQLite's foreign key enforcement, as in production
+apply_sqlite_profile(engine, {"foreign_keys": "ON"})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -50,7 +57,7 @@ def test_user(db) -> User:
 def get_test_token(user: User) -> str:
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return create_access_token(
-        subject=user.email, expires_delta=access_token_expires
+        subject=user.id, expires_delta=access_token_expires
     )
 
 
@@ -58,6 +65,12 @@ def get_test_token(user: User) -> str:
 def db():
     # Create the database tables
     Base.metadata.create_all(bind=engine)
+    # Кэши не должны переживать пересоздание таблиц
+    principal_cache.clear()
+    crud.access.clear()
+    crud.counts.clear()
+    crud.dashboard.clear()
+    crud.query_cache.clear()
     # Create a session
     db = TestingSessionLocal()
     try:
@@ -77,11 +90,19 @@ def client(db, test_user):
         finally:
             db.close()
 
+    # test_user может быть не сохранен в БД (см. фикстуру в test_api.py)
+    test_user = db.merge(test_user)
+    db.commit()
+
     # Создаем тестовый токен
     token = get_test_token(test_user)
     
     # Переопределяем зависимости
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[deps.get_db] = override_get_db
+    app.dependency_overrides[deps.get_read_db] = override_get_db
+    app.dependency_overrides[deps.get_analytics_db] = override_get_db
+    app.dependency_overrides[deps.get_async_db] = override_get_db
     
     # Создаем клиент с заголовком авторизации
     with TestClient(app) as c:
@@ -0,0 +1,71 @@
+from sqlalchemy import event
+
+from app import crud, schemas
+from app.core.config import settings
+from app.models.user import User
+
+
+def _course_with_lesson(db):
+    author = User(email="author@example.com", hashed_password="x", is_active=True)
+    db.add(author)
+    db.commit()
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Course"), author_id=author.id
+    )
+    lesson = crud.lesson.create_with_course(
+        db, obj_in=schemas.LessonCreate(title="Lesson", course_id=course.id), course_id=course.id
+    )
+    return course, lesson
+
+
+def test_access_follows_enrollments(client, db, test_user):
+    course, lesson = _course_with_lesson(db)
+    course_id, user_id = course.id, test_user.id
+    url = f"{settings.API_V1_STR}/comments/by-lesson/{lesson.id}"
+    assert client.get(url).status_code == 403
+
+    enrollment = crud.enrollment.create_with_owner(
+        db, obj_in=schemas.EnrollmentCreate(course_id=course_id), user_id=user_id
+    )
+    enrollment_id = enrollment.id
+    assert client.get(url).status_code == 200
+
+    crud.enrollment.remove(db, id=enrollment_id)
+    assert client.get(url).status_code == 403
+
+
+def test_warm_access_check_runs_no_sql(db, test_user):
+    course, lesson = _course_with_lesson(db)
+    crud.enrollment.create_with_owner(
+        db, obj_in=schemas.EnrollmentCreate(course_id=course.id), user_id=test_user.id
+    )
+    assert crud.access.check_lesson(db, lesson_id=lesson.id, user_id=test_user.id).is_enrolled
+
+    engine = db.get_bind()
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        lesson_access = crud.access.check_lesson(db, lesson_id=lesson.id, user_id=test_user.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert lesson_access.is_enrolled
+    assert lesson_access.course_id == course.id
+    assert statements == []
+
+
+def test_missing_lesson(db, test_user):
+    assert crud.access.check_lesson(db, lesson_id=404, user_id=test_user.id) is None
+
+
+def test_cold_load_racing_an_enrollment_is_not_kept(db, test_user):
+    course, _ = _course_with_lesson(db)
+    course_id, user_id = course.id, test_user.id
+    # A cold load reads the enrollments, then the enrollment commits before it stores them
+    token = crud.access._enrolled.token()
+    stale = set()
+    crud.enrollment.create_with_owner(
+        db, obj_in=schemas.EnrollmentCreate(course_id=course_id), user_id=user_id
+    )
+    assert not crud.access._enrolled.add(user_id, stale, token=token)
+    assert crud.access.is_enrolled(db, user_id=user_id, course_id=course_id)
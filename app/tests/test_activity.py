@@ -0,0 +1,113 @@
+from sqlalchemy import text
+
+from app import crud, models, schemas
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.user import User
+
+
+def _activity(db, user_id):
+    db.expire_all()
+    row = db.get(models.UserActivity, user_id)
+    return (row.enrollment_count, row.comment_count, row.rating_count) if row else None
+
+
+def _seed(db, author):
+    other = User(email="other@example.com", hashed_password="x", is_active=True)
+    db.add(other)
+    db.commit()
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Rolled up"), author_id=author.id
+    )
+    lessons = crud.lesson.create_multi(
+        db, objs_in=[{"title": f"L{i}", "course_id": course.id} for i in range(2)]
+    )
+    for user_id in (author.id, other.id):
+        crud.enrollment.create_with_owner(
+            db, obj_in=schemas.EnrollmentCreate(course_id=course.id), user_id=user_id
+        )
+    crud.comment.create_with_owner(
+        db, obj_in=schemas.CommentCreate(text="hi", lesson_id=lessons[0].id), user_id=other.id
+    )
+    for lesson, stars in zip(lessons, (4, 1)):
+        crud.rating.create_with_owner(
+            db, obj_in=schemas.RatingCreate(stars=stars, lesson_id=lesson.id), user_id=other.id
+        )
+    return course.id, other.id
+
+
+def test_rollups_follow_writes_and_cascades(db, test_user):
+    course_id, other_id = _seed(db, test_user)
+    totals = crud.activity.totals(db)
+    assert (totals["user_count"], totals["course_count"], totals["lesson_count"]) == (2, 1, 2)
+    assert (totals["enrollment_count"], totals["comment_count"], totals["rating_count"]) == (2, 1, 2)
+    assert totals["average_rating"] == 2.5
+    assert _activity(db, other_id) == (1, 1, 2)
+    assert [u.id for u, _ in crud.activity.most_active_users(db)] == [other_id, test_user.id]
+
+    # The database cascades the course away; the rollups follow
+    crud.course.remove(db, id=course_id)
+    totals = crud.activity.totals(db)
+    assert (totals["course_count"], totals["lesson_count"], totals["rating_count"]) == (0, 0, 0)
+    assert _activity(db, other_id) == (0, 0, 0)
+    assert crud.activity.most_active_users(db) == []
+    assert crud.counters.reconcile(db, fix=False) == []
+
+
+def test_rebuild_in_batches(db, test_user):
+    _, other_id = _seed(db, test_user)
+    db.execute(text("DELETE FROM user_activity"))
+    db.execute(text("UPDATE platform_totals SET rating_sum = 0, user_count = 9"))
+    db.commit()
+    assert len(crud.counters.reconcile(db, fix=False)) == 6
+
+    # Lessons and users take two batches each
+    assert crud.counters.rebuild(db, batch_size=1) == 1 + 2 + 2 + 1
+    assert crud.counters.reconcile(db, fix=False) == []
+    assert _activity(db, other_id) == (1, 1, 2)
+    assert crud.activity.totals(db)["user_count"] == 2
+
+
+def test_totals_spread_over_slots(db, test_user, monkeypatch):
+    monkeypatch.setattr(crud.counters, "totals_slots", 4)
+    db.info["totals_slot"] = 3
+    _seed(db, test_user)
+    slots = dict(db.execute(text("SELECT id, course_count FROM platform_totals")).all())
+    assert slots[3] == 1
+    assert crud.activity.totals(db)["course_count"] == 1
+    assert crud.counters.reconcile(db, fix=False) == []
+
+    # Repairs fold the slots back into one row
+    db.execute(text("UPDATE platform_totals SET user_count = user_count + 1 WHERE id = 3"))
+    db.commit()
+    assert [d.counter for d in crud.counters.reconcile(db)] == ["platform_totals.user_count"]
+    assert crud.activity.totals(db)["user_count"] == 2
+    assert crud.counters.rebuild(db, batch_size=10) > 0
+    assert db.execute(text("SELECT course_count FROM platform_totals WHERE id = 3")).scalar() == 0
+    assert crud.activity.totals(db)["course_count"] == 1
+
+
+def test_stats_endpoints_read_rollups(client, db, test_user):
+    _, other_id = _seed(db, test_user)
+    user_id = test_user.id
+    admin = User(email="admin@example.com", hashed_password="x", is_active=True, is_admin=True)
+    db.add(admin)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(admin.id)}"}
+
+    response = client.get(f"{settings.API_V1_STR}/stats/", headers=headers)
+    stats = response.json()
+    assert stats.pop("snapshot_at")
+    assert stats == {
+        "total_users": 3,
+        "total_courses": 1,
+        "total_lessons": 2,
+        "total_comments": 1,
+        "total_ratings": 2,
+        "average_rating": 2.5,
+    }
+    response = client.get(f"{settings.API_V1_STR}/stats/active-users", headers=headers)
+    assert [(u["id"], u["activity_score"]) for u in response.json()] == [
+        (other_id, 4), (user_id, 1)
+    ]
+    assert response.json()[0]["rating_count"] == 2
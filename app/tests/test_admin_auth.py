@@ -0,0 +1,73 @@
+from app import crud
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.query_stats import assert_max_queries
+from app.models.user import User
+
+
+def _admin(db) -> User:
+    admin = User(email="admin@example.com", full_name="Admin", hashed_password="x", is_active=True, is_admin=True)
+    db.add(admin)
+    db.commit()
+    db.refresh(admin)
+    return admin
+
+
+def test_admin_pages_redirect_without_session(client):
+    response = client.get(f"{settings.API_V1_STR}/admin/dashboard", follow_redirects=False)
+    assert response.status_code == 303
+    assert response.headers["location"] == f"{settings.API_V1_STR}/admin/login"
+
+
+def test_admin_pages_reject_non_admin(client, db, test_user):
+    client.cookies.set("access_token", create_access_token(test_user.id))
+    response = client.get(f"{settings.API_V1_STR}/admin/dashboard", follow_redirects=False)
+    assert response.status_code == 303
+    assert "error=" in response.headers["location"]
+
+
+def test_admin_session_cached_across_requests(client, db, monkeypatch):
+    admin = _admin(db)
+    client.cookies.set("access_token", f"Bearer {create_access_token(admin.id)}")
+    response = client.get(f"{settings.API_V1_STR}/admin/dashboard")
+    assert response.status_code == 200
+    assert "Admin" in response.text
+
+    def fail_get(*args, **kwargs):
+        raise AssertionError("users table queried for a cached admin session")
+
+    monkeypatch.setattr(crud.user, "get_by_email", fail_get)
+    monkeypatch.setattr(crud.user, "get", fail_get)
+    response = client.get(f"{settings.API_V1_STR}/admin/dashboard", follow_redirects=False)
+    assert response.status_code == 200
+
+
+def test_dashboard_served_from_snapshot(client, db, monkeypatch):
+    admin = _admin(db)
+    client.cookies.set("access_token", f"Bearer {create_access_token(admin.id)}")
+    db.add_all(
+        User(email=f"u{i}@example.com", full_name=f"User {i}", hashed_password="x") for i in range(3)
+    )
+    db.commit()
+    client.headers["Authorization"] = f"Bearer {create_access_token(admin.id)}"
+    # Warm the principal cache, then take the snapshot the background task would
+    client.get(f"{settings.API_V1_STR}/admin/dashboard")
+    client.get(f"{settings.API_V1_STR}/stats/")
+    monkeypatch.setattr(crud.dashboard, "refresh_seconds", 60)
+    snapshot = crud.dashboard.take(db)
+    assert snapshot.totals["user_count"] == 5
+    assert [u["full_name"] for u in snapshot.recent_users][:3] == ["User 2", "User 1", "User 0"]
+
+    with assert_max_queries(0):
+        response = client.get(f"{settings.API_V1_STR}/admin/dashboard")
+        assert response.status_code == 200
+        stats = client.get(f"{settings.API_V1_STR}/stats/").json()
+    assert "User 2" in response.text
+    assert stats["total_users"] == 5
+    assert stats["snapshot_at"] == snapshot.taken_at
+
+    # Without a refresh for too long, reads go back to the database
+    monkeypatch.setattr(crud.dashboard, "refresh_seconds", 0)
+    db.add(User(email="late@example.com", hashed_password="x"))
+    db.commit()
+    assert client.get(f"{settings.API_V1_STR}/stats/").json()["total_users"] == 6
@@ -16,7 +16,7 @@ from app.models.user import User
 
 # Test data
 TEST_USER = {
-    "email": "test@example.com",
+    "email": "new_user@example.com",
     "password": "testpassword",
     "full_name": "Test User"
 }
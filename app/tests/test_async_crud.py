@@ -0,0 +1,52 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import crud, schemas
+from app.db.base import Base
+from app.models.user import User
+
+
+def test_async_crud_on_async_session(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/async.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                author = User(email="async@example.com", is_active=True)
+                db.add(author)
+                await db.commit()
+
+                course = await crud.course.create_async(
+                    db, obj_in=schemas.CourseCreate(title="Async course")
+                )
+                assert await crud.course.get_async(db, course.id) is course
+                course = await crud.course.update_async(
+                    db, db_obj=course, obj_in={"author_id": author.id, "description": "d"}
+                )
+                by_author = await crud.course.get_multi_by_author_async(db, author_id=author.id)
+                assert [c.id for c in by_author] == [course.id]
+
+                with_lessons = await crud.course.get_with_lessons_async(db, id=course.id)
+                assert with_lessons.lessons == []
+
+                removed = await crud.course.remove_async(db, id=course.id)
+                assert removed.id == course.id
+                assert await crud.course.get_multi_async(db) == []
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_async_crud_on_sync_session(db):
+    async def scenario():
+        course = await crud.course.create_async(
+            db, obj_in=schemas.CourseCreate(title="Threadpool course")
+        )
+        courses = await crud.course.get_multi_by_title_async(db, title="threadpool")
+        assert [c.id for c in courses] == [course.id]
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+from sqlalchemy import event
+
+from app import crud, schemas
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.course import Course
+from app.models.user import User
+
+
+def test_create_multi_batches_inserts(db, test_user):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO course"):
+            statements.append(statement)
+
+    courses_in = [schemas.CourseCreate(title=f"Bulk {i}") for i in range(5)]
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        courses = crud.course.create_multi(
+            db, objs_in=courses_in, defaults={"author_id": test_user.id}, batch_size=2
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert [c.title for c in courses] == [f"Bulk {i}" for i in range(5)]
+    assert all(c.id and c.author_id == test_user.id for c in courses)
+    assert len(statements) == 3
+
+
+def test_update_and_upsert_multi(db, test_user):
+    courses = crud.course.create_multi(
+        db, objs_in=[{"title": "A", "author_id": test_user.id}, {"title": "B", "author_id": test_user.id}]
+    )
+    updated = crud.course.update_multi(
+        db, objs_in=[{"id": c.id, "description": f"about {c.title}"} for c in courses]
+    )
+    assert sorted(c.description for c in updated) == ["about A", "about B"]
+
+    upserted = crud.course.upsert_multi(
+        db,
+        objs_in=[
+            {"id": courses[0].id, "title": "A2", "author_id": test_user.id},
+            {"title": "C", "author_id": test_user.id},
+        ],
+    )
+    assert [c.title for c in upserted] == ["A2", "C"]
+    assert db.query(Course).count() == 3
+
+
+def test_admin_bulk_endpoints(client, db):
+    admin = User(email="bulk-admin@example.com", hashed_password="x", is_active=True, is_admin=True)
+    db.add(admin)
+    db.commit()
+    client.headers["Authorization"] = f"Bearer {create_access_token(admin.id)}"
+
+    response = client.post(
+        f"{settings.API_V1_STR}/admin/courses/bulk",
+        json=[{"title": "One"}, {"title": "Two"}],
+    )
+    assert response.status_code == 200
+    course_ids = [c["id"] for c in response.json()]
+
+    response = client.post(
+        f"{settings.API_V1_STR}/admin/lessons/bulk",
+        json=[{"title": f"L{i}", "course_id": course_ids[0]} for i in range(3)],
+    )
+    assert [l["title"] for l in response.json()] == ["L0", "L1", "L2"]
+
+    response = client.post(
+        f"{settings.API_V1_STR}/admin/users/bulk",
+        json=[{"email": f"bulk{i}@example.com", "password": "secret"} for i in range(2)],
+    )
+    assert response.status_code == 200
+    user_ids = [u["id"] for u in response.json()]
+
+    response = client.post(
+        f"{settings.API_V1_STR}/admin/enrollments/bulk",
+        json=[{"user_id": uid, "course_id": course_ids[1]} for uid in user_ids],
+    )
+    assert response.status_code == 200
+    assert crud.access.is_enrolled(db, user_id=user_ids[0], course_id=course_ids[1])
+
+    # Duplicate emails violate the unique index and roll the whole batch back
+    response = client.post(
+        f"{settings.API_V1_STR}/admin/users/bulk",
+        json=[{"email": "bulk0@example.com", "password": "secret"}],
+    )
+    assert response.status_code == 400
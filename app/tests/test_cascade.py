@@ -0,0 +1,93 @@
+from sqlalchemy import func, select
+
+from app import crud, models
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.user import User
+
+
+def _course_tree(db, author_id, lessons=3, comments=2):
+    course = models.Course(title="Big", description="", author_id=author_id)
+    db.add(course)
+    db.flush()
+    for i in range(lessons):
+        lesson = models.Lesson(title=f"L{i}", content="", course_id=course.id)
+        db.add(lesson)
+        db.flush()
+        db.add_all(
+            models.Comment(text=f"c{j}", lesson_id=lesson.id, user_id=author_id)
+            for j in range(comments)
+        )
+        db.add(models.Rating(stars=5, lesson_id=lesson.id, user_id=author_id))
+    db.add(models.Enrollment(user_id=author_id, course_id=course.id))
+    db.commit()
+    return course.id
+
+
+def _remaining(db):
+    return {
+        model.__tablename__: db.scalar(select(func.count()).select_from(model))
+        for model in (models.Course, models.Lesson, models.Comment, models.Rating, models.Enrollment)
+    }
+
+
+def test_delete_course_cascades_in_database(client, db, test_user):
+    course_id = _course_tree(db, test_user.id)
+    assert crud.counts.count(db, models.Comment).total == 6
+
+    response = client.delete(f"{settings.API_V1_STR}/courses/{course_id}")
+    assert response.status_code == 200
+    assert set(_remaining(db).values()) == {0}
+    # Rows removed by the cascade are not served from the count cache
+    assert crud.counts.count(db, models.Comment).total == 0
+    # Nor left in the counters and rollups
+    assert crud.counters.reconcile(db, fix=False) == []
+
+
+def test_purge_job_deletes_in_batches(client, db, monkeypatch):
+    admin = User(email="purge-admin@example.com", hashed_password="x", is_active=True, is_admin=True)
+    db.add(admin)
+    db.commit()
+    course_id = _course_tree(db, admin.id, lessons=4, comments=3)
+    client.headers["Authorization"] = f"Bearer {create_access_token(admin.id)}"
+    monkeypatch.setattr(crud.purge, "batch_size", 5)
+
+    response = client.post(f"{settings.API_V1_STR}/admin/courses/{course_id}/purge")
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    # TestClient runs background tasks before returning the response
+    job = client.get(f"{settings.API_V1_STR}/admin/purge-jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert job["progress"] == 1.0
+    assert job["tables"]["comment"] == {"deleted": 12, "total": 12}
+    assert job["deleted"] == job["total"] == 12 + 4 + 4 + 1 + 1
+    assert set(_remaining(db).values()) == {0}
+    assert crud.counters.reconcile(db, fix=False) == []
+
+    response = client.post(f"{settings.API_V1_STR}/admin/courses/{course_id}/purge")
+    assert response.status_code == 404
+
+
+def test_remove_user_with_content(db, test_user):
+    student = User(email="student@example.com", hashed_password="x", is_active=True)
+    db.add(student)
+    db.commit()
+    course_id = _course_tree(db, test_user.id, lessons=2, comments=1)
+    lesson_id = db.scalar(select(models.Lesson.id).where(models.Lesson.course_id == course_id))
+    student_id = student.id
+    db.add_all([
+        models.Enrollment(user_id=student_id, course_id=course_id),
+        models.Comment(text="hi", lesson_id=lesson_id, user_id=student_id),
+        models.Rating(stars=4, lesson_id=lesson_id, user_id=student_id),
+    ])
+    db.commit()
+
+    crud.user.remove(db, id=student_id)
+    # The author's rows stay, the student's go with the account
+    assert _remaining(db) == {"course": 1, "lesson": 2, "comment": 2, "rating": 2, "enrollment": 1}
+    crud.user.remove(db, id=test_user.id)
+    db.expire_all()
+    assert db.get(models.Course, course_id).author_id is None
+    assert _remaining(db) == {"course": 1, "lesson": 2, "comment": 0, "rating": 0, "enrollment": 0}
+    assert crud.counters.reconcile(db, fix=False) == []
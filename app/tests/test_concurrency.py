@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas
+from app.db.base import Base
+from app.db.session import build_engine
+from app.models.course import Course
+from app.models.enrollment import Enrollment
+from app.models.lesson import Lesson
+from app.models.rating import Rating
+from app.models.user import User
+
+THREADS = 32
+
+
+def _hammer(Session, fn):
+    barrier = threading.Barrier(THREADS)
+
+    def attempt(i):
+        db = Session()
+        try:
+            barrier.wait()
+            return fn(db, i).id
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(attempt, range(THREADS)))
+
+
+def test_parallel_enroll_and_rate_never_duplicate(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    user = User(email="race@example.com", hashed_password="x", is_active=True)
+    lesson = Lesson(title="Race", course=Course(title="Race", author=user))
+    db.add_all([user, lesson])
+    db.commit()
+    user_id, course_id, lesson_id = user.id, lesson.course_id, lesson.id
+    db.close()
+
+    try:
+        enrollment_ids = _hammer(
+            Session,
+            lambda db, i: crud.enrollment.create_with_owner(
+                db, obj_in=schemas.EnrollmentCreate(course_id=course_id), user_id=user_id
+            ),
+        )
+        rating_ids = _hammer(
+            Session,
+            lambda db, i: crud.rating.create_with_owner(
+                db,
+                obj_in=schemas.RatingCreate(lesson_id=lesson_id, stars=i % 5 + 1),
+                user_id=user_id,
+            ),
+        )
+        db = Session()
+        assert db.scalar(select(func.count()).select_from(Enrollment)) == 1
+        assert db.scalar(select(func.count()).select_from(Rating)) == 1
+        assert set(enrollment_ids) == {db.scalar(select(Enrollment.id))}
+        assert set(rating_ids) == {db.scalar(select(Rating.id))}
+        db.close()
+    finally:
+        crud.access.clear()
+        engine.dispose()
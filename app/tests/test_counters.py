@@ -0,0 +1,117 @@
+from sqlalchemy import text
+
+from app import crud, models, schemas
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.user import User
+
+
+def _counters(db, course_id, lesson_id):
+    db.expire_all()
+    course = db.get(models.Course, course_id)
+    lesson = db.get(models.Lesson, lesson_id)
+    return course.enrollment_count, lesson.comment_count, lesson.rating_count, lesson.rating_sum
+
+
+def test_counters_follow_every_write_path(db, test_user):
+    other = User(email="other@example.com", hashed_password="x", is_active=True)
+    db.add(other)
+    db.commit()
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Counted"), author_id=test_user.id
+    )
+    lesson = crud.lesson.create_with_course(
+        db, obj_in=schemas.LessonCreate(title="L", course_id=course.id), course_id=course.id
+    )
+    course_id, lesson_id, user_id, other_id = course.id, lesson.id, test_user.id, other.id
+    assert _counters(db, course_id, lesson_id) == (0, 0, 0, 0)
+
+    # Upserts: enrolling or rating twice counts once
+    for _ in range(2):
+        crud.enrollment.create_with_owner(
+            db, obj_in=schemas.EnrollmentCreate(course_id=course_id), user_id=user_id
+        )
+    crud.rating.create_with_owner(
+        db, obj_in=schemas.RatingCreate(stars=2, lesson_id=lesson_id), user_id=user_id
+    )
+    rating = crud.rating.create_with_owner(
+        db, obj_in=schemas.RatingCreate(stars=4, lesson_id=lesson_id), user_id=user_id
+    )
+    crud.rating.create_multi(db, objs_in=[{"stars": 5, "lesson_id": lesson_id, "user_id": other_id}])
+    assert _counters(db, course_id, lesson_id) == (1, 0, 2, 9)
+    assert crud.rating.get_average_for_lesson(db, lesson_id=lesson_id) == 4.5
+
+    # Session add/update/delete go through the flush
+    comment = crud.comment.create_with_owner(
+        db, obj_in=schemas.CommentCreate(text="hi", lesson_id=lesson_id), user_id=user_id
+    )
+    db.add(models.Enrollment(user_id=other_id, course_id=course_id))
+    db.commit()
+    crud.rating.update(db, db_obj=db.get(models.Rating, rating.id), obj_in={"stars": 1})
+    assert _counters(db, course_id, lesson_id) == (2, 1, 2, 6)
+
+    # Single statement deletes and updates
+    crud.rating.update_by_id(db, id=rating.id, obj_in={"stars": 3})
+    crud.comment.delete_by_id(db, id=comment.id)
+    crud.rating.remove(db, id=rating.id)
+    assert _counters(db, course_id, lesson_id) == (2, 0, 1, 5)
+    assert crud.counters.reconcile(db, fix=False) == []
+
+
+def test_reconcile_repairs_drift(db, test_user):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Drifted"), author_id=test_user.id
+    )
+    crud.enrollment.create_with_owner(
+        db, obj_in=schemas.EnrollmentCreate(course_id=course.id), user_id=test_user.id
+    )
+    course_id = course.id
+    db.execute(text("UPDATE course SET enrollment_count = 7"))
+    db.commit()
+
+    drift = crud.counters.reconcile(db, fix=False)
+    assert [(d.counter, d.parent_id, d.stored, d.actual) for d in drift] == [
+        ("course.enrollment_count", course_id, (7,), (1,))
+    ]
+    assert len(crud.counters.reconcile(db)) == 1
+    assert crud.counters.reconcile(db, fix=False) == []
+    assert db.get(models.Course, course_id).enrollment_count == 1
+
+
+def test_popular_endpoints_read_counters(client, db, test_user):
+    admin = User(email="admin@example.com", hashed_password="x", is_active=True, is_admin=True)
+    db.add(admin)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(admin.id)}"}
+    courses = [
+        crud.course.create_with_author(
+            db, obj_in=schemas.CourseCreate(title=f"C{i}"), author_id=test_user.id
+        )
+        for i in range(3)
+    ]
+    course_ids = [c.id for c in courses]
+    lesson = crud.lesson.create_with_course(
+        db, obj_in=schemas.LessonCreate(title="L", course_id=course_ids[0]), course_id=course_ids[0]
+    )
+    lesson_id = lesson.id
+    crud.enrollment.create_multi(
+        db,
+        objs_in=[
+            {"user_id": test_user.id, "course_id": course_ids[1]},
+            {"user_id": admin.id, "course_id": course_ids[1]},
+            {"user_id": admin.id, "course_id": course_ids[2]},
+        ],
+    )
+    crud.rating.create_with_owner(
+        db, obj_in=schemas.RatingCreate(stars=3, lesson_id=lesson_id), user_id=admin.id
+    )
+
+    response = client.get(f"{settings.API_V1_STR}/stats/popular-courses", headers=headers)
+    assert response.status_code == 200
+    assert [(c["id"], c["enrollment_count"]) for c in response.json()] == [
+        (course_ids[1], 2), (course_ids[2], 1)
+    ]
+    response = client.get(f"{settings.API_V1_STR}/stats/popular-lessons", headers=headers)
+    assert response.json() == [
+        {"id": lesson_id, "title": "L", "comment_count": 0, "rating_count": 1, "avg_rating": 3.0}
+    ]
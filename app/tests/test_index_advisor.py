@@ -0,0 +1,8 @@
+import index_advisor
+
+
+def test_hot_paths_use_indexes():
+    findings = index_advisor.run_advisor()
+    assert {f.path for f in findings} == {path for path, _ in index_advisor.HOT_PATHS}
+    scans = [(f.path, f.full_scans) for f in findings if f.full_scans]
+    assert scans == []
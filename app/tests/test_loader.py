@@ -0,0 +1,71 @@
+import asyncio
+
+from app import crud, schemas
+from app.core.config import settings
+from app.db.query_stats import assert_max_queries
+from app.models.course import Course
+from app.models.user import User
+
+
+def _course_with_students(db, author, n):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Batched"), author_id=author.id
+    )
+    students = [
+        User(email=f"student{i}@example.com", hashed_password="x", is_active=True) for i in range(n)
+    ]
+    db.add_all(students)
+    db.commit()
+    for student in students:
+        crud.enrollment.create_with_owner(
+            db, obj_in=schemas.EnrollmentCreate(course_id=course.id), user_id=student.id
+        )
+    return course.id, [student.id for student in students]
+
+
+def test_load_many_is_one_query_and_memoized(db, test_user):
+    course_id, student_ids = _course_with_students(db, test_user, 3)
+    db.close()
+    loader = crud.get_loader(db)
+    ids = list(reversed(student_ids)) + [-1]
+    with assert_max_queries(1):
+        users = loader.load_many(User, ids)
+        assert [u.id if u else None for u in users] == [*reversed(student_ids), None]
+        # Every id, misses included, is remembered for the rest of the request
+        assert loader.load(User, student_ids[0]) is users[-2]
+        assert loader.load(User, -1) is None
+    assert crud.get_loader(db) is loader
+
+    db.commit()
+    with assert_max_queries(1):
+        assert loader.load(Course, course_id).id == course_id
+
+
+def test_async_loads_coalesce_within_a_tick(db, test_user):
+    course_id, student_ids = _course_with_students(db, test_user, 4)
+    db.close()
+    loader = crud.get_loader(db)
+
+    async def scenario():
+        return await asyncio.gather(
+            loader.load_async(Course, course_id),
+            loader.load_many_async(User, student_ids[:2]),
+            loader.load_many_async(User, student_ids),
+        )
+
+    with assert_max_queries(2) as stats:
+        course, first, every = asyncio.run(scenario())
+    assert stats.count == 2
+    assert course.id == course_id
+    assert [u.id for u in every] == student_ids
+    assert first == every[:2]
+
+
+def test_enrolled_users_load_in_one_query(client, db, test_user):
+    course_id, student_ids = _course_with_students(db, test_user, 6)
+    # Course, enrollment page and users; the principal is cached from earlier requests
+    client.get(f"{settings.API_V1_STR}/users/me")
+    with assert_max_queries(3):
+        response = client.get(f"{settings.API_V1_STR}/enrollments/by-course/{course_id}")
+    assert response.status_code == 200
+    assert sorted(u["id"] for u in response.json()) == student_ids
@@ -0,0 +1,90 @@
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.core.config import settings
+from app.models.comment import Comment
+from app.models.course import Course
+from app.models.lesson import Lesson
+from app.utils.pagination import decode_cursor
+
+
+def test_comment_cursor_pages_through_equal_timestamps(db, test_user):
+    lesson = Lesson(title="Keyset", content="", course=Course(title="Keyset"))
+    db.add(lesson)
+    db.flush()
+    # Inserted within the same second: created_at ties are broken by id
+    db.add_all(Comment(text=str(i), lesson_id=lesson.id, user_id=test_user.id) for i in range(7))
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page = crud.comment.get_multi_by_lesson(db, lesson_id=lesson.id, limit=3, cursor=cursor)
+        seen += [c.text for c in page]
+        cursor = crud.comment.next_cursor(page, 3)
+        if cursor is None:
+            break
+        assert len(decode_cursor(cursor)) == 2
+    assert seen == [str(i) for i in range(7)]
+
+
+def test_list_endpoint_returns_next_cursor(client, db, test_user):
+    db.add_all(Course(title=f"Course {i}", description="", author_id=test_user.id) for i in range(5))
+    db.commit()
+
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"{settings.API_V1_STR}/courses/", params=params)
+        assert response.status_code == 200
+        titles += [c["title"] for c in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert titles == [f"Course {i}" for i in range(5)]
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get(f"{settings.API_V1_STR}/courses/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_envelope_total_comes_from_invalidated_count_cache(client, db, test_user):
+    author_id = test_user.id
+    db.add_all(Course(title=f"Course {i}", description="", author_id=author_id) for i in range(3))
+    db.commit()
+
+    response = client.get(f"{settings.API_V1_STR}/courses/", params={"limit": 2, "envelope": True})
+    body = response.json()
+    assert [body["total"], body["page"], body["pages"], body["approximate"]] == [3, 1, 2, False]
+    assert body["next_cursor"] == response.headers["x-next-cursor"]
+    assert crud.counts.count(db, Course) == (3, False)
+
+    # Any flushed write to the table drops its cached totals
+    db.add(Course(title="Course 3", description="", author_id=author_id))
+    db.commit()
+    response = client.get(f"{settings.API_V1_STR}/courses/", params={"envelope": True})
+    assert response.json()["total"] == 4
+
+
+def test_large_table_total_is_estimated(db, monkeypatch):
+    db.add_all(Course(title=f"Course {i}") for i in range(3))
+    db.commit()
+    monkeypatch.setattr(crud.counts, "approximate_above", 2)
+    assert crud.counts.count(db, Course) == (3, True)
+    # Filtered totals are always exact
+    assert crud.counts.count(db, Course, Course.title == "Course 1") == (1, False)
+
+
+def test_count_taken_before_commit_is_dropped_at_commit(db):
+    db.add(Course(title="Pending"))
+    db.flush()
+    # Another request counts between the flush and the commit and sees no row
+    other = Session(bind=db.get_bind())
+    try:
+        assert crud.counts.count(other, Course).total == 0
+    finally:
+        other.close()
+    db.commit()
+    assert crud.counts.count(db, Course).total == 1
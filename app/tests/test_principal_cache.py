@@ -0,0 +1,29 @@
+from app import crud
+from app.core.config import settings
+from app.core.principal import principal_cache
+
+
+def test_principal_served_from_cache(client, db, test_user, monkeypatch):
+    response = client.get(f"{settings.API_V1_STR}/users/me")
+    assert response.status_code == 200
+    assert len(principal_cache) == 1
+
+    # Повторный запрос не должен обращаться к таблице пользователей
+    def fail_get(*args, **kwargs):
+        raise AssertionError("users table queried on a cached token")
+
+    monkeypatch.setattr(crud.user, "get", fail_get)
+    response = client.get(f"{settings.API_V1_STR}/users/me")
+    assert response.status_code == 200
+    assert response.json()["email"] == test_user.email
+
+
+def test_principal_invalidated_on_update(client, db, test_user):
+    client.get(f"{settings.API_V1_STR}/users/me")
+    assert len(principal_cache) == 1
+
+    crud.user.update(db, db_obj=test_user, obj_in={"is_admin": True})
+    assert len(principal_cache) == 0
+
+    response = client.get(f"{settings.API_V1_STR}/users/me")
+    assert response.json()["is_admin"] is True
@@ -0,0 +1,95 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+from app.core.cache import cache_stats
+from app.db.query_stats import assert_max_queries
+from app.db.session import REPLICA_INFO
+
+
+def _course(db, author, lessons=2):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Cached"), author_id=author.id
+    )
+    for i in range(lessons):
+        crud.lesson.create_with_course(
+            db, obj_in=schemas.LessonCreate(title=f"L{i}", course_id=course.id), course_id=course.id
+        )
+    return course.id
+
+
+def test_hits_are_served_without_queries(db, test_user):
+    course_id = _course(db, test_user)
+    crud.course.get_with_lessons(db, id=course_id)
+    crud.lesson.get_multi_by_course(db, course_id=course_id)
+    other = Session(bind=db.get_bind())
+    try:
+        with assert_max_queries(0):
+            course = crud.course.get_with_lessons(other, id=course_id)
+            # A copy owned by this session, lessons included
+            assert course in other and course.title == "Cached"
+            assert [lesson.title for lesson in course.lessons] == ["L0", "L1"]
+            lessons = crud.lesson.get_multi_by_course(other, course_id=course_id)
+            assert [lesson.title for lesson in lessons] == ["L0", "L1"]
+    finally:
+        other.close()
+
+
+def test_writes_invalidate_by_table(db, test_user):
+    course_id = _course(db, test_user)
+    lesson_id = crud.lesson.get_multi_by_course(db, course_id=course_id)[0].id
+    crud.course.get(db, course_id)
+    crud.course.get_with_lessons(db, id=course_id)
+    assert crud.rating.get_average_for_lesson(db, lesson_id=lesson_id) == 0.0
+
+    # A rating changes the lesson's counter columns, not the course row
+    crud.rating.create_with_owner(
+        db, obj_in=schemas.RatingCreate(stars=4, lesson_id=lesson_id), user_id=test_user.id
+    )
+    with assert_max_queries(0):
+        assert crud.course.get(db, course_id).title == "Cached"
+    assert crud.rating.get_average_for_lesson(db, lesson_id=lesson_id) == 4.0
+
+    crud.course.update_by_id(db, id=course_id, obj_in={"title": "Renamed"})
+    assert crud.course.get(db, course_id).title == "Renamed"
+    db.execute(text("UPDATE lesson SET title = 'Raw'"))
+    db.commit()
+    assert {l.title for l in crud.course.get_with_lessons(db, id=course_id).lessons} == {"Raw"}
+
+
+def test_negative_results_and_uncommitted_writes(db, test_user):
+    before = cache_stats()["query_results"]["negative_hits"]
+    assert crud.course.get(db, 12345) is None
+    with assert_max_queries(0):
+        assert crud.course.get(db, 12345) is None
+    assert cache_stats()["query_results"]["negative_hits"] == before + 1
+
+    course_id = _course(db, test_user, lessons=0)
+    assert crud.course.get(db, course_id) is not None
+    course = crud.course.get(db, course_id)
+    course.title = "Pending"
+    db.flush()
+    # The session reads its own uncommitted write, and caches nothing from it
+    assert crud.course.get(db, course_id).title == "Pending"
+    db.rollback()
+    other = Session(bind=db.get_bind())
+    try:
+        assert crud.course.get(other, course_id).title == "Cached"
+    finally:
+        other.close()
+
+
+def test_replica_reads_bypass_the_cache(db, test_user):
+    course_id = _course(db, test_user, lessons=0)
+    before = cache_stats()["query_results"]["bypasses"]
+    replica = Session(bind=db.get_bind(), info={REPLICA_INFO: "replica0"})
+    try:
+        crud.course.get(replica, course_id)
+    finally:
+        replica.close()
+    assert cache_stats()["query_results"]["bypasses"] == before + 1
+    # Nothing was stored: the primary read goes to the database
+    with assert_max_queries(1):
+        assert crud.course.get(db, course_id).title == "Cached"
+    with assert_max_queries(0):
+        crud.course.get(db, course_id)
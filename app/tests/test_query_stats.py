@@ -0,0 +1,122 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.query_stats import (
+    QueryStatsMiddleware,
+    assert_max_queries,
+    statement_shape,
+    track_queries,
+)
+from app.models.user import User
+
+
+def test_statement_shape_collapses_placeholder_lists():
+    assert statement_shape("SELECT * FROM t\n  WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (?)"
+    assert statement_shape("INSERT INTO t (a, b) VALUES (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (?)"
+
+
+def test_track_and_assert_max_queries(db, test_user):
+    with track_queries() as stats:
+        for _ in range(5):
+            db.get(User, test_user.id, populate_existing=True)
+    assert stats.count == 5
+    assert stats.suspected_n_plus_one()[0][1] == 5
+
+    with pytest.raises(AssertionError, match="2 queries executed, at most 1"):
+        with assert_max_queries(1):
+            db.get(User, test_user.id, populate_existing=True)
+            db.get(User, test_user.id, populate_existing=True)
+
+
+def test_request_headers_flag_n_plus_one(db, test_user):
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+    user_id = test_user.id
+
+    @app.get("/loop")
+    def loop():
+        for _ in range(5):
+            db.get(User, user_id, populate_existing=True)
+        return {}
+
+    response = TestClient(app).get("/loop")
+    assert response.headers["X-DB-Queries"] == "5"
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert response.headers["X-DB-N-Plus-One"] == "1"
+
+
+def test_nested_admin_lists_cost_constant_queries(client, db):
+    admin = User(email="stats-admin@example.com", hashed_password="x", is_active=True, is_admin=True)
+    db.add(admin)
+    db.flush()
+    for i in range(6):
+        course = models.Course(title=f"C{i}", description="", author_id=admin.id)
+        db.add(course)
+        db.flush()
+        db.add_all(models.Lesson(title=f"L{j}", content="", course_id=course.id) for j in range(3))
+    db.commit()
+    client.headers["Authorization"] = f"Bearer {create_access_token(admin.id)}"
+
+    response = client.get(
+        f"{settings.API_V1_STR}/admin/courses", params={"include": "lessons,lessons.comments"}
+    )
+    assert response.status_code == 200
+    assert [len(c["lessons"]) for c in response.json()] == [3] * 6
+    assert response.json()[0]["lessons"][0]["comments"] == []
+    assert response.json()[0]["lessons"][0]["ratings"] is None
+    # Principal, courses, lessons, comments
+    assert int(response.headers["X-DB-Queries"]) <= 4
+    assert "X-DB-N-Plus-One" not in response.headers
+
+    response = client.get(f"{settings.API_V1_STR}/admin/lessons")
+    assert len(response.json()) == 18
+    assert int(response.headers["X-DB-Queries"]) <= 4
+
+    response = client.get(f"{settings.API_V1_STR}/admin/courses", params={"include": "author"})
+    assert response.status_code == 400
+
+
+def test_course_list_query_budget(client):
+    with assert_max_queries(3):
+        response = client.get(f"{settings.API_V1_STR}/courses/")
+    assert response.status_code == 200
+
+
+def test_detail_endpoints_load_included_relationships(client, db, test_user):
+    course = models.Course(title="C", description="", author_id=test_user.id)
+    db.add(course)
+    db.flush()
+    lesson = models.Lesson(title="L", content="", course_id=course.id)
+    db.add(lesson)
+    db.flush()
+    db.add_all(models.Comment(text=f"c{i}", lesson_id=lesson.id, user_id=test_user.id) for i in range(3))
+    db.add(models.Rating(stars=4, lesson_id=lesson.id, user_id=test_user.id))
+    db.commit()
+    course_id, lesson_id = course.id, lesson.id
+
+    response = client.get(f"{settings.API_V1_STR}/courses/{course_id}")
+    assert [l["title"] for l in response.json()["lessons"]] == ["L"]
+    response = client.get(f"{settings.API_V1_STR}/courses/{course_id}", params={"include": ""})
+    assert response.json()["lessons"] is None
+
+    # Three comments and one rating, not three joined rows
+    response = client.get(f"{settings.API_V1_STR}/lessons/{lesson_id}")
+    body = response.json()
+    assert len(body["comments"]) == 3 and len(body["ratings"]) == 1
+    assert body["average_rating"] == 4.0
+    body = client.get(f"{settings.API_V1_STR}/lessons/{lesson_id}", params={"include": "ratings"}).json()
+    assert body["comments"] is None and len(body["ratings"]) == 1
+    assert client.get(f"{settings.API_V1_STR}/lessons/{lesson_id}", params={"include": "author"}).status_code == 400
+
+    # The lists load nothing nested unless asked to
+    response = client.get(f"{settings.API_V1_STR}/courses/", params={"include": "lessons.comments"})
+    assert [len(l["comments"]) for l in response.json()[0]["lessons"]] == [3]
+    response = client.get(f"{settings.API_V1_STR}/courses/", params={"title": "C", "include": "lessons"})
+    assert [l["title"] for l in response.json()[0]["lessons"]] == ["L"]
+    assert client.get(f"{settings.API_V1_STR}/courses/").json()[0]["lessons"] is None
+    response = client.get(f"{settings.API_V1_STR}/lessons/", params={"include": "comments,ratings"})
+    assert len(response.json()[0]["comments"]) == 3
@@ -0,0 +1,96 @@
+from sqlalchemy import text
+
+from app import crud, schemas
+from app.core.config import settings
+from app.crud.search import match_query
+
+
+def _ids(db, q, **kwargs):
+    return [(hit["kind"], hit["id"]) for hit in crud.search.search(db, q=q, **kwargs)]
+
+
+def test_index_follows_every_write_path(db, test_user):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Python basics", description="Variables"), author_id=test_user.id
+    )
+    course_id = course.id
+    first, second = crud.lesson.create_multi(
+        db,
+        objs_in=[
+            {"title": "Loops", "content": "for and while in Python", "course_id": course_id},
+            {"title": "Functions", "content": "def and return", "course_id": course_id},
+        ],
+    )
+    first_id, second_id = first.id, second.id
+    # Title matches rank above body matches
+    assert _ids(db, "python") == [("course", course_id), ("lesson", first_id)]
+    assert _ids(db, "python", kind="lesson") == [("lesson", first_id)]
+
+    crud.lesson.update_by_id(db, id=second_id, obj_in={"content": "Python closures"})
+    crud.course.update(db, db_obj=crud.course.get(db, course_id), obj_in={"title": "Rust basics"})
+    assert sorted(_ids(db, "python")) == [("lesson", first_id), ("lesson", second_id)]
+    assert _ids(db, "rust") == [("course", course_id)]
+
+    # Lessons go with the course through ON DELETE CASCADE
+    crud.course.remove(db, id=course_id)
+    assert _ids(db, "python") == []
+    assert db.execute(text("SELECT count(*) FROM search_index")).scalar() == 0
+
+
+def test_search_endpoint_pages_by_rank(client, db, test_user):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="SQL", description="Joins <b>and</b> indexes"), author_id=test_user.id
+    )
+    course_id = course.id
+    crud.lesson.create_multi(
+        db,
+        objs_in=[
+            {"title": f"Part {i}", "content": "indexes " * (i + 1), "course_id": course_id}
+            for i in range(5)
+        ],
+    )
+    url = f"{settings.API_V1_STR}/search/"
+
+    response = client.get(url, params={"q": "joins"})
+    assert response.status_code == 200
+    assert response.json() == [{
+        "kind": "course",
+        "id": course_id,
+        "course_id": course_id,
+        "title": "SQL",
+        "snippet": "<mark>Joins</mark> &lt;b&gt;and&lt;/b&gt; indexes",
+        "rank": response.json()[0]["rank"],
+    }]
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "index*", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        seen += response.json()
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(seen) == 6
+    assert len({(hit["kind"], hit["id"]) for hit in seen}) == 6
+    assert [hit["rank"] for hit in seen] == sorted(hit["rank"] for hit in seen)
+
+    assert client.get(url, params={"q": "joins", "cursor": "bogus"}).status_code == 400
+    assert client.get(url, params={"q": "joins", "kind": "user"}).status_code == 400
+    # FTS5 syntax in the query is searched for, not parsed
+    assert client.get(url, params={"q": 'NEAR( "joins OR'}).json() == []
+
+
+def test_rebuild_refills_the_index(db, test_user):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Algebra"), author_id=test_user.id
+    )
+    crud.lesson.create_with_course(
+        db, obj_in=schemas.LessonCreate(title="Algebra drills", course_id=course.id), course_id=course.id
+    )
+    db.execute(text("DELETE FROM search_index"))
+    db.commit()
+    assert _ids(db, "algebra") == []
+    assert crud.search.rebuild(db) == 2
+    assert [kind for kind, _ in _ids(db, "algebra")] == ["course", "lesson"]
+    assert match_query("  ") is None
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import crud, schemas
+from app.core import security
+from app.core.config import settings
+from app.core.security import PasswordHasher, PasswordHashingBusy, password_hasher
+from app.models.user import User
+
+
+def test_hasher_rejects_when_queue_full():
+    hasher = PasswordHasher(kind="thread", max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = asyncio.ensure_future(hasher.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PasswordHashingBusy):
+            await hasher.run(release.wait)
+        release.set()
+        await blocked
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+    assert hasher.pending == 0
+
+
+def test_login_returns_503_when_hasher_saturated(client, db, monkeypatch):
+    crud.user.create(
+        db, obj_in=schemas.UserCreate(email="login@example.com", password="secret")
+    )
+    response = client.post(
+        f"{settings.API_V1_STR}/token",
+        json={"username": "login@example.com", "password": "secret"},
+    )
+    assert response.status_code == 200
+
+    monkeypatch.setattr(password_hasher, "max_workers", 0)
+    monkeypatch.setattr(password_hasher, "max_queue", 0)
+    response = client.post(
+        f"{settings.API_V1_STR}/token",
+        json={"username": "login@example.com", "password": "secret"},
+    )
+    assert response.status_code == 503
+
+
+def test_authenticate_upgrades_weak_hash(db, monkeypatch):
+    events = []
+    monkeypatch.setattr(security, "password_observers", [lambda e, p: events.append(e)])
+    weak_hash = security.pwd_context.handler("bcrypt").using(rounds=4).hash("secret")
+    user = User(email="weak@example.com", hashed_password=weak_hash, is_active=True)
+    db.add(user)
+    db.commit()
+
+    previous = security.bcrypt_rounds
+    security.configure_password_policy(6, min_rounds=5)
+    try:
+        assert crud.user.authenticate(db, email="weak@example.com", password="secret")
+        db.refresh(user)
+        assert user.hashed_password.startswith("$2b$06$")
+        assert not security.password_needs_rehash(user.hashed_password)
+        # Hashes at or above the floor are kept, whatever cost this worker hashes at
+        assert not security.password_needs_rehash(
+            security.pwd_context.handler("bcrypt").using(rounds=5).hash("secret")
+        )
+        # An explicit cost below the floor is raised to it
+        assert security.configure_password_policy(4, min_rounds=5) == 5
+    finally:
+        security.configure_password_policy(previous or 12)
+    assert events[:2] == ["calibrated", "verify"]
+
+
+def test_calibration_respects_bounds():
+    assert security.calibrate_bcrypt_rounds(0.001, 4, 6) == 4
+    assert security.calibrate_bcrypt_rounds(10 ** 6, 4, 6) == 6
@@ -0,0 +1,81 @@
+from app.db.session import build_engine, engine_options
+
+
+def test_sqlite_profile_applied_to_new_connections(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'profile.db'}", sqlite_profile=True)
+    try:
+        with engine.connect() as conn:
+            pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            assert pragma("journal_mode") == "wal"
+            assert pragma("synchronous") == 1  # NORMAL
+            assert pragma("foreign_keys") == 1
+            assert pragma("temp_store") == 2  # MEMORY
+            assert pragma("busy_timeout") == 5000
+        assert engine.pool.size() == 5
+    finally:
+        engine.dispose()
+
+
+def test_memory_database_has_no_pool_sizing():
+    assert "pool_size" not in engine_options("sqlite://")
+    assert engine_options("sqlite+aiosqlite:///./app.db")["pool_size"] == 5
+
+
+def _routed(tmp_path, **kwargs):
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db.base import Base
+    from app.db.session import Replica, SessionRouter
+
+    primary = build_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    Base.metadata.create_all(bind=primary)
+    replica = Replica("replica0", build_engine(f"sqlite:///{tmp_path / 'replica.db'}"))
+    router = SessionRouter(
+        sessionmaker(autocommit=False, autoflush=False, bind=primary),
+        replicas=[replica],
+        **kwargs,
+    )
+    return primary, replica, router
+
+
+def test_reads_use_fresh_replica_and_fall_back_after_write(tmp_path):
+    from app.models.course import Course
+
+    primary, replica, router = _routed(tmp_path, max_lag=60, read_your_writes=60)
+    try:
+        # A copy that was never refreshed is not used
+        assert router.pick_replica("alice") is None
+        router.refresh_replicas(primary)
+        assert router.pick_replica("alice") is replica
+
+        db = router.write_session("alice")
+        db.add(Course(title="Fresh"))
+        db.commit()
+        db.close()
+
+        # The writer reads its own write from the primary, others keep the replica
+        db = router.read_session("alice")
+        assert db.query(Course).filter_by(title="Fresh").count() == 1
+        db.close()
+        assert router.pick_replica("bob") is replica
+
+        router.refresh_replicas(primary)
+        assert router.pick_replica("alice") is replica
+        db = router.read_session("alice")
+        assert db.query(Course).filter_by(title="Fresh").count() == 1
+        db.close()
+    finally:
+        primary.dispose()
+        replica.engine.dispose()
+
+
+def test_lagging_replica_is_skipped(tmp_path):
+    primary, replica, router = _routed(tmp_path, max_lag=5)
+    try:
+        router.refresh_replicas(primary)
+        replica.synced_at -= 10
+        assert router.pick_replica() is None
+        assert router.analytics_session().get_bind() is primary
+    finally:
+        primary.dispose()
+        replica.engine.dispose()
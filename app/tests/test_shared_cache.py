@@ -0,0 +1,117 @@
+import pytest
+
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+from app.core import cache
+from app.core.cache import MemoryStore, SharedStore, SQLiteStore, TieredCache, caches, local_ttl
+from app.core.config import settings
+from app.crud.purge import CoursePurge
+from app.crud.query_cache import QueryCache, query_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / "cache.db"))
+
+
+def _workers(store, **kwargs):
+    # The same cache in two worker processes (unnamed, so it stays out of the stats registry)
+    return [TieredCache(100, 60, store=store, sync_interval=0, channel="test", **kwargs) for _ in range(2)]
+
+
+def test_values_and_invalidations_cross_workers(store):
+    a, b = _workers(store)
+    a.set(("user", 1), {"name": "Ann"}, tags=[1])
+    assert b.get(("user", 1)) == {"name": "Ann"}
+    assert b.stats()["shared_hits"] == 1
+
+    # b now has a local copy; a's writes must reach it
+    a.set(("user", 1), {"name": "Bob"}, tags=[1])
+    assert b.get(("user", 1)) == {"name": "Bob"}
+    a.invalidate_tag(1)
+    assert b.get(("user", 1)) is None
+    assert b.stats()["remote_invalidations"] == 3
+
+    b.set("k", 1)
+    assert a.get("k") == 1
+    b.clear()
+    assert a.get("k") is None
+
+
+def test_invalidation_only_tier_notifies_listeners(store):
+    a, b = _workers(store, share_values=False)
+    seen = []
+    b.listeners.append(lambda kind, ident: seen.append((kind, ident)))
+    a.set("k", object())
+    b.set("k", 2, tags=["course"])
+    assert b.get("k") == 2
+    a.invalidate_tag("course")
+    assert b.get("k") is None
+    assert seen == [("tag", "course")]
+
+    b.set(("user", 1), 3)
+    a.delete(("user", 1))
+    assert b.get(("user", 1)) is None
+    assert seen[-1] == ("key", "('user', 1)")
+
+
+def test_pruned_broadcasts_drop_the_local_tier(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"))
+    store.publish("test", "clear", "", "earlier worker")
+    a, b = _workers(store)
+    b.set("k", 1)
+    a.set("other", 1)
+    # Prune everything, including the broadcast b has not read yet
+    store._conn().execute("DELETE FROM cache_message")
+    a.set("other", 2)
+    assert b.get("k") == 1  # shared tier still holds it
+    assert b.stats()["shared_hits"] == 1
+
+
+def test_incomplete_store_fails_on_creation():
+    class ValuesOnly(SharedStore):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ValuesOnly()
+
+
+def test_ttls_are_capped_without_a_shared_tier(monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_CACHE_TTL_SECONDS", 5.0)
+    monkeypatch.setattr(cache, "shared_store", None)
+    assert (local_ttl(300), local_ttl(2), local_ttl(None)) == (5.0, 2, 5.0)
+    monkeypatch.setattr(cache, "shared_store", MemoryStore())
+    assert local_ttl(300) == 300
+
+
+def test_query_cache_versions_follow_other_workers():
+    store = MemoryStore()
+    here, there = QueryCache(100, 60, None, store=store), QueryCache(100, 60, None, store=store)
+    caches["query_results"] = query_cache
+    here._results.set("rows", ["course row"], tags=["course"])
+    there.tables_written(["course"])
+    here._results.sync(force=True)
+    assert here._versions == {"course": 1}
+    assert here._results.get("rows") is None
+    assert here.stats()["remote_invalidations"] == 1
+
+
+def test_purge_progress_is_visible_to_other_workers(db, test_user, monkeypatch):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Purged"), author_id=test_user.id
+    )
+    store = MemoryStore()
+    # Both register as "purge_jobs"; the app's own is put back afterwards
+    monkeypatch.setitem(caches, "purge_jobs", caches["purge_jobs"])
+    here, there = CoursePurge(100, 60, store=store), CoursePurge(100, 60, store=store)
+    for purge in (here, there):
+        purge._jobs.sync_interval = 0
+    job = here.start(course.id)
+    assert there.get(job.id).status == "pending"
+    here.run(job, lambda: Session(bind=db.get_bind()))
+    assert there.get(job.id).status == "done"
+    assert there.get(job.id).tables["course"] == {"deleted": 1, "total": 1}
@@ -0,0 +1,81 @@
+from sqlalchemy import event
+
+from app import crud, schemas
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.user import User
+
+
+def _recorder():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    return statements, record
+
+
+def test_update_by_id_is_one_statement(db, test_user):
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Old"), author_id=test_user.id
+    )
+    user_id = test_user.id
+    statements, record = _recorder()
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        updated = crud.course.update_by_id(
+            db,
+            id=course.id,
+            obj_in=schemas.CourseUpdate(title="New"),
+            where=(crud.course.owned_by(user_id),),
+        )
+        missed = crud.course.update_by_id(
+            db, id=course.id, obj_in={"title": "Hijacked"}, where=(crud.course.owned_by(-1),)
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert updated.title == "New"
+    assert missed is None
+    assert len(statements) == 2
+    assert all(s.startswith("UPDATE") and "RETURNING" in s for s in statements)
+
+
+def test_ownership_checked_mutations(client, db, test_user):
+    other = User(email="other@example.com", hashed_password="x", is_active=True)
+    db.add(other)
+    db.commit()
+    course = crud.course.create_with_author(
+        db, obj_in=schemas.CourseCreate(title="Mine"), author_id=test_user.id
+    )
+    lesson = crud.lesson.create_with_course(
+        db, obj_in=schemas.LessonCreate(title="L1", course_id=course.id), course_id=course.id
+    )
+    comment = crud.comment.create_with_owner(
+        db, obj_in=schemas.CommentCreate(text="hi", lesson_id=lesson.id), user_id=test_user.id
+    )
+    course_id, lesson_id, comment_id = course.id, lesson.id, comment.id
+    mine = dict(client.headers)
+    theirs = {"Authorization": f"Bearer {create_access_token(other.id)}"}
+
+    response = client.put(
+        f"{settings.API_V1_STR}/lessons/{lesson_id}", json={"title": "L2"}, headers=theirs
+    )
+    assert response.status_code == 403
+    response = client.put(
+        f"{settings.API_V1_STR}/lessons/{lesson_id}", json={"title": "L2"}, headers=mine
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "L2"
+    response = client.put(
+        f"{settings.API_V1_STR}/courses/{course_id + 100}", json={"title": "X"}, headers=mine
+    )
+    assert response.status_code == 404
+
+    response = client.delete(f"{settings.API_V1_STR}/comments/{comment_id}", headers=theirs)
+    assert response.status_code == 403
+    response = client.delete(f"{settings.API_V1_STR}/comments/{comment_id}", headers=mine)
+    assert response.status_code == 200
+    assert response.json()["text"] == "hi"
+    response = client.delete(f"{settings.API_V1_STR}/comments/{comment_id}", headers=mine)
+    assert response.status_code == 404
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import OperationalError
+
+from app import models
+from app.api.api_v1.endpoints import admin
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.slow_queries import SlowQueryLog
+from app.models.user import User
+
+
+def test_slow_query_log_records_plan_and_route(client, db, tmp_path, monkeypatch):
+    log = SlowQueryLog(
+        threshold_ms=0, path=str(tmp_path / "slow.log"), max_bytes=1_000_000, backup_count=2
+    )
+    monkeypatch.setattr(admin, "slow_query_log", log)
+    admin_user = User(email="slow-admin@example.com", hashed_password="x", is_active=True, is_admin=True)
+    db.add(admin_user)
+    db.commit()
+    client.headers["Authorization"] = f"Bearer {create_access_token(admin_user.id)}"
+
+    engine = db.get_bind()
+    log.attach(engine)
+    try:
+        db.execute(select(models.Course).where(models.Course.title.ilike("%python%"))).all()
+        client.get(f"{settings.API_V1_STR}/courses/", params={"title": "python"})
+    finally:
+        log.detach(engine)
+
+    entries = log.entries()
+    assert entries and all(e["elapsed_ms"] >= 0 for e in entries)
+    scans = [e for e in entries if "lower(course.title) LIKE" in e["sql"]]
+    assert scans[0]["full_scan"] is True
+    assert scans[0]["params"] == ["str"]
+    assert any(e["route"] == "GET /api/v1/courses/" for e in scans)
+
+    response = client.get(f"{settings.API_V1_STR}/admin/slow-queries", params={"limit": 5})
+    assert response.status_code == 200
+    top = response.json()
+    assert len(top) <= 5
+    assert top == sorted(top, key=lambda item: item["total_ms"], reverse=True)
+    assert any(item["full_scan"] and item["plan"] for item in top)
+
+
+def test_failed_statements_do_not_leak_timers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'failing.db'}")
+    log = SlowQueryLog(threshold_ms=None, path=str(tmp_path / "slow.log"), max_bytes=1000, backup_count=1)
+    log.attach(engine)
+    try:
+        with engine.connect() as conn:
+            for _ in range(5):
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM missing_table"))
+            assert conn.info.get("slow_query_started") == []
+    finally:
+        log.detach(engine)
+        engine.dispose()
@@ -1,4 +1,10 @@
-from typing import Generic, TypeVar, List, Dict, Any, Optional
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Generic, TypeVar, List, Dict, Any, Optional, Sequence, Tuple
+
+from fastapi import Response
 from pydantic import BaseModel
 
 T = TypeVar('T')
@@ -10,31 +16,65 @@ class PaginatedResponse(BaseModel, Generic[T]):
     """
     items: List[T]
     total: int
-    page: int
+    # None for cursor-based pages, whose position is not known
+    page: Optional[int]
     size: int
     pages: int
+    next_cursor: Optional[str] = None
+    # True when total is an estimate (see app.crud.counts)
+    approximate: bool = False
 
 
 def paginate(
     items: List[Any],
     total: int,
-    page: int = 1,
-    size: int = 10
+    page: Optional[int] = 1,
+    size: int = 10,
+    next_cursor: Optional[str] = None,
+    approximate: bool = False,
 ) -> Dict[str, Any]:
     """
     Create a paginated response with metadata
     """
-    pages = (total + size - 1) // size  # Ceiling division
+    pages = (total + size - 1) // size if size else 0  # Ceiling division
     
     return {
         "items": items,
         "total": total,
         "page": page,
         "size": size,
-        "pages": pages
+        "pages": pages,
+        "next_cursor": next_cursor,
+        "approximate": approximate,
     }
 
 
+def paginate_page(
+    items: List[Any],
+    count: Tuple[int, bool],
+    *,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    next_cursor: Optional[str],
+) -> Dict[str, Any]:
+    """
+    Envelope for one page of a list endpoint; ``count`` is a
+    (total, approximate) pair such as app.crud.counts.RowCount
+    """
+    total, approximate = count
+    return paginate(
+        items, total, page_number(skip, limit, cursor), limit, next_cursor, approximate
+    )
+
+
+def page_number(skip: int, limit: int, cursor: Optional[str] = None) -> Optional[int]:
+    """1-based page number of an offset page; None for a cursor page"""
+    if cursor or not limit:
+        return None
+    return skip // limit + 1
+
+
 def get_pagination_params(
     page: int = 1,
     size: int = 10
@@ -55,3 +95,47 @@ def get_pagination_params(
         "skip": skip,
         "limit": size
     }
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by encode_cursor; the API answers 400"""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Opaque keyset cursor: the sort key values of the last row on a page
+    """
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list):
+            raise InvalidCursor(cursor)
+        return [_decode_value(v) for v in values]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    """
+    Expose the cursor of the next page in the X-Next-Cursor header
+    (absent on the last page)
+    """
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
@@ -0,0 +1,110 @@
+"""
+Compare the SQLite connection profile (app.db.session.build_engine) with a
+plain create_engine() on a mixed read/write workload.
+
+    python benchmark_sqlite.py [--threads 8] [--ops 300] [--read-ratio 0.8]
+
+Each run uses a fresh database file in a temporary directory.
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.session import build_engine, sqlite_pragmas
+from app.models.comment import Comment
+from app.models.course import Course
+from app.models.lesson import Lesson
+from app.models.user import User
+
+LESSONS = 20
+
+
+def seed(Session) -> None:
+    db = Session()
+    user = User(email="bench@example.com", hashed_password="x", is_active=True)
+    course = Course(title="Bench", description="", author=user)
+    db.add_all([user, course])
+    db.flush()
+    db.add_all(Lesson(title=f"Lesson {i}", content="", course_id=course.id) for i in range(LESSONS))
+    db.commit()
+    db.close()
+
+
+def worker(Session, ops: int, read_ratio: float, seed_value: int, latencies: list) -> None:
+    rnd = random.Random(seed_value)
+    db = Session()
+    for _ in range(ops):
+        lesson_id = rnd.randint(1, LESSONS)
+        started = time.perf_counter()
+        if rnd.random() < read_ratio:
+            db.execute(
+                select(func.count(Comment.id)).where(Comment.lesson_id == lesson_id)
+            ).scalar()
+            db.rollback()
+        else:
+            db.add(Comment(text="benchmark", lesson_id=lesson_id, user_id=1))
+            db.commit()
+        latencies.append(time.perf_counter() - started)
+    db.close()
+
+
+def run(name: str, engine, threads: int, ops: int, read_ratio: float) -> None:
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    seed(Session)
+
+    latencies: list = []
+    pool = [
+        threading.Thread(target=worker, args=(Session, ops, read_ratio, i, latencies))
+        for i in range(threads)
+    ]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{name:<10} {len(latencies) / elapsed:>9.0f} ops/s"
+        f"   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=300, help="operations per thread")
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    args = parser.parse_args()
+
+    print("profile:", ", ".join(f"{k}={v}" for k, v in sqlite_pragmas().items()))
+    with tempfile.TemporaryDirectory() as tmp:
+        default_url = f"sqlite:///{Path(tmp) / 'default.db'}"
+        profile_url = f"sqlite:///{Path(tmp) / 'profile.db'}"
+        # What app.db.session used before the profile existed
+        run(
+            "default",
+            create_engine(default_url, connect_args={"check_same_thread": False}),
+            args.threads, args.ops, args.read_ratio,
+        )
+        run(
+            "profile",
+            build_engine(profile_url, sqlite_profile=True),
+            args.threads, args.ops, args.read_ratio,
+        )
+
+
+if __name__ == "__main__":
+    main()
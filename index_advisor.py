@@ -0,0 +1,204 @@
+"""
+Check the hot CRUD query paths for full table scans.
+
+    python index_advisor.py [--verbose]
+
+Builds a fresh SQLite database from the Alembic migrations, seeds it, runs
+every hot path and feeds each statement it issues to EXPLAIN QUERY PLAN.
+Exits with status 1 if any of them scans a table.
+"""
+import argparse
+import re
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, List, NamedTuple, Tuple
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import crud
+from app.db.session import build_engine
+from app.models.comment import Comment
+from app.models.course import Course
+from app.models.enrollment import Enrollment
+from app.models.lesson import Lesson
+from app.models.rating import Rating
+from app.models.user import User
+from app.utils.pagination import encode_cursor
+
+ROOT = Path(__file__).resolve().parent
+SEEN = datetime(2024, 1, 1)
+# Plan step of an FTS5 table queried with MATCH, e.g. "SCAN search_index VIRTUAL TABLE INDEX 0:M4"
+_FTS_MATCH = re.compile(r" VIRTUAL TABLE INDEX \d+:M")
+
+# Every filtered read the API serves, with and without a keyset cursor
+HOT_PATHS: List[Tuple[str, Callable[[Session], Any]]] = [
+    ("user.get_by_email", lambda db: crud.user.get_by_email(db, email="author@example.com")),
+    ("course.get_multi_by_author", lambda db: crud.course.get_multi_by_author(db, author_id=1)),
+    ("course.get_multi_by_author/cursor",
+     lambda db: crud.course.get_multi_by_author(db, author_id=1, cursor=encode_cursor([1]))),
+    ("lesson.get_multi_by_course", lambda db: crud.lesson.get_multi_by_course(db, course_id=1)),
+    ("lesson.get_multi_by_course/cursor",
+     lambda db: crud.lesson.get_multi_by_course(db, course_id=1, cursor=encode_cursor([1]))),
+    ("comment.get_multi_by_lesson", lambda db: crud.comment.get_multi_by_lesson(db, lesson_id=1)),
+    ("comment.get_multi_by_lesson/cursor",
+     lambda db: crud.comment.get_multi_by_lesson(db, lesson_id=1, cursor=encode_cursor([SEEN, 1]))),
+    ("comment.get_multi_by_owner", lambda db: crud.comment.get_multi_by_owner(db, user_id=2)),
+    ("comment.get_multi_by_owner/cursor",
+     lambda db: crud.comment.get_multi_by_owner(db, user_id=2, cursor=encode_cursor([SEEN, 1]))),
+    ("rating.get_by_user_and_lesson",
+     lambda db: crud.rating.get_by_user_and_lesson(db, user_id=2, lesson_id=1)),
+    ("rating.get_multi_by_lesson", lambda db: crud.rating.get_multi_by_lesson(db, lesson_id=1)),
+    ("rating.get_average_for_lesson", lambda db: crud.rating.get_average_for_lesson(db, lesson_id=1)),
+    ("enrollment.get_by_user_and_course",
+     lambda db: crud.enrollment.get_by_user_and_course(db, user_id=2, course_id=1)),
+    ("enrollment.get_multi_by_user", lambda db: crud.enrollment.get_multi_by_user(db, user_id=2)),
+    ("enrollment.get_multi_by_user/cursor",
+     lambda db: crud.enrollment.get_multi_by_user(db, user_id=2, cursor=encode_cursor([SEEN, 1]))),
+    ("enrollment.get_multi_by_course", lambda db: crud.enrollment.get_multi_by_course(db, course_id=1)),
+    ("enrollment.get_multi_by_course/cursor",
+     lambda db: crud.enrollment.get_multi_by_course(db, course_id=1, cursor=encode_cursor([SEEN, 1]))),
+    ("course.get_popular", lambda db: crud.course.get_popular(db, limit=5)),
+    ("lesson.get_popular", lambda db: crud.lesson.get_popular(db, limit=5)),
+    ("activity.totals", lambda db: crud.activity.totals(db)),
+    ("activity.most_active_users", lambda db: crud.activity.most_active_users(db, limit=5)),
+    ("dashboard.take", lambda db: crud.dashboard.take(db)),
+    ("search.search", lambda db: crud.search.search(db, q="python")),
+    ("search.search/cursor",
+     lambda db: crud.search.search(db, q="python", cursor=encode_cursor([-1.0, 2]))),
+    ("access.check_lesson", lambda db: crud.access.check_lesson(db, lesson_id=1, user_id=2)),
+    ("access.enrolled_course_ids", lambda db: crud.access.enrolled_course_ids(db, user_id=2)),
+]
+
+
+class Finding(NamedTuple):
+    path: str
+    statement: str
+    plan: List[str]
+
+    @property
+    def full_scans(self) -> List[str]:
+        # SEARCH goes through an index; SCAN reads every row of the table or index,
+        # unless it walks an index (or, as the outer loop, the rowid) in ORDER BY
+        # order and LIMIT stops it after n rows. An FTS5 MATCH (M in the index
+        # string) only reads the posting lists of the query terms
+        top_n = " LIMIT " in self.statement and not self.temp_sorts
+        return [
+            step for i, step in enumerate(self.plan)
+            if step.startswith("SCAN") and step != "SCAN CONSTANT ROW"
+            and not _FTS_MATCH.search(step)
+            and not (top_n and (" USING INDEX " in step or (i == 0 and " ORDER BY " in self.statement)))
+        ]
+
+    @property
+    def temp_sorts(self) -> List[str]:
+        return [step for step in self.plan if "TEMP B-TREE" in step]
+
+
+def migrate(url: str) -> None:
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+
+def seed(db: Session) -> None:
+    # A handful of rows; without ANALYZE the planner assumes big tables either way
+    author = User(email="author@example.com", hashed_password="x", is_active=True)
+    student = User(email="student@example.com", hashed_password="x", is_active=True)
+    db.add_all([author, student])
+    db.flush()
+    for c in range(2):
+        course = Course(title=f"Course {c}", description="", author_id=author.id)
+        db.add(course)
+        db.flush()
+        db.add(Enrollment(user_id=student.id, course_id=course.id, enrolled_at=SEEN))
+        for l in range(3):
+            lesson = Lesson(title=f"Lesson {l}", content="", course_id=course.id)
+            db.add(lesson)
+            db.flush()
+            db.add(Comment(text="hi", lesson_id=lesson.id, user_id=student.id, created_at=SEEN))
+            db.add(Rating(stars=4, lesson_id=lesson.id, user_id=student.id))
+    db.commit()
+
+
+def explain(engine: Engine, statement: str, parameters: Any) -> List[str]:
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def analyze(engine: Engine) -> List[Finding]:
+    """Run every hot path on ``engine`` and explain the statements it issues"""
+    Session = sessionmaker(bind=engine, autoflush=False)
+    findings: List[Finding] = []
+    for path, run in HOT_PATHS:
+        captured: List[Tuple[str, Any]] = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            captured.append((statement, parameters))
+
+        # Cold caches, so every lookup reaches the database
+        crud.access.clear()
+        crud.query_cache.clear()
+        db = Session()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            run(db)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+            db.close()
+        for statement, parameters in captured:
+            findings.append(Finding(path, statement, explain(engine, statement, parameters)))
+    return findings
+
+
+def run_advisor() -> List[Finding]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'advisor.db'}"
+        migrate(url)
+        engine = build_engine(url, sqlite_profile=True)
+        try:
+            Session = sessionmaker(bind=engine, autoflush=False)
+            db = Session()
+            seed(db)
+            db.close()
+            return analyze(engine)
+        finally:
+            engine.dispose()
+            crud.access.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    findings = run_advisor()
+    failed = [f for f in findings if f.full_scans]
+    for finding in findings:
+        if finding.full_scans:
+            status = "SCAN"
+        elif finding.temp_sorts:
+            status = "SORT"
+        else:
+            status = "ok"
+        if args.verbose or status != "ok":
+            print(f"{status:<5} {finding.path}: {' '.join(finding.statement.split())}")
+            for step in finding.plan:
+                print(f"        {step}")
+    print(f"{len(findings)} statements from {len(HOT_PATHS)} hot paths, {len(failed)} with full scans")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
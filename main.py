@@ -1,15 +1,25 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 import os
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app import crud
+from app.core import security
 from app.core.config import settings
+from app.core.security import PasswordHashingBusy, configure_password_policy, password_hasher
 from app.api.api_v1.api import api_router
-from app.db.session import engine
+from app.db.session import engine, router
 from app.db.base import Base
+from app.db.query_stats import QueryStatsMiddleware
+from app.crud.base import InvalidInclude
+from app.utils.pagination import InvalidCursor
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -29,6 +39,86 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# Счётчики SQL-запросов на каждый запрос (заголовки X-DB-Queries и Server-Timing)
+if settings.SQL_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    # Пул bcrypt переполнен: быстро отказываем, чтобы не тормозить остальные запросы
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many concurrent login attempts, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": "Invalid pagination cursor"})
+
+
+@app.exception_handler(InvalidInclude)
+async def invalid_include_handler(request: Request, exc: InvalidInclude):
+    return JSONResponse(status_code=400, content={"detail": f"Cannot include {exc}"})
+
+
+@app.on_event("startup")
+def calibrate_password_hashing():
+    # Подбираем стоимость bcrypt под железо один раз на процесс
+    if security.bcrypt_rounds is None:
+        configure_password_policy()
+
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+
+async def refresh_sqlite_replicas():
+    while True:
+        try:
+            await run_in_threadpool(router.refresh_replicas, engine)
+        except Exception:
+            logging.getLogger(__name__).exception("SQLite replica refresh failed")
+        await asyncio.sleep(settings.SQLITE_REPLICA_REFRESH_SECONDS)
+
+
+@app.on_event("startup")
+def start_replica_refresh():
+    # SQLite-реплики — это копии основной базы, их нужно периодически обновлять
+    if router.sqlite_replicas:
+        app.state.replica_refresh = asyncio.ensure_future(refresh_sqlite_replicas())
+
+
+@app.on_event("shutdown")
+def stop_replica_refresh():
+    task = getattr(app.state, "replica_refresh", None)
+    if task is not None:
+        task.cancel()
+
+async def refresh_dashboard_snapshot():
+    while True:
+        try:
+            await run_in_threadpool(crud.dashboard.refresh, router.analytics_session)
+        except Exception:
+            logging.getLogger(__name__).exception("Dashboard snapshot refresh failed")
+        await asyncio.sleep(crud.dashboard.refresh_seconds)
+
+
+@app.on_event("startup")
+def start_dashboard_refresh():
+    # Панель администратора и /stats читают снимок из памяти, а не базу
+    if crud.dashboard.refresh_seconds > 0:
+        app.state.dashboard_refresh = asyncio.ensure_future(refresh_dashboard_snapshot())
+
+
+@app.on_event("shutdown")
+def stop_dashboard_refresh():
+    task = getattr(app.state, "dashboard_refresh", None)
+    if task is not None:
+        task.cancel()
+
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -0,0 +1,79 @@
+"""one enrollment/rating per user, ON DELETE rules for the course tree and users
+
+Duplicate enrollments (the first one is kept) and ratings (the latest
+one is kept) are removed before the unique constraints are added.
+Deleting a user deletes their enrollments, comments and ratings and
+leaves their courses without an author.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:05:00
+
+"""
+from typing import Optional, Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Names SQLite's unnamed foreign keys are reflected under in batch mode
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# (table, column, referred table, ON DELETE)
+FOREIGN_KEYS = [
+    ("lesson", "course_id", "course", "CASCADE"),
+    ("enrollment", "course_id", "course", "CASCADE"),
+    ("comment", "lesson_id", "lesson", "CASCADE"),
+    ("rating", "lesson_id", "lesson", "CASCADE"),
+    ("course", "author_id", "user", "SET NULL"),
+    ("enrollment", "user_id", "user", "CASCADE"),
+    ("comment", "user_id", "user", "CASCADE"),
+    ("rating", "user_id", "user", "CASCADE"),
+]
+
+UNIQUE = {
+    "enrollment": ("uq_enrollment_user_course", ["user_id", "course_id"]),
+    "rating": ("uq_rating_user_lesson", ["user_id", "lesson_id"]),
+}
+
+
+def _fk_name(table: str, column: str, referred: str) -> str:
+    if op.get_bind().dialect.name == "postgresql":
+        return f"{table}_{column}_fkey"
+    return f"fk_{table}_{column}_{referred}"
+
+
+def _alter(table: str, column: str, referred: str, ondelete: Optional[str]) -> None:
+    with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+        name = _fk_name(table, column, referred)
+        batch_op.drop_constraint(name, type_="foreignkey")
+        batch_op.create_foreign_key(name, referred, [column], ["id"], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    op.execute(
+        "DELETE FROM enrollment WHERE id NOT IN "
+        "(SELECT MIN(id) FROM enrollment GROUP BY user_id, course_id)"
+    )
+    op.execute(
+        "DELETE FROM rating WHERE id NOT IN "
+        "(SELECT MAX(id) FROM rating GROUP BY user_id, lesson_id)"
+    )
+    for table, column, referred, ondelete in FOREIGN_KEYS:
+        _alter(table, column, referred, ondelete)
+    for table, (name, columns) in UNIQUE.items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.create_unique_constraint(name, columns)
+
+
+def downgrade() -> None:
+    for table, (name, columns) in UNIQUE.items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_="unique")
+    for table, column, referred, _ in reversed(FOREIGN_KEYS):
+        _alter(table, column, referred, None)
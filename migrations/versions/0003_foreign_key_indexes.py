@@ -0,0 +1,43 @@
+"""composite indexes for the foreign keys every list and access check filters on
+
+Each index leads with the filtered foreign key and continues with the
+sort key of the matching get_multi_by_* (its cursor_columns), so one
+index serves the filter, the ORDER BY and keyset pagination.
+Enrollment.user_id and Rating.user_id lookups are covered by the
+unique constraints of 0002.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_course_author_id_id", "course", ["author_id", "id"]),
+    ("ix_lesson_course_id_id", "lesson", ["course_id", "id"]),
+    ("ix_comment_lesson_id_created_at_id", "comment", ["lesson_id", "created_at", "id"]),
+    ("ix_comment_user_id_created_at_id", "comment", ["user_id", "created_at", "id"]),
+    ("ix_rating_lesson_id_id", "rating", ["lesson_id", "id"]),
+    ("ix_enrollment_user_id_enrolled_at_id", "enrollment", ["user_id", "enrolled_at", "id"]),
+    ("ix_enrollment_course_id_enrolled_at_id", "enrollment", ["course_id", "enrolled_at", "id"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,60 @@
+"""denormalized counters on course and lesson
+
+Course.enrollment_count, Lesson.comment_count, rating_count and
+rating_sum, backfilled from the child tables and kept current by
+app.crud.counters. The popularity endpoints read them through
+ix_course_enrollment_count_id and ix_lesson_activity_id.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = {
+    "course": ["enrollment_count"],
+    "lesson": ["comment_count", "rating_count", "rating_sum"],
+}
+
+
+def upgrade() -> None:
+    for table, columns in COUNTERS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.add_column(
+                    sa.Column(column, sa.Integer(), nullable=False, server_default="0")
+                )
+    op.execute(
+        "UPDATE course SET enrollment_count = "
+        "(SELECT count(*) FROM enrollment WHERE enrollment.course_id = course.id)"
+    )
+    op.execute(
+        "UPDATE lesson SET "
+        "comment_count = (SELECT count(*) FROM comment WHERE comment.lesson_id = lesson.id), "
+        "rating_count = (SELECT count(*) FROM rating WHERE rating.lesson_id = lesson.id), "
+        "rating_sum = (SELECT coalesce(sum(stars), 0) FROM rating WHERE rating.lesson_id = lesson.id)"
+    )
+    op.create_index("ix_course_enrollment_count_id", "course", ["enrollment_count", "id"])
+    op.create_index(
+        "ix_lesson_activity_id", "lesson", [sa.text("(comment_count + rating_count)"), "id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lesson_activity_id", table_name="lesson")
+    op.drop_index("ix_course_enrollment_count_id", table_name="course")
+    for table, columns in COUNTERS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in reversed(columns):
+                batch_op.drop_column(column)
@@ -0,0 +1,79 @@
+"""user_activity and platform_totals rollups
+
+Per-user enrollment, comment and rating counts and the platform-wide row
+counts, backfilled from the tables they count and kept current by
+app.crud.counters. The /stats endpoints read only these and the 0004
+counter columns; most active users come off
+ix_user_activity_score_user_id.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _counter(name: str) -> sa.Column:
+    return sa.Column(name, sa.Integer(), nullable=False, server_default="0")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_activity",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        _counter("enrollment_count"),
+        _counter("comment_count"),
+        _counter("rating_count"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index(
+        "ix_user_activity_score_user_id",
+        "user_activity",
+        [sa.text("(enrollment_count + comment_count + rating_count)"), "user_id"],
+    )
+    op.create_table(
+        "platform_totals",
+        sa.Column("id", sa.Integer(), nullable=False),
+        _counter("user_count"),
+        _counter("course_count"),
+        _counter("lesson_count"),
+        _counter("enrollment_count"),
+        _counter("comment_count"),
+        _counter("rating_count"),
+        _counter("rating_sum"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        "INSERT INTO user_activity (user_id, enrollment_count, comment_count, rating_count) "
+        "SELECT id, "
+        "(SELECT count(*) FROM enrollment WHERE enrollment.user_id = \"user\".id), "
+        "(SELECT count(*) FROM comment WHERE comment.user_id = \"user\".id), "
+        "(SELECT count(*) FROM rating WHERE rating.user_id = \"user\".id) "
+        'FROM "user"'
+    )
+    op.execute(
+        "INSERT INTO platform_totals (id, user_count, course_count, lesson_count, "
+        "enrollment_count, comment_count, rating_count, rating_sum) SELECT 1, "
+        "(SELECT count(*) FROM \"user\"), (SELECT count(*) FROM course), "
+        "(SELECT count(*) FROM lesson), (SELECT count(*) FROM enrollment), "
+        "(SELECT count(*) FROM comment), (SELECT count(*) FROM rating), "
+        "(SELECT coalesce(sum(stars), 0) FROM rating)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("platform_totals")
+    op.drop_index("ix_user_activity_score_user_id", table_name="user_activity")
+    op.drop_table("user_activity")
@@ -0,0 +1,84 @@
+"""search_index: FTS5 over courses and lessons
+
+An FTS5 table over course title/description and lesson title/content,
+filled from the existing rows and kept current by triggers on course and
+lesson (see app.models.search). GET /search reads it; rebuild_search.py
+refills it. A course is rowid 2 * id, a lesson 2 * id + 1.
+
+SQLite only; a batch migration that rebuilds course or lesson drops
+their triggers and must create them again.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 10:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> (rowid offset, body column, course id column)
+SOURCES = {
+    "course": (0, "description", "id"),
+    "lesson": (1, "content", "course_id"),
+}
+
+
+def _insert(table: str, row: str) -> str:
+    offset, body, course_id = SOURCES[table]
+    return (
+        "INSERT INTO search_index (rowid, title, body, kind, course_id) "
+        f"VALUES (2 * {row}.id + {offset}, coalesce({row}.title, ''), "
+        f"coalesce({row}.{body}, ''), '{table}', {row}.{course_id});"
+    )
+
+
+def _delete(table: str) -> str:
+    return f"DELETE FROM search_index WHERE rowid = 2 * old.id + {SOURCES[table][0]};"
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "title, body, kind UNINDEXED, course_id UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    op.execute("INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+    for table, (offset, body, course_id) in SOURCES.items():
+        columns = f"title, {body}" + (", course_id" if table == "lesson" else "")
+        op.execute(
+            f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"{_insert(table, 'new')} END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_search_update AFTER UPDATE OF {columns} ON {table} BEGIN "
+            f"{_delete(table)} {_insert(table, 'new')} END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"{_delete(table)} END"
+        )
+        op.execute(
+            "INSERT INTO search_index (rowid, title, body, kind, course_id) "
+            f"SELECT 2 * id + {offset}, coalesce(title, ''), coalesce({body}, ''), '{table}', {course_id} "
+            f"FROM {table}"
+        )
+    op.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in SOURCES:
+        for event in ("insert", "update", "delete"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{event}")
+    op.execute("DROP TABLE IF EXISTS search_index")
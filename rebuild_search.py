@@ -0,0 +1,29 @@
+"""
+Rebuild the full-text search index.
+
+    python rebuild_search.py
+
+Creates the FTS5 index over courses and lessons and its triggers if the
+database has none yet, then refills it from the course and lesson rows.
+Run it after loading data with the triggers missing, or if GET /search
+results look out of date.
+"""
+import argparse
+
+from app import crud
+from app.db.session import SessionLocal
+
+
+def main() -> None:
+    argparse.ArgumentParser(description=__doc__.splitlines()[1]).parse_args()
+
+    db = SessionLocal()
+    try:
+        indexed = crud.search.rebuild(db)
+    finally:
+        db.close()
+    print(f"{indexed} courses and lessons indexed")
+
+
+if __name__ == "__main__":
+    main()
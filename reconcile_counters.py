@@ -0,0 +1,49 @@
+"""
+Repair drift in the denormalized counter columns and rollup tables.
+
+    python reconcile_counters.py [--dry-run]
+    python reconcile_counters.py --rebuild [--batch-size N]
+
+Recounts Course.enrollment_count, Lesson.comment_count, rating_count and
+rating_sum, user_activity and platform_totals from the child tables,
+prints every row that disagreed and, unless --dry-run is given, writes
+the correct values. --rebuild recomputes every row instead, N parent
+rows per transaction.
+"""
+import argparse
+
+from app import crud
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true", help="report drift without fixing it")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every row in batches")
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.COUNTER_REBUILD_BATCH_SIZE,
+        help="parent rows per transaction for --rebuild",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    if args.rebuild:
+        try:
+            rebuilt = crud.counters.rebuild(db, batch_size=args.batch_size)
+        finally:
+            db.close()
+        print(f"{rebuilt} rows rebuilt")
+        return
+    try:
+        drift = crud.counters.reconcile(db, fix=not args.dry_run)
+    finally:
+        db.close()
+    for item in drift:
+        print(f"{item.counter} id={item.parent_id}: stored {item.stored}, actual {item.actual}")
+    action = "found" if args.dry_run else "repaired"
+    print(f"{len(drift)} drifted rows {action}")
+
+
+if __name__ == "__main__":
+    main()